@@ -0,0 +1,132 @@
+"""
+Benchmark suite of the kiosk, runs headless on the simulated backend.
+
+    python -m bench                              all suites, results printed
+    python -m bench save upload -o results.json  some suites, results written as JSON
+    python -m bench --compare baseline.json      exit code 1 if a metric regressed against baseline.json
+    python -m bench save -r recordings/example   save suite on the frames of a recording
+
+A baseline is the JSON output of an earlier run on the same machine.
+"""
+import argparse
+import datetime
+import functools
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+
+# Before PyQt5 is imported, no display needed
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from bench.common import load_config, LocalServer
+from bench.gui import bench_gui, bench_preview_path
+from bench.save import bench_save, bench_journal
+from bench.upload import bench_upload
+from bench.weight import bench_read_rate, bench_power_policy, bench_stability, bench_zero_tracking, \
+    bench_sample_stats
+
+SUITES = {
+    'gui': lambda config, work_dir: bench_gui(config),
+    'preview_path': lambda config, work_dir: bench_preview_path(config),
+    'save': bench_save,
+    'journal': bench_journal,
+    'upload': bench_upload,
+    'weight': lambda config, work_dir: bench_read_rate(config),
+    'power': lambda config, work_dir: bench_power_policy(config),
+    'stability': lambda config, work_dir: bench_stability(config),
+    'zero': lambda config, work_dir: bench_zero_tracking(config),
+    'sample_stats': lambda config, work_dir: bench_sample_stats(),
+}
+
+parser = argparse.ArgumentParser(prog='python -m bench')
+parser.add_argument('suites', nargs='*', help=f"suites to run, all if none: {', '.join(SUITES)}")
+parser.add_argument('-o', '--output', help='write the results as JSON')
+parser.add_argument('-c', '--compare', help='baseline JSON to compare against')
+parser.add_argument('-t', '--tolerance', type=float, default=0.2,
+                    help='relative change treated as a regression, default 0.2')
+parser.add_argument('-r', '--recording', help='recording the save suite captures from, simulated camera if none')
+parser.add_argument('-sl', '--show_log', action='store_true', help='show message in terminal')
+
+
+def compare(metrics, baseline, tolerance):
+    """
+    :return: list of (name, baseline value, value, relative change, is regression) of the metrics in both
+    """
+    rows = []
+    for name, current in metrics.items():
+        if name not in baseline or current['better'] is None:
+            continue
+
+        base = baseline[name]['value']
+        value = current['value']
+        if base != 0:
+            change = (value - base) / abs(base)
+        else:
+            change = 0 if value == 0 else math.copysign(math.inf, value)
+        worse = change if current['better'] == 'lower' else -change
+
+        rows.append((name, base, value, change, worse > tolerance))
+
+    return rows
+
+
+def main():
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.show_log else logging.WARNING,
+                        format='%(asctime)s %(levelname)s: %(message)s')
+
+    suites = args.suites or list(SUITES)
+    for name in suites:
+        if name not in SUITES:
+            parser.error(f'Unrecognised suite: "{name}"')
+
+    suite_funcs = dict(SUITES)
+    if args.recording is not None:
+        suite_funcs['save'] = functools.partial(bench_save, recording=args.recording)
+
+    metrics = {}
+    with tempfile.TemporaryDirectory(prefix='bench_') as work_dir, LocalServer() as server:
+        config = load_config(os.path.join(work_dir, 'data'), server.url)
+
+        for name in suites:
+            print(f'[BENCH] {name}', file=sys.stderr)
+            suite_dir = os.path.join(work_dir, name)
+            os.makedirs(suite_dir)
+            metrics.update(suite_funcs[name](config, suite_dir))
+
+    for name, result in metrics.items():
+        print(f"{name:48s} {result['value']:12.3f} {result['unit']}")
+
+    results = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'suites': suites,
+        'metrics': metrics
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['metrics']
+
+        rows = compare(metrics, baseline, args.tolerance)
+        print()
+        for name, base, value, change, is_regression in rows:
+            print(f"{name:48s} {base:12.3f} -> {value:12.3f} {change:+8.1%}{'  REGRESSION' if is_regression else ''}")
+
+        regressions = [row[0] for row in rows if row[4]]
+        print(f'\n{len(regressions)} of {len(rows)} metrics regressed by more than {args.tolerance:.0%}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import configparser
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from utils.depth_camera import DepthCamera
+from utils.recording import Recording
+from utils.replay import ReplayRealSense, SPEED
+from utils.sim_realsense import SimulatedRealSense
+
+CONFIG_PATH = r'config/config.ini'
+
+
+def metric(value, unit, better=None):
+    """
+    :param better: 'higher' or 'lower', None for values that are reported but never compared
+    """
+    return {'value': float(value), 'unit': unit, 'better': better}
+
+
+def timing_metrics(prefix, seconds, unit='ms'):
+    """
+    :param seconds: durations of the repeated runs
+    :return: p50, p90 and max of the durations in unit (ms or us), only p50 is stable enough to compare
+    """
+    scale = 1000 if unit == 'ms' else 1000000
+    values = np.asarray(seconds) * scale
+    return {
+        f'{prefix}.p50': metric(np.median(values), unit, 'lower'),
+        f'{prefix}.p90': metric(np.percentile(values, 90), unit),
+        f'{prefix}.max': metric(values.max(), unit)
+    }
+
+
+def load_config(work_dir, base_url=None):
+    """
+    config.ini with the simulated backend, captures written to work_dir and the api on base_url.
+    Only the copy in memory is changed.
+    """
+    config = configparser.ConfigParser()
+    config.read(CONFIG_PATH, encoding='utf-8')
+
+    config['hardware']['backend'] = 'simulated'
+    config['path']['save_dir'] = work_dir
+    if base_url is not None:
+        config['api']['base_url'] = base_url
+
+    return config
+
+
+def override(config, section, **values):
+    """
+    :return: copy of config with values set in section
+    """
+    copy = configparser.ConfigParser()
+    copy.read_dict({name: dict(config[name]) for name in config.sections()})
+    for key, value in values.items():
+        copy[section][key] = str(value)
+    return copy
+
+
+def measure_cpu(func, duration):
+    """
+    Call func repeatedly for duration seconds.
+    :return: calls, wall seconds, cpu seconds of the process
+    """
+    calls = 0
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        func()
+        calls += 1
+    return calls, time.monotonic() - start, time.process_time() - cpu_start
+
+
+class ServerHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client can reuse its connections
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as two writes, with Nagle the body waits for the delayed ACK (40 ms)
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super(ServerHandler, self).setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        received = 0
+        parts = 0
+        tail = b''
+        while received < length:
+            chunk = self.rfile.read(min(256 * 1024, length - received))
+            if not chunk:
+                break
+            received += len(chunk)
+            # Count file parts, the marker may straddle two chunks
+            parts += (tail + chunk).count(b'; filename=')
+            tail = chunk[-16:]
+
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.received_bytes += received
+
+        if self.path == '/api/meals':
+            self.reply(200, {'data': {}})
+        elif self.path == '/api/meals/batch':
+            self.reply(200, {'data': {'results': [{'status': 200}] * parts}})
+        else:
+            self.reply(404, {})
+
+    def do_GET(self):
+        # No user list or schools, MainWindow keeps config/user_list.json as it is
+        self.reply(404, {})
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalServer:
+    """
+    Data collect server on localhost, accepts every meal upload and counts requests, connections
+    and received bytes. Use as a context manager.
+    """
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ServerHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.reset()
+
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def reset(self):
+        with self.server.lock:
+            self.server.requests = 0
+            self.server.connections = 0
+            self.server.received_bytes = 0
+
+    def stats(self):
+        with self.server.lock:
+            return {
+                'requests': self.server.requests,
+                'connections': self.server.connections,
+                'received_bytes': self.server.received_bytes
+            }
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def simulated_capture(config, burst_frames=None, recording=None):
+    """
+    One aligned capture of the simulated camera.
+    :param recording: path of a recording (utils/recording.py), its frames replace the simulated camera
+    :return: DepthCamera, RGBDFrame
+    """
+    if recording is not None:
+        rs = ReplayRealSense(Recording(recording), SPEED.MAX)
+    else:
+        # Unpaced, the capture bench measures the kiosk and not the frame rate
+        rs = SimulatedRealSense(
+            fps=0,
+            depth=config.getint('simulation', 'camera_depth'),
+            depth_noise=config.getfloat('simulation', 'camera_depth_noise'),
+            hole_ratio=config.getfloat('simulation', 'camera_hole_ratio'),
+            seed=0
+        )
+
+    depth_camera = DepthCamera(rs=rs)
+    if burst_frames is None:
+        burst_frames = config.getint('camera', 'burst_frames')
+    if not depth_camera.capture_aligned(burst_frames):
+        raise RuntimeError('capture failed')
+
+    return depth_camera, depth_camera.snapshot()
@@ -0,0 +1,210 @@
+import time
+import tracemalloc
+
+import numpy as np
+from PyQt5.QtCore import QEventLoop, QTimer, QObject, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QApplication
+
+from bench.common import metric, timing_metrics, simulated_capture
+from main import MainWindow
+from ui.config import UI_PAGE_NAME
+from utils.backend import SimulatedBackend
+from utils.frame_buffer import FrameRing
+
+
+class BenchWindow(MainWindow):
+    """
+    MainWindow timing the startup and every preview frame. A frame's latency runs from
+    FrameRing.publish() on the camera thread to the end of show_image() on the GUI thread.
+    """
+
+    def __init__(self, config, backend):
+        self.start_time = time.monotonic()
+        self.ready_time = None
+        self.publish_times = {}
+        self.taken = None
+        self.latencies = []
+        self.paint_times = []
+
+        super(BenchWindow, self).__init__(config, backend)
+
+    def setup_sensors(self):
+        super(BenchWindow, self).setup_sensors()
+
+        frame_ring = self.depth_camera_worker.frame_ring
+        publish = frame_ring.publish
+        take = frame_ring.take
+
+        def timed_publish(index):
+            self.publish_times[index] = time.monotonic()
+            return publish(index)
+
+        def recorded_take():
+            self.taken = take()
+            return self.taken
+
+        frame_ring.publish = timed_publish
+        frame_ring.take = recorded_take
+
+    def change_page(self, page):
+        if page == UI_PAGE_NAME.USER_SELECT and self.ready_time is None:
+            self.ready_time = time.monotonic()
+        super(BenchWindow, self).change_page(page)
+
+    def show_image(self):
+        start = time.monotonic()
+        self.taken = None
+
+        super(BenchWindow, self).show_image()
+
+        end = time.monotonic()
+        if self.taken is not None:
+            self.latencies.append(end - self.publish_times[self.taken])
+            self.paint_times.append(end - start)
+
+
+def wait(app, seconds, until=None):
+    """
+    Run the event loop for seconds, or until until() is true.
+    """
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+
+    if until is not None:
+        timer = QTimer()
+        timer.timeout.connect(lambda: until() and loop.quit())
+        timer.start(10)
+
+    loop.exec_()
+
+
+def bench_gui(config, duration=5.0):
+    """
+    Startup time to the USER_SELECT page and the preview frame rate and latency over duration
+    seconds, MainWindow on the simulated backend.
+    """
+    app = QApplication.instance() or QApplication(['bench'])
+
+    window = BenchWindow(config, SimulatedBackend(config))
+    window.show()
+    wait(app, 60, until=lambda: window.ready_time is not None)
+    if window.ready_time is None:
+        raise RuntimeError('USER_SELECT not reached in 60 s')
+
+    results = {'startup.user_select': metric(window.ready_time - window.start_time, 's', 'lower')}
+
+    # Preview runs on the USER_CONTROL page
+    window.user_data = {'user_id': 1, 'name': 'bench'}
+    window.change_page(UI_PAGE_NAME.USER_CONTROL)
+
+    window.latencies.clear()
+    window.paint_times.clear()
+    stats = window.depth_camera_worker.frame_ring.stats()
+    wait(app, duration)
+    displayed = window.depth_camera_worker.frame_ring.stats()['displayed'] - stats['displayed']
+
+    results['preview.fps'] = metric(displayed / duration, 'fps', 'higher')
+    results.update(timing_metrics('preview.latency', window.latencies))
+    results.update(timing_metrics('preview.paint', window.paint_times))
+
+    window.exit_handler()
+    window.thread_pool.waitForDone(10000)
+    app.processEvents()
+
+    return results
+
+
+class PreviewSignals(QObject):
+    # DepthCameraWorker signals before and after the frame ring
+    image = pyqtSignal(np.ndarray)
+    frame_ready = pyqtSignal()
+
+
+class CopyEmitPath:
+    """
+    Preview hand-off before the frame ring: the camera thread copies the reversed BGR frame and emits
+    the array, the GUI wraps it as RGB888.
+    """
+
+    def __init__(self, signals):
+        self.signals = signals
+        self.pixmap = None
+        signals.image.connect(self.show_image, Qt.DirectConnection)
+
+    def publish(self, image):
+        self.signals.image.emit(np.copy(image[:, :, ::-1]))
+
+    def show_image(self, img):
+        len_y, len_x, _ = img.shape
+        qimg = QImage(img.data, len_x, len_y, QImage.Format_RGB888)
+        self.pixmap = QPixmap.fromImage(qimg)
+
+
+class RingPath:
+    """
+    Preview hand-off of DepthCameraWorker and MainWindow.show_image: the frame goes into a FrameRing
+    slot, the GUI wraps the slot as BGR888 and releases it.
+    """
+
+    def __init__(self, signals):
+        self.signals = signals
+        self.frame_ring = FrameRing()
+        self.pixmap = None
+        signals.frame_ready.connect(self.show_image, Qt.DirectConnection)
+
+    def publish(self, image):
+        index = self.frame_ring.write(image)
+        if index is not None and self.frame_ring.publish(index):
+            self.signals.frame_ready.emit()
+
+    def show_image(self):
+        index = self.frame_ring.take()
+        if index is None:
+            return
+
+        img = self.frame_ring.get(index)
+        len_y, len_x, _ = img.shape
+        qimg = QImage(img.data, len_x, len_y, img.strides[0], QImage.Format_BGR888)
+        self.pixmap = QPixmap.fromImage(qimg)
+        self.frame_ring.release(index)
+
+
+def bench_preview_path(config, frames=300):
+    """
+    CPU time and Python heap allocations (tracemalloc, NumPy buffers included, Qt's own not) per
+    preview frame, from the camera thread handing a frame over to the GUI holding its QPixmap.
+    Both threads' work runs inline through direct connections, the queued delivery costs the same
+    for both paths. The copy-and-emit path is the before figure.
+    """
+    app = QApplication.instance() or QApplication(['bench'])
+
+    depth_camera, frame = simulated_capture(config, burst_frames=1)
+    depth_camera.pipeline.stop()
+    image = frame.color_image
+
+    results = {}
+    for name, path_class, better in (('copy_emit', CopyEmitPath, None), ('ring', RingPath, 'lower')):
+        signals = PreviewSignals()
+        path = path_class(signals)
+        for _ in range(10):
+            path.publish(image)
+
+        start = time.process_time()
+        for _ in range(frames):
+            path.publish(image)
+        results[f'preview_path.{name}.cpu_per_frame'] = metric((time.process_time() - start) / frames * 1000000, 'us', better)
+
+        allocated = []
+        tracemalloc.start()
+        for _ in range(frames):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            path.publish(image)
+            allocated.append(tracemalloc.get_traced_memory()[1] - current)
+        tracemalloc.stop()
+        results[f'preview_path.{name}.allocated_per_frame'] = metric(np.mean(allocated) / 1024, 'KiB', better)
+
+    app.processEvents()
+
+    return results
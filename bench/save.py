@@ -0,0 +1,110 @@
+import os
+import time
+
+import numpy as np
+
+from bench.common import metric, timing_metrics, simulated_capture
+from utils.codec import CODECS, IMAGE_KEYS, get_codec, read_image
+from utils.journal import CaptureJournal, FSYNC_POLICY
+from worker.save_worker import SaveWorker
+
+
+def bench_save(config, work_dir, repeat=10, recording=None):
+    """
+    SaveWorker.write() of one capture with every codec: encode, write, fsync and rename, like a
+    capture on the kiosk, and reading every image of the file back. Also the aligned burst capture
+    itself.
+    :param recording: path of a recording to capture from instead of the simulated camera, real
+        frames compress differently from synthetic ones
+    """
+    depth_camera, frame = simulated_capture(config, recording=recording)
+
+    results = {}
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        depth_camera.capture_aligned(config.getint('camera', 'burst_frames'))
+        durations.append(time.perf_counter() - start)
+    results.update(timing_metrics('save.capture_aligned', durations))
+
+    save_dir = os.path.join(work_dir, 'save')
+    os.makedirs(save_dir, exist_ok=True)
+
+    for name in CODECS:
+        save_worker = SaveWorker(depth_camera, codec=get_codec(name, jpeg_quality=config.getint('save', 'jpeg_quality')))
+
+        durations = []
+        for i in range(repeat):
+            data = {'file_name': f'{name}_{i}', 'file_path': os.path.join(save_dir, f'{name}_{i}.npz')}
+            start = time.perf_counter()
+            save_worker.write(frame, data)
+            durations.append(time.perf_counter() - start)
+
+        results.update(timing_metrics(f'save.{name}', durations))
+        results[f'save.{name}.size'] = metric(os.path.getsize(data['file_path']) / 1024, 'KiB', 'lower')
+
+        # What the server (or a replay) does with an uploaded file
+        durations = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            with np.load(os.path.join(save_dir, f'{name}_{i}.npz')) as capture:
+                for key in IMAGE_KEYS:
+                    read_image(capture, key)
+            durations.append(time.perf_counter() - start)
+
+        results.update(timing_metrics(f'save.{name}.read', durations))
+
+    depth_camera.pipeline.stop()
+
+    return results
+
+
+def bench_journal(config, work_dir, entries=(10, 100, 1000, 5000), repeat=20):
+    """
+    Cost of MainWindow.save_json() (one journal append) with the day's journal already holding
+    entries records, for every fsync policy. Also loading and exporting a journal of that size.
+    """
+    results = {}
+
+    record = {
+        'user_id': 1,
+        'weight': 350.0,
+        'save_type': 1,
+        'meal_date': '2024-01-01',
+        'file_path': os.path.join(work_dir, 'capture.npz'),
+        'is_upload': 0
+    }
+
+    for count in entries:
+        path = os.path.join(work_dir, 'journal', str(count), 'data.jsonl')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        journal = CaptureJournal(path, fsync=FSYNC_POLICY.NEVER)
+        for i in range(count):
+            journal.append(f'capture_{i}', record)
+        journal.close()
+
+        for fsync in (FSYNC_POLICY.ALWAYS, FSYNC_POLICY.INTERVAL, FSYNC_POLICY.NEVER):
+            start = time.perf_counter()
+            journal = CaptureJournal(path, fsync=fsync, fsync_interval=config.getfloat('save', 'journal_fsync_interval'))
+            load_time = time.perf_counter() - start
+
+            durations = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                journal.append(f'{fsync}_{i}', record)
+                durations.append(time.perf_counter() - start)
+
+            results.update(timing_metrics(f'journal.{count}.append_{fsync}', durations, unit='us'))
+            journal.close()
+
+        results[f'journal.{count}.load'] = metric(load_time * 1000, 'ms', 'lower')
+
+        journal = CaptureJournal(path, fsync=FSYNC_POLICY.NEVER)
+        start = time.perf_counter()
+        journal.export(os.path.join(os.path.dirname(path), 'data.json'))
+        results[f'journal.{count}.export'] = metric((time.perf_counter() - start) * 1000, 'ms', 'lower')
+        journal.close()
+
+    return results
@@ -0,0 +1,136 @@
+import os
+import shutil
+import threading
+import time
+
+from bench.common import metric, LocalServer, simulated_capture
+from utils.api import Api
+from utils.codec import get_codec
+from utils.journal import CaptureJournal, FSYNC_POLICY
+from worker.upload_worker import UploadWorker
+
+
+def create_api(config, url):
+    return Api(
+        url,
+        pool_size=config.getint('api', 'pool_size'),
+        connect_timeout=config.getfloat('api', 'connect_timeout'),
+        read_timeout=config.getfloat('api', 'read_timeout'),
+        retries=config.getint('api', 'retries')
+    )
+
+
+def throughput_metrics(prefix, files, total_bytes, seconds, connections):
+    return {
+        f'{prefix}.files_per_second': metric(files / seconds, 'files/s', 'higher'),
+        f'{prefix}.mib_per_second': metric(total_bytes / seconds / 1024 / 1024, 'MiB/s', 'higher'),
+        f'{prefix}.connections': metric(connections, 'connections')
+    }
+
+
+def bench_upload(config, work_dir, count=20):
+    """
+    Upload count captures (configured codec) to a server on localhost:
+    one request per capture on a shared session, one request per capture on a new session each
+    (no connection reuse), batch requests of [upload] batch_size, and the UploadWorker queue
+    end to end.
+    """
+    upload_dir = os.path.join(work_dir, 'upload', '20240101')
+    os.makedirs(upload_dir, exist_ok=True)
+
+    depth_camera, frame = simulated_capture(config)
+    codec = get_codec(config.get('save', 'codec'), jpeg_quality=config.getint('save', 'jpeg_quality'))
+    first_path = os.path.join(upload_dir, '20240101120000_1_0.npz')
+    depth_camera.save_file(first_path, frame, codec)
+    depth_camera.pipeline.stop()
+
+    items = []
+    for i in range(count):
+        file_name = f'20240101120000_{i + 1}_0'
+        file_path = os.path.join(upload_dir, f'{file_name}.npz')
+        if file_path != first_path:
+            shutil.copyfile(first_path, file_path)
+        items.append({
+            'payload': {'user_id': i + 1, 'weight': 350.0, 'meal_date': '2024-01-01', 'type': 0},
+            'file_path': file_path,
+            'file_name': file_name
+        })
+
+    total_bytes = sum(os.path.getsize(data['file_path']) for data in items)
+    batch_size = config.getint('upload', 'batch_size')
+
+    results = {'upload.file_size': metric(total_bytes / count / 1024, 'KiB')}
+
+    with LocalServer() as server:
+        # Shared session, the connection is kept alive
+        api = create_api(config, server.url)
+        start = time.perf_counter()
+        for data in items:
+            if api.upload_data(data) != 200:
+                raise RuntimeError(f"upload {data['file_name']} failed")
+        results.update(throughput_metrics('upload.session', count, total_bytes, time.perf_counter() - start,
+                                          server.stats()['connections']))
+        api.close()
+
+        # New session per upload, the way uploads worked before the Api kept one
+        server.reset()
+        start = time.perf_counter()
+        for data in items:
+            api = create_api(config, server.url)
+            if api.upload_data(data) != 200:
+                raise RuntimeError(f"upload {data['file_name']} failed")
+            api.close()
+        results.update(throughput_metrics('upload.no_session', count, total_bytes, time.perf_counter() - start,
+                                          server.stats()['connections']))
+
+        server.reset()
+        api = create_api(config, server.url)
+        start = time.perf_counter()
+        for i in range(0, count, batch_size):
+            status_codes = api.upload_batch(items[i:i + batch_size])
+            if status_codes is None or set(status_codes.values()) != {200}:
+                raise RuntimeError('batch upload failed')
+        results.update(throughput_metrics('upload.batch', count, total_bytes, time.perf_counter() - start,
+                                          server.stats()['connections']))
+        api.close()
+
+        # Upload queue, every capture pending in the journal as after a network outage
+        journal = CaptureJournal(os.path.join(upload_dir, 'data.jsonl'), fsync=FSYNC_POLICY.NEVER)
+        for data in items:
+            journal.append(data['file_name'], {
+                'user_id': data['payload']['user_id'],
+                'weight': data['payload']['weight'],
+                'save_type': data['payload']['type'],
+                'meal_date': data['payload']['meal_date'],
+                'file_path': data['file_path'],
+                'is_upload': 0
+            })
+
+        server.reset()
+        api = create_api(config, server.url)
+        upload_worker = UploadWorker(
+            api=api,
+            journal=journal,
+            save_dir=os.path.dirname(upload_dir),
+            max_concurrent=config.getint('upload', 'max_concurrent'),
+            batch_size=batch_size,
+            batch_bytes=config.getint('upload', 'batch_bytes')
+        )
+        thread = threading.Thread(target=upload_worker.run)
+
+        start = time.perf_counter()
+        thread.start()
+        while any(record.get('is_upload') != 1 for _, record in journal.items()):
+            if time.perf_counter() - start > 60:
+                raise RuntimeError('upload worker did not finish in 60 s')
+            time.sleep(0.005)
+        seconds = time.perf_counter() - start
+
+        upload_worker.set_stop(True)
+        thread.join()
+        journal.close()
+        api.close()
+
+        results.update(throughput_metrics('upload.worker', count, total_bytes, seconds, server.stats()['connections']))
+
+    return results
@@ -0,0 +1,269 @@
+import json
+import math
+import time
+import timeit
+
+import numpy as np
+
+from bench.common import metric, timing_metrics, measure_cpu, override
+from utils import sample_stats
+from utils.backend import SimulatedBackend
+from utils.stability import StabilityDetector
+from utils.weight_reader import WeightReader, POWER_POLICY
+from utils.weight_sampler import WeightSampler
+from utils.zero_tracker import ZeroTracker
+
+# Four corner load cells on a shared PD_SCK
+BANK_CELLS = [[5, 6], [13, 6], [19, 6], [26, 6]]
+
+
+def create_reader(config, backend, **kwargs):
+    """
+    WeightReader on the simulated backend with the [weight] settings, kwargs override them.
+    """
+    options = dict(
+        reference_unit=config.getfloat('weight', 'reference_unit'),
+        filter=config.get('weight', 'filter'),
+        window=config.getint('weight', 'filter_window'),
+        power_policy=config.get('weight', 'power_policy'),
+        idle_timeout=config.getfloat('weight', 'idle_timeout'),
+        cells=json.loads(config.get('weight', 'cells')),
+        cell_scales=json.loads(config.get('weight', 'cell_scales')) or None
+    )
+    options.update(kwargs)
+
+    return WeightReader(
+        dout=config.getint('weight', 'channel_data'),
+        pd_sck=config.getint('weight', 'channel_clk'),
+        transport=backend.weight_transport(config.get('weight', 'transport')),
+        gpio=backend.gpio(),
+        **options
+    )
+
+
+def set_conversion_rate(backend, rate):
+    for device in backend.gpio().devices.values():
+        device.conversion_period = 1 / rate
+
+
+def bench_read_rate(config, duration=3.0):
+    """
+    Reads per second and CPU per read of the HX711 driver, with a simulated HX711 that always has
+    a conversion ready, for one cell and a bank of four. Then CPU load of reading at the
+    configured conversion rate ([simulation] hx711_rate), where the driver should mostly sleep.
+    """
+    results = {}
+
+    for name, cells in (('single', []), ('bank', BANK_CELLS)):
+        cell_config = override(config, 'weight', cells=json.dumps(cells))
+        backend = SimulatedBackend(override(cell_config, 'simulation', hx711_rate=1e6))
+        weight_reader = create_reader(cell_config, backend, power_policy=POWER_POLICY.ALWAYS_ON)
+        weight_reader.setup()
+
+        reads, wall, cpu = measure_cpu(weight_reader.read, duration)
+        # Bound by the sleep granularity of the simulator, CPU per read is the figure to compare
+        results[f'weight.{name}.reads_per_second'] = metric(reads / wall, 'reads/s')
+        results[f'weight.{name}.cpu_per_read'] = metric(cpu / reads * 1000000, 'us', 'lower')
+
+    backend = SimulatedBackend(override(config, 'simulation', hx711_rate=1e6))
+    weight_reader = create_reader(config, backend, power_policy=POWER_POLICY.ALWAYS_ON)
+    weight_reader.setup()
+    set_conversion_rate(backend, config.getfloat('simulation', 'hx711_rate'))
+
+    reads, wall, cpu = measure_cpu(weight_reader.read, duration)
+    results['weight.paced.reads_per_second'] = metric(reads / wall, 'reads/s')
+    results['weight.paced.cpu_load'] = metric(cpu / wall * 100, '%', 'lower')
+
+    return results
+
+
+def bench_power_policy(config, duration=3.0):
+    """
+    Published samples per second and settle time of every power policy at the configured
+    conversion rate. For IDLE, the time from wake() to the first sample of a powered down HX711.
+    """
+    results = {}
+
+    for policy in (POWER_POLICY.ALWAYS_ON, POWER_POLICY.PER_READ):
+        backend = SimulatedBackend(override(config, 'simulation', hx711_rate=1e6))
+        weight_reader = create_reader(config, backend, power_policy=policy)
+        weight_reader.setup()
+        set_conversion_rate(backend, config.getfloat('simulation', 'hx711_rate'))
+
+        reads, wall, cpu = measure_cpu(weight_reader.read, duration)
+        results[f'power.{policy}.updates_per_second'] = metric(reads / wall, 'updates/s', 'higher')
+        results[f'power.{policy}.cpu_load'] = metric(cpu / wall * 100, '%', 'lower')
+        if weight_reader.settle_time is not None:
+            results[f'power.{policy}.settle_time'] = metric(weight_reader.settle_time * 1000, 'ms', 'lower')
+
+    backend = SimulatedBackend(override(config, 'simulation', hx711_rate=1e6))
+    weight_reader = create_reader(config, backend, power_policy=POWER_POLICY.IDLE, idle_timeout=0.5)
+    weight_reader.setup()
+    set_conversion_rate(backend, config.getfloat('simulation', 'hx711_rate'))
+
+    wake_times = []
+    for _ in range(3):
+        while weight_reader.read():
+            pass
+
+        start = time.monotonic()
+        weight_reader.wake()
+        while not weight_reader.read():
+            pass
+        wake_times.append(time.monotonic() - start)
+
+    results.update(timing_metrics('power.idle.wake_to_sample', wake_times))
+
+    return results
+
+
+def placement(weight, t):
+    # Tray put down at t = 0: rises within ~0.3 s and rings for about a second
+    return weight * (1 - math.exp(-t / 0.1)) + 0.1 * weight * math.exp(-t / 0.3) * math.sin(2 * math.pi * 2.5 * t)
+
+
+def bench_stability(config, weights=(250, 400, 550, 700, 850), press_delay=0.2):
+    """
+    Time from arming StabilityDetector to its settled signal, and the error of the settled weight,
+    at the configured conversion rate and [weight] stable_* thresholds. The detector is armed
+    press_delay seconds after the tray starts going down, while it still rings.
+    """
+    backend = SimulatedBackend(override(config, 'simulation', hx711_rate=1e6))
+    weight_reader = create_reader(config, backend, power_policy=POWER_POLICY.ALWAYS_ON)
+    weight_reader.setup()
+    set_conversion_rate(backend, config.getfloat('simulation', 'hx711_rate'))
+
+    stability = StabilityDetector(
+        window=config.getint('weight', 'stable_window'),
+        max_std=config.getfloat('weight', 'stable_std'),
+        max_slope=config.getfloat('weight', 'stable_slope')
+    )
+    timeout = config.getfloat('weight', 'settle_timeout')
+
+    times = []
+    errors = []
+    for weight in weights:
+        backend.set_weight(0)
+        start = time.monotonic()
+        while time.monotonic() - start < 1.5:
+            weight_reader.read()
+
+        start = time.monotonic()
+        armed_at = None
+        while True:
+            t = time.monotonic() - start
+            if armed_at is None and t >= press_delay:
+                stability.arm()
+                armed_at = time.monotonic()
+            elif armed_at is not None and time.monotonic() - armed_at > timeout:
+                stability.cancel()
+                break
+
+            backend.set_weight(placement(weight, t))
+            weight_reader.read()
+            value = stability.update(weight_reader.sampler)
+            if value is not None:
+                times.append(time.monotonic() - armed_at)
+                errors.append(abs(value - weight))
+                break
+
+    results = {
+        'stability.timeouts': metric(len(weights) - len(times), 'trays', 'lower'),
+        'stability.max_error': metric(max(errors) if errors else float('nan'), 'g', 'lower')
+    }
+    if times:
+        results.update(timing_metrics('stability.time_to_stable', times))
+
+    return results
+
+
+def bench_zero_tracking(config, hours=1.0, rate=10, drift=0.02, tray_interval=60, tray_time=20, seed=0):
+    """
+    Replay of a synthetic hour at rate samples per second: the load cell offset drifts by drift
+    grams per second and a tray of 200 - 800 g is on the scale for tray_time of every tray_interval
+    seconds. Error of the weight at the end of every tray, without and with ZeroTracker.
+    """
+    random = np.random.default_rng(seed)
+    noise = config.getfloat('simulation', 'hx711_noise') / abs(config.getfloat('weight', 'reference_unit'))
+
+    # Synthetic time starts now, ZeroTracker limits corrections from time.monotonic() on
+    start = time.monotonic()
+    times = start + np.arange(0, hours * 3600, 1 / rate)
+    elapsed = times - start
+    phase = elapsed % tray_interval
+    trays = random.uniform(200, 800, int(math.ceil(hours * 3600 / tray_interval)))
+    true_weights = np.where(phase >= tray_interval - tray_time, trays[(elapsed // tray_interval).astype(int)], 0)
+    # Last sample of every tray
+    loaded = true_weights > 0
+    tray_ends = np.flatnonzero(loaded & ~np.append(loaded[1:], False))
+    raw = true_weights + drift * elapsed + random.normal(0, noise, len(times))
+
+    results = {}
+    for name, tracking in (('off', False), ('on', True)):
+        sampler = WeightSampler(filter=config.get('weight', 'filter'), window=config.getint('weight', 'filter_window'))
+        zero_tracker = None
+        if tracking:
+            zero_tracker = ZeroTracker(
+                band=config.getfloat('weight', 'zero_band'),
+                hold_time=config.getfloat('weight', 'zero_hold_time'),
+                max_rate=config.getfloat('weight', 'zero_max_rate'),
+                window=config.getint('weight', 'stable_window'),
+                max_std=config.getfloat('weight', 'stable_std'),
+                max_slope=config.getfloat('weight', 'stable_slope')
+            )
+
+        offset = 0
+        values = np.empty(len(times))
+        for i, t in enumerate(times):
+            values[i] = sampler.push(raw[i] - offset, t)
+            if zero_tracker is not None:
+                offset += zero_tracker.update(sampler, now=t)
+
+        errors = np.abs(values[tray_ends] - true_weights[tray_ends])
+        results[f'zero.{name}.mean_error'] = metric(errors.mean(), 'g', 'lower' if tracking else None)
+        results[f'zero.{name}.max_error'] = metric(errors.max(), 'g', 'lower' if tracking else None)
+
+    return results
+
+
+def sorted_median(values):
+    # HX711.read_median before utils/sample_stats.py: sort the list, take the middle value(s)
+    values = sorted(values)
+    half = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[half]
+    return sum(values[half - 1:half + 1]) / 2.0
+
+
+def sorted_trimmed_mean(values, trim=0.2):
+    # HX711.read_average before utils/sample_stats.py
+    values = sorted(values)
+    trim_amount = int(len(values) * trim)
+    values = values[trim_amount:len(values) - trim_amount]
+    return sum(values) / len(values)
+
+
+def bench_sample_stats(sizes=(3, 5, 10, 20, 50, 100, 200), number=2000, seed=0):
+    """
+    Time per call of the sample_stats functions for sample counts used by the HX711 driver, on the
+    int64 array HX711.read_samples() returns. The sort-based functions they replaced are timed on
+    the list of ints the driver used to collect, as the before figure.
+    """
+    random = np.random.default_rng(seed)
+
+    results = {}
+    for size in sizes:
+        samples = np.round(random.normal(8000, 20, size)).astype(np.int64)
+        values = samples.tolist()
+
+        for name, func, before in (('median', sample_stats.median, sorted_median),
+                                   ('trimmed_mean', sample_stats.trimmed_mean, sorted_trimmed_mean),
+                                   ('reject_outliers', sample_stats.reject_outliers, None)):
+            seconds = min(timeit.repeat(lambda: func(samples), number=number, repeat=3)) / number
+            results[f'sample_stats.{name}.{size}'] = metric(seconds * 1000000, 'us', 'lower')
+
+            if before is not None:
+                seconds = min(timeit.repeat(lambda: before(values), number=number, repeat=3)) / number
+                results[f'sample_stats.{name}.sorted.{size}'] = metric(seconds * 1000000, 'us')
+
+    return results
@@ -17,9 +17,14 @@ from ui.setting_page import SettingPage
 from ui.user_control import UserControl
 from ui.user_select import UserSelect
 from utils.api import Api
+from utils.backend import BACKENDS, get_backend
+from utils.codec import get_codec
+from utils.journal import CaptureJournal, UPLOAD_STATE
+from utils.recording import SensorRecorder
 from utils.led import LedController, LED_STATUS
 from utils.worker import Worker
 from worker.camera_worker import DepthCameraWorker
+from worker.save_worker import SaveWorker
 from worker.upload_worker import UploadWorker
 from worker.weight_worker import WeightReaderWorker
 
@@ -30,19 +35,31 @@ USER_LIST_PATH = r'config/user_list.json'
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-sl', '--show_log', action='store_true', help='show message in terminal')
-args = parser.parse_args()
+parser.add_argument('-b', '--backend', choices=list(BACKENDS), help='hardware backend, overrides [hardware] backend')
+parser.add_argument('-r', '--record', action='store_true', help='record camera and weight streams to [record] path')
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, config):
+    def __init__(self, config, backend=None, recorder=None):
         super(MainWindow, self).__init__()
 
         self.config = config
-        self.api = Api(config.get('api', 'base_url'))
+        # Sensors and LED come from the backend, see utils/backend.py
+        self.backend = backend if backend is not None else get_backend(config.get('hardware', 'backend'), config)
+        # Sensor streams are recorded for replay when set
+        self.recorder = recorder
+        self.api = Api(
+            config.get('api', 'base_url'),
+            pool_size=config.getint('api', 'pool_size'),
+            connect_timeout=config.getfloat('api', 'connect_timeout'),
+            read_timeout=config.getfloat('api', 'read_timeout'),
+            retries=config.getint('api', 'retries')
+        )
         self.status = LED_STATUS.SETUP
 
-        # Multi thread
+        # Multi thread, camera, weight, save and upload workers each hold a thread for the whole session
         self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(max(8, self.thread_pool.maxThreadCount()))
 
         # Create data folder
         self.save_folder = os.path.join(self.config.get('path', 'save_dir'), datetime.datetime.now().strftime("%Y%m%d"))
@@ -52,11 +69,33 @@ class MainWindow(QMainWindow):
 
         self.json_path = os.path.join(self.save_folder, 'data.json')
 
+        # Captures are appended to a journal, data.json is exported from it on exit
+        self.journal = CaptureJournal(
+            os.path.join(self.save_folder, 'data.jsonl'),
+            fsync=self.config.get('save', 'journal_fsync'),
+            fsync_interval=self.config.getfloat('save', 'journal_fsync_interval'),
+            legacy_json_path=self.json_path
+        )
+
+        # Upload queue, retries pending captures of every day until the server accepts them
+        self.upload_worker = UploadWorker(
+            api=self.api,
+            journal=self.journal,
+            save_dir=self.config.get('path', 'save_dir'),
+            max_concurrent=self.config.getint('upload', 'max_concurrent'),
+            backoff_base=self.config.getfloat('upload', 'backoff_base'),
+            backoff_max=self.config.getfloat('upload', 'backoff_max'),
+            batch_size=self.config.getint('upload', 'batch_size'),
+            batch_bytes=self.config.getint('upload', 'batch_bytes')
+        )
+        self.thread_pool.start(self.upload_worker)
+
         # Led control
         self.led_controller = LedController(
             channel_r=self.config.getint('led', 'channel_r'),
             channel_b=self.config.getint('led', 'channel_b'),
-            channel_g=self.config.getint('led', 'channel_g')
+            channel_g=self.config.getint('led', 'channel_g'),
+            gpio=self.backend.gpio()
         )
         self.change_status(LED_STATUS.SETUP)
 
@@ -94,6 +133,10 @@ class MainWindow(QMainWindow):
         self.device_message = MessageComponent(text='感測裝置異常，請確認是否有正確連接設備', font_size=64, color='#C00000', wait_time=1000)
         self.device_message.close_signal.connect(lambda: self.change_page(UI_PAGE_NAME.USER_SELECT))
 
+        # Save queue full message component, the user stays selected and can capture again
+        self.save_busy_message = MessageComponent(text='資料儲存中，請稍後再試一次', font_size=64, color='#C00000', wait_time=1000)
+        self.save_busy_message.close_signal.connect(lambda: self.change_page(UI_PAGE_NAME.USER_CONTROL))
+
         # Setting page
         self.setting_page = SettingPage()
         self.setting_page.save_signal.connect(self.save_handler)
@@ -108,6 +151,7 @@ class MainWindow(QMainWindow):
         self.stacked_layout.addWidget(self.init_message)
         self.stacked_layout.addWidget(self.error_message)
         self.stacked_layout.addWidget(self.device_message)
+        self.stacked_layout.addWidget(self.save_busy_message)
 
         self.stacked_layout.setCurrentIndex(UI_PAGE_NAME.INIT_MSG)
 
@@ -120,16 +164,25 @@ class MainWindow(QMainWindow):
         self.set_title_text(
             f"{self.config.get('school', 'name')}{self.config.getint('school', 'grade')}年{self.config.get('school', 'class')}班")
 
-        # Wait 1 second for saving file
+        # Capture as soon as the weight settles, the timer is the upper bound
+        # (1 second without weight reader)
         self.timer = QTimer()
         self.timer.setInterval(1000)
-        self.timer.timeout.connect(self.save_file)
+        self.timer.timeout.connect(self.capture_timeout)
+        self.settle_timeout = int(self.config.getfloat('weight', 'settle_timeout') * 1000)
 
         # If weight worker not work
         self.pass_timer = QTimer()
         self.pass_timer.setInterval(20000)
         self.pass_timer.timeout.connect(self.pass_weight_init)
 
+        # Params
+        self.user_data = None
+        self.save_type = None
+        self.settled_weight = None
+        self.is_depth_camera_ok = False
+        self.is_weight_reader_ok = False
+
         # Thread of initialize module
         self.init_worker = Worker(self.setup_sensors)
         self.init_worker.signals.finished.connect(self.finish_setup_sensors)
@@ -137,30 +190,67 @@ class MainWindow(QMainWindow):
         self.thread_pool.start(self.init_worker)
         self.pass_timer.start()
 
-        # Params
-        self.user_data = None
-        self.save_type = None
-        self.is_upload = 0
-        self.is_depth_camera_ok = False
-        self.is_weight_reader_ok = False
-
     def change_status(self, status):
         self.status = status
-        self.led_controller.set_value(*json.loads(config.get('led', status)))
+        self.led_controller.set_value(*json.loads(self.config.get('led', status)))
 
     def setup_sensors(self):
-        self.depth_camera_worker = DepthCameraWorker()
+        self.depth_camera_worker = DepthCameraWorker(
+            preview_fps=self.config.getint('camera', 'preview_fps'),
+            preview_size=(self.config.getint('camera', 'preview_width'), self.config.getint('camera', 'preview_height')),
+            burst_frames=self.config.getint('camera', 'burst_frames'),
+            backend=self.backend,
+            recorder=self.recorder
+        )
         if self.depth_camera_worker.depth_camera is not None:
             self.is_depth_camera_ok = True
-            self.depth_camera_worker.signals.data.connect(self.show_image)
-
-        self.weight_reader_worker = WeightReaderWorker(
-            channel_data=self.config.getint('weight', 'channel_data'),
-            channel_clk=self.config.getint('weight', 'channel_clk'),
-            reference_unit=self.config.getfloat('weight', 'reference_unit')
-        )
+            self.depth_camera_worker.signals.frame_ready.connect(self.show_image)
+            self.depth_camera_worker.signals.captured.connect(self.save_file)
+
+            self.save_worker = SaveWorker(
+                depth_camera=self.depth_camera_worker.depth_camera,
+                queue_size=self.config.getint('save', 'queue_size'),
+                codec=get_codec(
+                    self.config.get('save', 'codec'),
+                    jpeg_quality=self.config.getint('save', 'jpeg_quality')
+                )
+            )
+            # Bound slot of the window, runs on the GUI thread (this method runs on the init worker thread)
+            self.save_worker.signals.saved.connect(self.upload_file)
+            self.save_worker.signals.failed.connect(self.save_failed)
+            self.thread_pool.start(self.save_worker)
+
+            # Preview runs while the weight reader is set up, HX711 setup blocks without a load cell
+            self.thread_pool.start(self.depth_camera_worker)
 
-        self.thread_pool.start(self.depth_camera_worker)
+        try:
+            self.weight_reader_worker = WeightReaderWorker(
+                channel_data=self.config.getint('weight', 'channel_data'),
+                channel_clk=self.config.getint('weight', 'channel_clk'),
+                reference_unit=self.config.getfloat('weight', 'reference_unit'),
+                transport=self.backend.weight_transport(self.config.get('weight', 'transport')),
+                filter=self.config.get('weight', 'filter'),
+                window=self.config.getint('weight', 'filter_window'),
+                power_policy=self.config.get('weight', 'power_policy'),
+                idle_timeout=self.config.getfloat('weight', 'idle_timeout'),
+                stable_window=self.config.getint('weight', 'stable_window'),
+                stable_std=self.config.getfloat('weight', 'stable_std'),
+                stable_slope=self.config.getfloat('weight', 'stable_slope'),
+                zero_tracking=self.config.getboolean('weight', 'zero_tracking'),
+                zero_band=self.config.getfloat('weight', 'zero_band'),
+                zero_hold_time=self.config.getfloat('weight', 'zero_hold_time'),
+                zero_max_rate=self.config.getfloat('weight', 'zero_max_rate'),
+                cells=json.loads(self.config.get('weight', 'cells')),
+                cell_scales=json.loads(self.config.get('weight', 'cell_scales')) or None,
+                gpio=self.backend.gpio(),
+                recorder=self.recorder
+            )
+        except TimeoutError:
+            logging.error('[MAIN] weight reader not ready, is the load cell connected?', exc_info=True)
+            return
+
+        self.weight_reader_worker.signals.settled.connect(self.weight_settled)
+        self.weight_reader_worker.signals.data.connect(self.show_weight)
         self.thread_pool.start(self.weight_reader_worker)
 
         self.is_weight_reader_ok = True
@@ -175,8 +265,6 @@ class MainWindow(QMainWindow):
 
     def pass_weight_init(self):
         logging.info('[MAIN] weight reader not connected')
-        if self.is_depth_camera_ok:
-            self.thread_pool.start(self.depth_camera_worker)
         self.pass_timer.stop()
         self.finish_setup_sensors()
 
@@ -188,26 +276,60 @@ class MainWindow(QMainWindow):
             self.change_status(LED_STATUS.BUSY)
             self.change_page(UI_PAGE_NAME.LOADING)
             self.save_type = save_type
+            self.settled_weight = None
 
-            self.timer.start()
+            if self.is_weight_reader_ok:
+                self.weight_reader_worker.request_settle()
+                self.timer.start(self.settle_timeout)
+            else:
+                self.timer.start(1000)
         else:
             self.change_page(UI_PAGE_NAME.DEVICE_MSG)
 
-    def save_file(self):
+    def weight_settled(self, value):
+        # Ignore a late signal after the timeout already captured
+        if not self.timer.isActive():
+            return
+
+        logging.info(f'[MAIN] weight settled: {value:.1f}')
+        self.settled_weight = value
+        self.capture_file()
+
+    def capture_timeout(self):
+        if self.is_weight_reader_ok:
+            logging.warning('[MAIN] weight not settled, capture anyway')
+            self.weight_reader_worker.cancel_settle()
+        self.capture_file()
+
+    def capture_file(self):
         self.timer.stop()
+        self.depth_camera_worker.request_capture()
+
+    def save_file(self, is_captured):
+        if not is_captured:
+            logging.warning('[MAIN] capture aligned frames failed')
+            self.change_status(LED_STATUS.IDLE)
+            self.change_page(UI_PAGE_NAME.DEVICE_MSG)
+            return
 
         file_name = '{}_{}_{}'.format(datetime.datetime.now().strftime("%Y%m%d%H%M%S"), self.user_data['user_id'],
                                       self.save_type)
         file_path = os.path.join(self.save_folder, '{}.npz'.format(file_name))
 
-        self.depth_camera_worker.depth_camera.save_file(file_path)
+        frame = self.depth_camera_worker.depth_camera.snapshot()
 
-        logging.info(f'[MAIN] save file: {file_name}')
+        # One sample for both the upload payload and the journal record
+        if self.settled_weight is not None:
+            weight = self.settled_weight
+        elif self.is_weight_reader_ok:
+            weight = self.weight_reader_worker.weight_reader.snapshot().value
+        else:
+            weight = 0
 
         data = {
             'payload': {
                 'user_id': self.user_data['user_id'],
-                'weight': self.weight_reader_worker.weight_reader.val if self.is_weight_reader_ok else 0,
+                'weight': weight,
                 'meal_date': datetime.datetime.now().strftime('%Y-%m-%d'),
                 'type': self.save_type
             },
@@ -215,18 +337,25 @@ class MainWindow(QMainWindow):
             'file_name': file_name
         }
 
-        upload_worker = UploadWorker(base_url=self.config.get('api', 'base_url'), data=data)
-        upload_worker.setAutoDelete(True)
-        upload_worker.signals.result.connect(self.return_upload_result)
+        # Compression and upload run on the save worker, the complete message shows right away
+        if not self.save_worker.submit(frame, data):
+            # The disk fell behind, refuse rather than block the GUI thread. No journal record is written
+            logging.warning(f'[MAIN] save queue full, refuse file: {file_name}')
+            self.settled_weight = None
+            self.change_status(LED_STATUS.IDLE)
+            self.change_page(UI_PAGE_NAME.SAVE_BUSY_MSG)
+            return
 
-        self.thread_pool.start(upload_worker)
+        logging.info(f'[MAIN] queue file: {file_name}')
 
         self.save_json({
             file_name: {
                 'user_id': self.user_data['user_id'],
-                'weight': self.weight_reader_worker.weight_reader.val if self.is_weight_reader_ok else 0,
+                'weight': weight,
                 'save_type': self.save_type,
-                'is_upload': self.is_upload
+                'meal_date': data['payload']['meal_date'],
+                'file_path': file_path,
+                'is_upload': 0
             }
         })
 
@@ -234,25 +363,21 @@ class MainWindow(QMainWindow):
 
         self.user_data = None
         self.save_type = None
-        self.is_upload = 0
+        self.settled_weight = None
 
         self.change_page(UI_PAGE_NAME.MESSAGE)
         self.change_status(LED_STATUS.IDLE)
 
-    def save_json(self, data):
-        if os.path.isfile(self.json_path):
-            with open(self.json_path) as json_file:
-                json_data = json.load(json_file)
-        else:
-            json_data = {}
-
-        json_data.update(data)
+    def upload_file(self, data):
+        self.upload_worker.enqueue(self.journal, data['file_name'])
 
-        with open(self.json_path, 'w') as outfile:
-            json.dump(json_data, outfile, indent=4)
+    def save_failed(self, data):
+        # Nothing was written, the upload worker must not retry it on every start
+        self.journal.update(data['file_name'], is_upload=UPLOAD_STATE.MISSING)
 
-    def return_upload_result(self, is_upload):
-        self.is_upload = is_upload
+    def save_json(self, data):
+        for file_name, record in data.items():
+            self.journal.append(file_name, record)
 
     def change_page(self, page):
         self.main_window.return_button.hide()
@@ -279,18 +404,37 @@ class MainWindow(QMainWindow):
             self.main_window.exit_button.show()
         elif page == UI_PAGE_NAME.DEVICE_MSG:
             self.device_message.start()
+        elif page == UI_PAGE_NAME.SAVE_BUSY_MSG:
+            self.save_busy_message.start()
 
         self.stacked_layout.setCurrentIndex(page)
 
     def user_button_handler(self, data):
         self.user_data = data
+        if self.is_weight_reader_ok:
+            # Power the HX711 up while the user picks the tray type, it settles before the capture
+            self.weight_reader_worker.weight_reader.wake()
         self.change_page(UI_PAGE_NAME.USER_CONTROL)
 
-    def show_image(self, img):
+    def show_weight(self, sample):
+        self.user_control.set_weight(sample.value)
+
+    def show_image(self):
+        frame_ring = self.depth_camera_worker.frame_ring
+        index = frame_ring.take()
+        if index is None:
+            return
+
+        img = frame_ring.get(index)
+
+        # Camera streams bgr8, let Qt swizzle instead of copying a reversed array
         len_y, len_x, _ = img.shape
-        qimg = QImage(img.data, len_x, len_y, QImage.Format_RGB888)
+        qimg = QImage(img.data, len_x, len_y, img.strides[0], QImage.Format_BGR888)
         self.user_control.image_view.setPixmap(QPixmap.fromImage(qimg))
 
+        # QPixmap owns its own copy now, hand the slot back to the worker
+        frame_ring.release(index)
+
     def set_setting_page_options(self):
         self.change_status(LED_STATUS.BUSY)
         self.change_page(UI_PAGE_NAME.LOADING)
@@ -357,16 +501,38 @@ class MainWindow(QMainWindow):
 
     def exit_handler(self):
         self.timer.stop()
-        self.depth_camera_worker.set_stop(True)
-        self.depth_camera_worker.depth_camera.pipeline.stop()
-        self.weight_reader_worker.set_stop(True)
+        if self.is_depth_camera_ok:
+            self.depth_camera_worker.set_stop(True)
+            self.depth_camera_worker.depth_camera.pipeline.stop()
+        if self.is_weight_reader_ok:
+            self.weight_reader_worker.set_stop(True)
         self.led_controller.clear_GPIO()
 
+        # Queued captures are written before the journal is closed. Their saved signals are not
+        # delivered anymore, the records stay pending and the next start uploads them
+        if self.is_depth_camera_ok:
+            self.save_worker.set_stop(True)
+            if not self.save_worker.wait(self.config.getfloat('save', 'exit_timeout')):
+                logging.warning('[MAIN] captures still queued, not written')
+
+        # Uploads in flight still write their result to the journal. Bounded, with the server down
+        # the rest stays pending and is retried on the next start
+        self.upload_worker.set_stop(True)
+        if not self.upload_worker.wait(self.config.getfloat('upload', 'exit_timeout')):
+            logging.warning('[MAIN] uploads still in flight, left pending')
+        self.journal.compact()
+        self.journal.export(self.json_path)
+        self.journal.close()
+        if self.recorder is not None:
+            self.recorder.close()
+
         self.close()
         logging.info('*** Close application ***')
 
 
 if __name__ == '__main__':
+    args = parser.parse_args()
+
     FORMAT = '%(asctime)s %(levelname)s: %(message)s'
     DATE_FORMAT = '%Y%m%d %H:%M:%S'
 
@@ -386,7 +552,17 @@ if __name__ == '__main__':
     config = configparser.ConfigParser()
     config.read(CONFIG_PATH, encoding='utf-8')
 
+    backend = get_backend(args.backend or config.get('hardware', 'backend'), config)
+    logging.info(f'[MAIN] hardware backend: {backend.name}')
+
+    recorder = None
+    if args.record:
+        recorder = SensorRecorder(
+            os.path.join(config.get('record', 'path'), datetime.datetime.now().strftime("%Y%m%d%H%M%S")),
+            camera_fps=config.getfloat('record', 'camera_fps')
+        )
+
     app = QApplication(sys.argv)
-    window = MainWindow(config)
+    window = MainWindow(config, backend, recorder)
     window.show()
     sys.exit(app.exec_())
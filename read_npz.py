@@ -1,6 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from utils.codec import read_image
+
 
 class RGBDData:
     def __init__(self, path):
@@ -17,8 +19,9 @@ def read_npz_file(file_path):
     data = np.load(file_path)
 
     if 'rgb_image' in data.files and 'depth_image' in data.files:
-        rgb_image = data['rgb_image']
-        depth_image = data['depth_image'] * data.get('depth_scale', 1)
+        # Decodes every capture codec (see utils/codec.py)
+        rgb_image = read_image(data, 'rgb_image')
+        depth_image = read_image(data, 'depth_image') * data.get('depth_scale', 1)
         fx = data.get('fx', 615.4642333984375)
         fy = data.get('fy', 615.4144897460938)
 
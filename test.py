@@ -11,6 +11,7 @@ from ui.config import UI_PAGE_NAME
 from ui.main_page import Ui_MainWindow
 from ui.message_component import MessageComponent
 from ui.test_module_page import TestModulePage
+from utils.backend import BACKENDS, get_backend
 
 
 CODE_VERSION = '1.0.1'
@@ -19,11 +20,11 @@ CONFIG_PATH = r'config/config.ini'
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-sl', '--show_log', action='store_true', help='show message in terminal')
-args = parser.parse_args()
+parser.add_argument('-b', '--backend', choices=list(BACKENDS), help='hardware backend, overrides [hardware] backend')
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, config):
+    def __init__(self, config, backend):
         super(MainWindow, self).__init__()
 
         self.config = config
@@ -36,7 +37,7 @@ class MainWindow(QMainWindow):
 
         self.showFullScreen()
 
-        self.test_module_page = TestModulePage(self.config)
+        self.test_module_page = TestModulePage(self.config, backend)
         self.test_module_page.save_config_signal.connect(self.save_config)
         self.test_module_page.init_finish_signal.connect(lambda: self.qls.setCurrentIndex(1))
 
@@ -72,6 +73,8 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == '__main__':
+    args = parser.parse_args()
+
     FORMAT = '%(asctime)s %(levelname)s: %(message)s'
     DATE_FORMAT = '%Y%m%d %H:%M:%S'
 
@@ -91,7 +94,10 @@ if __name__ == '__main__':
     config = configparser.ConfigParser()
     config.read(CONFIG_PATH, encoding='utf-8')
 
+    backend = get_backend(args.backend or config.get('hardware', 'backend'), config)
+    logging.info(f'[MAIN] hardware backend: {backend.name}')
+
     app = QApplication(sys.argv)
-    window = MainWindow(config)
+    window = MainWindow(config, backend)
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import numpy as np
+
+from utils.frame_store import FrameStore
+
+SHAPE = (480, 640)
+
+
+def tagged_frame(tag):
+    # Every pixel carries the tag, a torn copy mixes two tags
+    color_image = np.empty((*SHAPE, 3), dtype=np.uint8)
+    color_image[..., 0] = tag & 0xFF
+    color_image[..., 1] = (tag >> 8) & 0xFF
+    color_image[..., 2] = (tag >> 16) & 0xFF
+    depth_image = np.full(SHAPE, tag & 0xFFFF, dtype=np.uint16)
+    depth_valid_count = np.full(SHAPE, tag & 0xFF, dtype=np.uint8)
+    return color_image, depth_image, depth_valid_count
+
+
+def color_tag(color_image):
+    color_image = color_image.astype(np.int64)
+    return color_image[..., 0] | (color_image[..., 1] << 8) | (color_image[..., 2] << 16)
+
+
+def test_snapshots_are_consistent_under_concurrent_writes():
+    frame_store = FrameStore()
+    frames = [tagged_frame(tag) for tag in range(1, 9)]
+    stop = threading.Event()
+    written = [0]
+
+    def writer():
+        tag = 0
+        while not stop.is_set():
+            tag += 1
+            color_image, depth_image, depth_valid_count = frames[tag % len(frames)]
+            # Frames repeat, the tag written into the images is the index in frames
+            frame_store.write(color_image, depth_image, depth_valid_count, tag, float(tag))
+        written[0] = tag
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+
+    snapshots = 0
+    last_frame_number = 0
+    kept = []
+    deadline = time.monotonic() + 1.0
+    try:
+        while time.monotonic() < deadline:
+            frame = frame_store.snapshot()
+            if frame is None:
+                continue
+            snapshots += 1
+
+            tag = frame.frame_number % len(frames) + 1
+            assert np.all(color_tag(frame.color_image) == tag)
+            assert np.all(frame.depth_image == tag)
+            assert np.all(frame.depth_valid_count == tag)
+            assert frame.timestamp == float(frame.frame_number)
+            assert frame.frame_number >= last_frame_number
+            last_frame_number = frame.frame_number
+
+            if len(kept) < 10:
+                kept.append((tag, frame))
+    finally:
+        stop.set()
+        thread.join()
+
+    assert snapshots > 10
+    assert written[0] > snapshots / 10
+
+    # Snapshots own their images, later writes do not reach them
+    for tag, frame in kept:
+        assert np.all(color_tag(frame.color_image) == tag)
+        assert np.all(frame.depth_image == tag)
+
+
+def test_snapshot_before_first_write():
+    assert FrameStore().snapshot() is None
+
+
+def test_buffers_follow_the_image_shape():
+    frame_store = FrameStore()
+    frame_store.write(*tagged_frame(1), 1, 1.0)
+
+    color_image = np.zeros((540, 960, 3), dtype=np.uint8)
+    depth_image = np.ones((480, 640), dtype=np.uint16)
+    frame_store.write(color_image, depth_image, np.zeros((480, 640), dtype=np.uint8), 2, 2.0)
+
+    frame = frame_store.snapshot()
+    assert frame.color_image.shape == (540, 960, 3)
+    assert np.all(frame.depth_image == 1)
+    assert frame.frame_number == 2
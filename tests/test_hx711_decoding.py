@@ -0,0 +1,75 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from utils.hx711 import HX711
+from utils.hx711_bank import HX711Bank
+from utils.hx711_transport import RPiGPIOTransport
+from utils.sim_gpio import SimulatedGPIO, SimulatedHX711
+
+# Zero, the smallest steps either side and both ends of the 24-bit two's complement range
+VALUES = [0, 1, -1, 0x7FFFFF, -0x800000]
+
+
+def reverse_bits(value):
+    # 24 bits clocked out MSB first, read back in LSB / LSB order
+    return int('{:024b}'.format(value & 0xFFFFFF)[::-1], 2)
+
+
+def sequence(values):
+    # Raw value source, set_gain() throws the first conversion away. The next conversion starts as
+    # soon as a read ends, zeros after the values.
+    values = itertools.chain([0], values, itertools.repeat(0))
+    return lambda: next(values)
+
+
+def simulated_hx711(dout, values):
+    # A read preempted for more than 60 us would power the chip down, decoding is tested here and not timing
+    return SimulatedHX711(dout, 6, sequence(values), conversion_period=0, power_down_time=1, settle_time=0)
+
+
+def create_hx711(values):
+    gpio = SimulatedGPIO()
+    gpio.attach(simulated_hx711(5, values))
+    return HX711(5, 6, transport=RPiGPIOTransport(5, 6, gpio=gpio))
+
+
+def test_msb_msb_round_trip():
+    hx = create_hx711(VALUES)
+    hx.set_reading_format('MSB', 'MSB')
+
+    assert [hx.read_long() for _ in VALUES] == VALUES
+
+
+def test_lsb_lsb_round_trip():
+    # The chip always shifts MSB first, LSB / LSB reverses all 24 bits (BIT_REVERSE and byte order)
+    hx = create_hx711([reverse_bits(value) for value in VALUES])
+    hx.set_reading_format('LSB', 'LSB')
+
+    assert [hx.read_long() for _ in VALUES] == VALUES
+
+
+@pytest.mark.parametrize('byte_format, bit_format', [('MSB', 'MSB'), ('LSB', 'MSB'), ('MSB', 'LSB'), ('LSB', 'LSB')])
+def test_decode_matches_read_long(byte_format, bit_format):
+    # decode() is what the recorder and HX711Bank see, read_long() what a single HX711 returns
+    random = np.random.default_rng(0)
+    raw_values = [int(v) for v in random.integers(0, 1 << 24, 50)] + [reverse_bits(v) for v in VALUES]
+
+    hx = create_hx711(raw_values)
+    hx.set_reading_format(byte_format, bit_format)
+
+    for raw_value in raw_values:
+        assert hx.read_long() == hx.decode(raw_value)
+
+
+def test_bank_round_trip():
+    gpio = SimulatedGPIO()
+    for i, dout in enumerate((5, 13)):
+        gpio.attach(simulated_hx711(dout, VALUES[i:] + VALUES[:i]))
+    bank = HX711Bank([5, 13], 6, transport=RPiGPIOTransport([5, 13], 6, gpio=gpio))
+    bank.set_reading_format('MSB', 'MSB')
+
+    cells = [bank.read_cells() for _ in VALUES]
+    assert [int(values[0]) for values in cells] == VALUES
+    assert [int(values[1]) for values in cells] == VALUES[1:] + VALUES[:1]
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from utils.hx711 import HX711
+from utils.hx711_transport import RPiGPIOTransport
+from utils.sim_gpio import SimulatedGPIO, SimulatedHX711, NoisyLoadCell
+
+
+def create_gpio(conversion_period=0.05, douts=(5,)):
+    gpio = SimulatedGPIO()
+    for dout in douts:
+        # No power down when a read is preempted for more than 60 us
+        gpio.attach(SimulatedHX711(dout, 6, NoisyLoadCell(seed=dout), conversion_period=conversion_period,
+                                   power_down_time=1, settle_time=0))
+    return gpio
+
+
+def read_sample(transport):
+    # 24 data bits and one gain pulse, the next conversion starts
+    assert transport.wait_ready(1)
+    transport.clock_bits_parallel(25)
+
+
+def test_missing_load_cell_times_out():
+    # Nothing attached to DOUT, it stays pulled up
+    transport = RPiGPIOTransport(5, 6, gpio=SimulatedGPIO())
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        HX711(5, 6, transport=transport, timeout=0.2)
+    assert time.monotonic() - start < 1
+
+
+def test_wait_ready_sleeps_until_conversion():
+    transport = RPiGPIOTransport(5, 6, gpio=create_gpio(conversion_period=0.05))
+    read_sample(transport)
+
+    start = time.monotonic()
+    assert transport.wait_ready(1)
+    assert 0.04 < time.monotonic() - start < 0.5
+    assert transport.is_ready()
+
+
+def test_wait_ready_times_out_while_converting():
+    transport = RPiGPIOTransport(5, 6, gpio=create_gpio(conversion_period=0.5))
+    read_sample(transport)
+
+    start = time.monotonic()
+    assert not transport.wait_ready(0.1)
+    assert time.monotonic() - start < 0.4
+
+
+def test_edge_between_level_check_and_wait_is_not_missed():
+    gpio = create_gpio(conversion_period=10)
+    transport = RPiGPIOTransport(5, 6, gpio=gpio)
+    read_sample(transport)
+    device = gpio.devices[5]
+
+    input = gpio.input
+
+    def late_input(channel):
+        level = input(channel)
+        # DOUT falls right after it was read high, before wait_ready() sleeps
+        with device.lock:
+            device.ready_at = time.monotonic()
+        threading.Thread(target=device.input).start()
+        time.sleep(0.05)
+        return level
+
+    gpio.input = late_input
+
+    start = time.monotonic()
+    assert transport.wait_ready(2)
+    assert time.monotonic() - start < 1
+
+
+def test_bank_waits_for_every_dout():
+    gpio = create_gpio(conversion_period=0.05, douts=(5, 13, 19))
+    transport = RPiGPIOTransport([5, 13, 19], 6, gpio=gpio)
+    read_sample(transport)
+    gpio.devices[19].conversion_period = 0.15
+    read_sample(transport)
+
+    assert transport.wait_ready(1)
+    assert transport.ready_pins() == [True, True, True]
+
+
+def test_event_detection():
+    gpio = create_gpio(conversion_period=0.02)
+    channels = []
+    gpio.add_event_detect(5, gpio.FALLING, callback=channels.append)
+
+    with pytest.raises(RuntimeError):
+        gpio.add_event_detect(5, gpio.FALLING)
+
+    # First conversion
+    gpio.output(6, False)
+    assert channels == [5]
+    assert gpio.event_detected(5)
+    channels.clear()
+
+    # Read high after a sample, the falling edge is signalled without reading DOUT again
+    for _ in range(25):
+        gpio.output(6, True)
+        gpio.output(6, False)
+    assert gpio.input(5) == 1
+    time.sleep(0.1)
+
+    assert channels == [5]
+    assert gpio.event_detected(5)
+    assert not gpio.event_detected(5)
+
+    gpio.remove_event_detect(5)
+    assert gpio.devices[5].on_falling is None
@@ -0,0 +1,107 @@
+import email.parser
+import email.policy
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils.api import Api
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.server.headers = self.headers
+        self.server.body = self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+    server.daemon_threads = True
+    server.url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def requests_body(fields, files, boundary):
+    """
+    Body requests itself would send for the same form, with its random boundary swapped for ours.
+    """
+    body, content_type = requests.PreparedRequest()._encode_files(files, fields)
+    return body.replace(content_type.split('boundary=')[1].encode(), boundary.encode())
+
+
+def parse(headers, body):
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode() + body)
+    return {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+
+
+# Smaller than, equal to and larger than a few chunks, so reads end inside and on chunk boundaries
+@pytest.mark.parametrize('file_size', [0, 100, 1024, 3 * 1024 + 7])
+def test_upload_body(server, tmp_path, file_size):
+    content = os.urandom(file_size)
+    file_path = tmp_path / 'capture.npz'
+    file_path.write_bytes(content)
+
+    data = {
+        'payload': {'user_id': 7, 'weight': 123.5, 'meal_date': '2024-01-02', 'type': 1},
+        'file_path': str(file_path),
+        'file_name': 'capture'
+    }
+    progress = []
+    api = Api(server.url, retries=0, chunk_size=1024)
+    assert api.upload_data(data, progress=lambda sent, total: progress.append((sent, total))) == 200
+
+    # Content-Length was taken from __len__, the progress ends on the bytes actually sent
+    body = server.body
+    assert 'Transfer-Encoding' not in server.headers
+    assert int(server.headers['Content-Length']) == len(body)
+    assert progress[-1] == (len(body), len(body))
+
+    boundary = server.headers.get_param('boundary')
+    expected = requests_body(data['payload'], {'file': ('capture.npz', content, 'application/octet-stream')}, boundary)
+    assert body == expected
+
+    parts = parse(server.headers, body)
+    assert parts['user_id'].get_content() == '7'
+    assert parts['weight'].get_content() == '123.5'
+    assert parts['file'].get_filename() == 'capture.npz'
+    assert parts['file'].get_payload(decode=True) == content
+
+
+def test_batch_body(server, tmp_path):
+    items = []
+    contents = []
+    for i in range(3):
+        content = os.urandom(2000 + i)
+        file_path = tmp_path / f'capture_{i}.npz'
+        file_path.write_bytes(content)
+        contents.append(content)
+        items.append({'payload': {'user_id': i, 'type': 0}, 'file_path': str(file_path), 'file_name': f'capture_{i}'})
+
+    api = Api(server.url, retries=0, chunk_size=512)
+    api.upload_batch(items)
+
+    body = server.body
+    assert int(server.headers['Content-Length']) == len(body)
+
+    parts = parse(server.headers, body)
+    assert [parts[f'file_{i}'].get_payload(decode=True) for i in range(3)] == contents
+    assert [parts[f'file_{i}'].get_filename() for i in range(3)] == [f'capture_{i}.npz' for i in range(3)]
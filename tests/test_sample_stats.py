@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from utils import sample_stats
+from utils.weight_sampler import WeightSampler, FILTER
+
+
+def random_arrays(count=2000, seed=0):
+    """
+    Raw load cell like arrays of 1 - 60 samples: gaussian noise around an offset, some with spikes,
+    some with many repeated values (quantised noise, a MAD of 0).
+    """
+    random = np.random.default_rng(seed)
+    for i in range(count):
+        n = int(random.integers(1, 61))
+        kind = i % 4
+        if kind == 0:
+            samples = random.normal(8000, 20, n)
+        elif kind == 1:
+            samples = np.round(random.normal(8000, 20, n)).astype(np.int64)
+        elif kind == 2:
+            samples = random.integers(-2, 3, n) + 8000
+        else:
+            samples = random.normal(-120000, 5, n)
+            spikes = random.random(n) < 0.1
+            samples[spikes] += random.choice([-1, 1], spikes.sum()) * random.uniform(500, 50000, spikes.sum())
+        yield samples
+
+
+def reference_trimmed_mean(samples, trim):
+    n = len(samples)
+    k = int(n * trim)
+    if k == 0 or n - 2 * k <= 0:
+        return np.mean(samples)
+    return np.sort(samples)[k:n - k].mean()
+
+
+def reference_reject_outliers(samples, threshold):
+    deviation = np.abs(samples - np.median(samples))
+    mad = np.median(deviation)
+    if mad == 0:
+        return samples
+    return samples[sample_stats.MAD_SCALE * deviation / mad <= threshold]
+
+
+def test_median_matches_numpy():
+    for samples in random_arrays():
+        assert sample_stats.median(samples) == np.median(samples)
+
+
+@pytest.mark.parametrize('trim', [0.1, 0.2, 0.25, 0.4])
+def test_trimmed_mean_matches_sorted_slice(trim):
+    for samples in random_arrays(seed=1):
+        # Same values, summed in another order
+        assert sample_stats.trimmed_mean(samples, trim) == pytest.approx(reference_trimmed_mean(samples, trim), rel=1e-12)
+
+
+@pytest.mark.parametrize('threshold', [2.0, 3.5])
+def test_reject_outliers_matches_numpy_mad_filter(threshold):
+    for samples in random_arrays(seed=2):
+        kept = sample_stats.reject_outliers(samples, threshold)
+        np.testing.assert_array_equal(kept, reference_reject_outliers(samples, threshold))
+
+
+@pytest.mark.parametrize('filter', [FILTER.MEDIAN, FILTER.TRIMMED_MEAN])
+def test_weight_sampler_window(filter):
+    # Small ring so that the window wraps around its end
+    sampler = WeightSampler(size=16, filter=filter, window=10, trim=0.2)
+    samples = np.random.default_rng(3).normal(8000, 20, 100)
+    for i, value in enumerate(samples):
+        window = samples[max(0, i - 9):i + 1]
+        if filter == FILTER.MEDIAN:
+            expected = np.median(window)
+        else:
+            expected = reference_trimmed_mean(window, 0.2)
+        assert sampler.push(value, i) == pytest.approx(expected, rel=1e-12)
+
+
+def test_lists_are_accepted():
+    assert sample_stats.median([3, 1, 2, 4]) == 2.5
+    assert sample_stats.trimmed_mean([1, 2, 3, 4, 100], 0.2) == 3
+    assert list(sample_stats.reject_outliers([10, 11, 10, 12, 11, 500])) == [10, 11, 10, 12, 11]
+
+
+def test_no_samples():
+    with pytest.raises(ValueError):
+        sample_stats.median([])
+    with pytest.raises(ValueError):
+        sample_stats.trimmed_mean([])
@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+
+from PyQt5.QtCore import Qt
+
+from worker.save_worker import SaveWorker
+
+
+class BlockingCamera:
+    """
+    Stands in for DepthCamera, save_file() waits until the test releases the writer.
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def save_file(self, file, frame, codec):
+        self.release.wait(10)
+        file.write(frame)
+
+
+def capture(tmp_path, index):
+    file_name = f'capture_{index}'
+    return {'file_path': str(tmp_path / f'{file_name}.npz'), 'file_name': file_name}
+
+
+def test_full_queue_refuses_without_blocking(tmp_path):
+    camera = BlockingCamera()
+    save_worker = SaveWorker(camera, queue_size=2)
+    saved = []
+    # No event loop here, take the signal on the writer thread
+    save_worker.signals.saved.connect(lambda data: saved.append(data['file_name']), Qt.DirectConnection)
+    thread = threading.Thread(target=save_worker.run)
+    thread.start()
+
+    try:
+        # The first capture is taken off the queue and held by the writer
+        assert save_worker.submit(b'0', capture(tmp_path, 0))
+        while not save_worker.queue.empty():
+            time.sleep(0.01)
+
+        assert save_worker.submit(b'1', capture(tmp_path, 1))
+        assert save_worker.submit(b'2', capture(tmp_path, 2))
+        assert not save_worker.submit(b'3', capture(tmp_path, 3))
+    finally:
+        camera.release.set()
+        save_worker.set_stop(True)
+
+    # Stop still writes what was queued
+    assert save_worker.wait(10)
+    thread.join()
+    assert saved == ['capture_0', 'capture_1', 'capture_2']
+    assert sorted(os.listdir(tmp_path)) == ['capture_0.npz', 'capture_1.npz', 'capture_2.npz']
+
+
+def test_wait_times_out_while_writing(tmp_path):
+    camera = BlockingCamera()
+    save_worker = SaveWorker(camera, queue_size=2)
+    thread = threading.Thread(target=save_worker.run)
+    thread.start()
+
+    save_worker.submit(b'0', capture(tmp_path, 0))
+    save_worker.set_stop(True)
+    assert not save_worker.wait(0.2)
+
+    camera.release.set()
+    assert save_worker.wait(10)
+    thread.join()
@@ -0,0 +1,284 @@
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.api import Api
+from utils.journal import CaptureJournal, FSYNC_POLICY, UPLOAD_STATE
+from worker.upload_worker import UploadWorker
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        with server.lock:
+            server.requests.append(self.path)
+            server.sent.extend(name.decode() for name in re.findall(rb'; filename="([^"]+)\.npz"', body))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            fail = server.failures > 0
+            if fail:
+                server.failures -= 1
+
+        time.sleep(server.delay)
+
+        with server.lock:
+            server.active -= 1
+
+        if fail:
+            self.reply(500, {})
+        elif self.path == '/api/meals/batch':
+            if not server.batch:
+                self.reply(404, {})
+            else:
+                results = []
+                with server.lock:
+                    for file_name in re.findall(rb'; filename="([^"]+)\.npz"', body):
+                        # Each listed item fails once
+                        if file_name.decode() in server.failed_items:
+                            server.failed_items.remove(file_name.decode())
+                            results.append({'status': 500})
+                        else:
+                            results.append({'status': 200})
+
+                    if server.short_results > 0:
+                        server.short_results -= 1
+                        results = results[:-1]
+
+                self.reply(200, {'data': {'results': results}})
+        else:
+            self.reply(200, {'data': {}})
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """
+    Stand-in data collect server, answers 500 to the first `failures` uploads. In a batch, the
+    items in `failed_items` get a 500 result once, and the first `short_results` batches answer
+    one result less than there were items.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.sent = []
+    server.failures = 0
+    server.delay = 0
+    server.batch = True
+    server.failed_items = set()
+    server.short_results = 0
+    server.active = 0
+    server.max_active = 0
+    server.url = 'http://127.0.0.1:%d' % server.server_address[1]
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def add_captures(journal, folder, count, start=0):
+    names = []
+    for i in range(start, start + count):
+        file_name = f'{os.path.basename(folder)}120000_{i}_0'
+        file_path = os.path.join(folder, f'{file_name}.npz')
+        with open(file_path, 'wb') as f:
+            f.write(os.urandom(4096))
+        journal.append(file_name, {
+            'user_id': i,
+            'weight': 100.0,
+            'save_type': 0,
+            'meal_date': '2024-01-01',
+            'file_path': file_path,
+            'is_upload': 0
+        })
+        names.append(file_name)
+    return names
+
+
+def start_worker(server, journal, save_dir, **kwargs):
+    options = dict(max_concurrent=2, backoff_base=0.05, backoff_max=0.2, batch_size=1)
+    options.update(kwargs)
+    upload_worker = UploadWorker(api=Api(server.url, retries=0), journal=journal, save_dir=save_dir, **options)
+    thread = threading.Thread(target=upload_worker.run, daemon=True)
+    thread.start()
+    return upload_worker
+
+
+def wait_uploaded(journal, names, timeout=10, state=UPLOAD_STATE.UPLOADED):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(journal.get(name)['is_upload'] == state for name in names):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def stop(upload_worker):
+    upload_worker.set_stop(True)
+    assert upload_worker.wait(10)
+
+
+@pytest.fixture
+def today(tmp_path):
+    folder = tmp_path / '20240102'
+    folder.mkdir()
+    journal = CaptureJournal(str(folder / 'data.jsonl'), fsync=FSYNC_POLICY.NEVER)
+    yield str(folder), journal
+    journal.close()
+
+
+def test_retry_failed_uploads_with_backoff(server, tmp_path, today):
+    folder, journal = today
+    names = add_captures(journal, folder, 3)
+    server.failures = 4
+
+    upload_worker = start_worker(server, journal, str(tmp_path))
+    assert wait_uploaded(journal, names)
+    stop(upload_worker)
+
+    assert len(server.requests) == 3 + 4
+    # Attempts are forgotten once the upload went through
+    assert upload_worker.attempts == {}
+
+
+def test_pending_captures_of_earlier_days_are_uploaded_on_start(server, tmp_path, today):
+    folder, journal = today
+    earlier = tmp_path / '20240101'
+    earlier.mkdir()
+    earlier_journal = CaptureJournal(str(earlier / 'data.jsonl'), fsync=FSYNC_POLICY.NEVER)
+    earlier_names = add_captures(earlier_journal, str(earlier), 2)
+    earlier_journal.update(earlier_names[0], is_upload=1)
+    earlier_journal.close()
+
+    names = add_captures(journal, folder, 1)
+
+    upload_worker = start_worker(server, journal, str(tmp_path))
+    assert wait_uploaded(journal, names)
+    stop(upload_worker)
+
+    # Only the capture still pending from the earlier day was sent again
+    assert len(server.requests) == 2
+    earlier_journal = CaptureJournal(str(earlier / 'data.jsonl'), fsync=FSYNC_POLICY.NEVER)
+    assert all(earlier_journal.get(name)['is_upload'] == 1 for name in earlier_names)
+    earlier_journal.close()
+
+
+def test_concurrent_uploads_are_limited(server, tmp_path, today):
+    folder, journal = today
+    names = add_captures(journal, folder, 8)
+    server.delay = 0.05
+
+    upload_worker = start_worker(server, journal, str(tmp_path), max_concurrent=2)
+    assert wait_uploaded(journal, names)
+    stop(upload_worker)
+
+    assert server.max_active <= 2
+
+
+def test_batch_falls_back_to_single_uploads(server, tmp_path, today):
+    folder, journal = today
+    names = add_captures(journal, folder, 4)
+    server.batch = False
+
+    upload_worker = start_worker(server, journal, str(tmp_path), batch_size=4)
+    assert wait_uploaded(journal, names)
+    stop(upload_worker)
+
+    assert server.requests[0] == '/api/meals/batch'
+    assert server.requests.count('/api/meals') == 4
+
+
+def test_batch_upload(server, tmp_path, today):
+    folder, journal = today
+    names = add_captures(journal, folder, 4)
+
+    upload_worker = start_worker(server, journal, str(tmp_path), batch_size=4)
+    assert wait_uploaded(journal, names)
+    stop(upload_worker)
+
+    assert server.requests == ['/api/meals/batch']
+    assert all(journal.get(name)['is_upload'] == 1 for name in names)
+
+
+def test_failed_item_of_batch_is_retried(server, tmp_path, today):
+    folder, journal = today
+    names = add_captures(journal, folder, 4)
+    server.failed_items = {names[2]}
+
+    upload_worker = start_worker(server, journal, str(tmp_path), batch_size=4)
+    assert wait_uploaded(journal, names)
+    stop(upload_worker)
+
+    # Only the failed item was sent again, on its own
+    assert server.requests == ['/api/meals/batch', '/api/meals']
+
+
+def test_batch_with_wrong_result_count_is_retried(server, tmp_path, today):
+    folder, journal = today
+    names = add_captures(journal, folder, 4)
+    server.short_results = 1
+
+    upload_worker = start_worker(server, journal, str(tmp_path), batch_size=4)
+    assert wait_uploaded(journal, names)
+    stop(upload_worker)
+
+    # Results that cannot be matched to the items mark none of them uploaded, all four are sent again
+    assert server.requests[0] == '/api/meals/batch'
+    assert sorted(server.sent) == sorted(names * 2)
+
+
+def test_stop_waits_for_uploads_in_flight(server, tmp_path, today):
+    folder, journal = today
+    server.delay = 0.3
+    names = add_captures(journal, folder, 1)
+    upload_worker = start_worker(server, journal, str(tmp_path))
+
+    deadline = time.monotonic() + 5
+    while len(server.requests) == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    stop(upload_worker)
+
+    # The result is in the journal before it could be compacted and closed
+    assert journal.get(names[0])['is_upload'] == 1
+
+
+def test_capture_without_file_is_marked_missing(server, tmp_path, today):
+    folder, journal = today
+    names = add_captures(journal, folder, 2)
+    os.remove(journal.get(names[0])['file_path'])
+
+    upload_worker = start_worker(server, journal, str(tmp_path))
+    assert wait_uploaded(journal, names[1:])
+    assert wait_uploaded(journal, names[:1], state=UPLOAD_STATE.MISSING)
+    stop(upload_worker)
+    assert len(server.requests) == 1
+
+    # Not queued again on the next start
+    upload_worker = start_worker(server, journal, str(tmp_path))
+    time.sleep(0.2)
+    stop(upload_worker)
+    assert len(server.requests) == 1
+    assert upload_worker.attempts == {}
@@ -0,0 +1,71 @@
+import time
+
+import numpy as np
+import pytest
+
+from utils.sim_gpio import NoisyLoadCell
+from utils.weight_sampler import WeightSampler
+from utils.zero_tracker import ZeroTracker
+
+REFERENCE_UNIT = -500
+RATE = 10
+
+
+def replay(drift, duration, max_rate=0.05, hold_time=10.0):
+    """
+    Empty scale, NoisyLoadCell offset drifting by drift grams per second, replayed at RATE samples per
+    second in synthetic time with the offset correction applied like WeightReader.track_zero().
+    :return: ZeroTracker, start (time zero of the samples), sample times, weights after correction
+    """
+    load_cell = NoisyLoadCell(offset=8000, reference_unit=REFERENCE_UNIT, noise=20, seed=0,
+                              drift=drift * REFERENCE_UNIT)
+    sampler = WeightSampler(filter='median', window=10)
+    zero_tracker = ZeroTracker(band=5.0, hold_time=hold_time, max_rate=max_rate, history=4096)
+
+    # Synthetic time starts when the tracker did, it limits the first correction from then on
+    start = zero_tracker.last_correction
+    times = start + np.arange(0, duration, 1 / RATE)
+    weights = np.empty(len(times))
+    offset = 0
+    for i, t in enumerate(times):
+        # The load cell drifts with the time since its start, move the start back instead of waiting
+        load_cell.start = time.monotonic() - (t - start)
+        raw = load_cell()
+        weights[i] = sampler.push((raw - load_cell.offset) / REFERENCE_UNIT - offset, t)
+        offset += zero_tracker.update(sampler, now=t)
+
+    return zero_tracker, start, times, weights
+
+
+def assert_rate_limited(zero_tracker, start, max_rate):
+    history = zero_tracker.get_history()
+    assert len(history) > 0
+
+    previous = np.concatenate(([start], history[:-1, 0]))
+    limits = max_rate * (history[:, 0] - previous)
+    assert np.all(np.abs(history[:, 1]) <= limits + 1e-9)
+    return history, limits
+
+
+def test_drift_below_max_rate_is_followed():
+    drift = 0.02
+    duration = 1800
+    zero_tracker, start, times, weights = replay(drift, duration)
+
+    history, _ = assert_rate_limited(zero_tracker, start, 0.05)
+    assert history[-1, 2] == pytest.approx(drift * duration, abs=1.0)
+
+    # After the first correction the residual is at most the drift of one hold time plus noise,
+    # without tracking it would reach drift * duration = 36 g
+    settled = times > history[0, 0]
+    assert np.abs(weights[settled]).max() < drift * (zero_tracker.hold_time + 2) + 0.2
+    assert abs(weights[times > times[-1] - 300].mean()) < drift * zero_tracker.hold_time
+
+
+def test_corrections_are_clamped_to_max_rate():
+    # Faster than max_rate, every correction is clamped and the weight leaves the band
+    zero_tracker, start, times, weights = replay(drift=0.2, duration=300)
+
+    history, limits = assert_rate_limited(zero_tracker, start, 0.05)
+    assert np.allclose(np.abs(history[:, 1]), limits)
+    assert np.abs(weights[-1]) > zero_tracker.band
@@ -7,3 +7,4 @@ class UI_PAGE_NAME:
     INIT_MSG = 5
     ERROR_MSG = 6
     DEVICE_MSG = 7
+    SAVE_BUSY_MSG = 8
@@ -8,10 +8,12 @@ from PyQt5.QtCore import QThreadPool, QRunnable, pyqtSlot, QObject, pyqtSignal,
 from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtWidgets import QWidget, QPushButton, QStackedLayout, QLabel, QFrame, QGridLayout, QProgressBar
 
+from utils.calibration import Calibration
 from utils.depth_camera import DepthCamera
 from utils.led import LedController
-from utils.weight_reader import WeightReader
+from utils.weight_reader import WeightReader, POWER_POLICY
 from utils.worker import Worker
+from worker.calibration_worker import CalibrationWorker
 
 READ_TIME = 60
 
@@ -70,9 +72,10 @@ class TestModulePage(QWidget):
     init_finish_signal = pyqtSignal()
     LED_STATUS = ['state_setup', 'state_idle', 'state_busy']
 
-    def __init__(self, config):
+    def __init__(self, config, backend):
         super(TestModulePage, self).__init__()
         self.config = config
+        self.backend = backend
 
         # 1880 * 1040
         self.setGeometry(0, 0, 1880, 1040)
@@ -91,7 +94,9 @@ class TestModulePage(QWidget):
         self.depth_camera_page = DepthCameraPage(self, (0, 0), (1300, 900))
         self.led_module_page = LEDModulePage(self, (0, 0), (1300, 900))
         self.weight_module_page = WeightModulePage(self, (0, 0), (1300, 900))
-        self.weight_module_page.calibrate_signal.connect(self.read_empty_value)
+        self.weight_module_page.calibrate_signal.connect(self.read_calibration_point)
+        self.weight_module_page.add_point_signal.connect(
+            lambda: self.weight_module_page.change_component(self.weight_module_page.COMPONENT_INPUT))
         self.weight_module_page.finish_signal.connect(self.reset_weight_reader)
 
         self.stacked_layout.addWidget(QWidget(self))
@@ -99,8 +104,9 @@ class TestModulePage(QWidget):
         self.stacked_layout.addWidget(self.led_module_page)
         self.stacked_layout.addWidget(self.weight_module_page)
 
-        # 多執行序
+        # 多執行序, the camera and weight workers each hold a thread while the page is open
         self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(max(4, self.thread_pool.maxThreadCount()))
 
         # 初始化執行序
         self.init_worker = Worker(self.setup_sensors)
@@ -117,23 +123,14 @@ class TestModulePage(QWidget):
         self.weight_timer.setInterval(100)
         self.weight_timer.timeout.connect(self.weight_handler)
 
-        self.weight_sum_timer = QTimer()
-        self.weight_sum_timer.setInterval(100)
-        self.weight_sum_timer.timeout.connect(self.weight_sum_handler)
-
         # Params
-        self.read_times = READ_TIME
-        self.empty_value = []
-        self.object_value = []
-        self.object_weight = 0
-        self.calibrate_status = 0
-        """
-            0: empty
-            1: object
-        """
+        self.calibration = None
+        self.calibration_worker = None
+        self.weight_worker = None
+        self.is_calibration_pending = False
 
     def setup_sensors(self):
-        self.depth_camera_worker = DepthCameraWorker()
+        self.depth_camera_worker = DepthCameraWorker(self.backend)
         self.depth_camera_worker.signals.data.connect(self.show_image)
 
         self.thread_pool.start(self.depth_camera_worker)
@@ -142,14 +139,23 @@ class TestModulePage(QWidget):
         self.led_controller = LedController(
             channel_r=self.config.getint('led', 'channel_r'),
             channel_b=self.config.getint('led', 'channel_b'),
-            channel_g=self.config.getint('led', 'channel_g')
+            channel_g=self.config.getint('led', 'channel_g'),
+            gpio=self.backend.gpio()
         )
 
         # Weight
         self.weight_reader = WeightReader(
             dout=self.config.getint('weight', 'channel_data'),
             pd_sck=self.config.getint('weight', 'channel_clk'),
-            reference_unit=self.config.getfloat('weight', 'reference_unit')
+            reference_unit=self.config.getfloat('weight', 'reference_unit'),
+            transport=self.backend.weight_transport(self.config.get('weight', 'transport')),
+            filter=self.config.get('weight', 'filter'),
+            window=self.config.getint('weight', 'filter_window'),
+            # The page reads continuously while it is open
+            power_policy=POWER_POLICY.ALWAYS_ON,
+            cells=json.loads(self.config.get('weight', 'cells')),
+            cell_scales=json.loads(self.config.get('weight', 'cell_scales')) or None,
+            gpio=self.backend.gpio()
         )
 
         self.weight_reader.setup()
@@ -162,9 +168,9 @@ class TestModulePage(QWidget):
             self.led_timer.stop()
 
         if component == COMPONENT_NAME.WEIGHT:
-            self.weight_timer.start()
+            self.start_weight_worker()
         else:
-            self.weight_timer.stop()
+            self.stop_weight_worker()
 
         self.stacked_layout.setCurrentIndex(component)
 
@@ -182,82 +188,111 @@ class TestModulePage(QWidget):
         self.led_status = (self.led_status + 1) % 3
 
     def weight_handler(self):
-        self.weight_reader.read()
-        self.weight_module_page.set_weight(self.weight_reader.val)
+        # The weight worker reads the HX711, the GUI thread only shows its latest sample
+        self.weight_module_page.set_weight(self.weight_reader.snapshot().value)
 
-    @staticmethod
-    def process_value(value):
-        value.sort()
-        trim_amount = int(len(value) * 0.1)
-        value = value[trim_amount: -trim_amount]
-        return sum(value) / len(value)
+    def start_weight_worker(self):
+        self.weight_timer.start()
 
-    def weight_sum_handler(self):
-        self.weight_reader.read(debug=True)
-        self.weight_module_page.set_weight(self.weight_reader.val)
+        # Only one reader of the HX711 at a time, a stopping worker or a calibration starts it when done
+        if self.weight_worker is None and self.calibration_worker is None:
+            self.weight_worker = WeightWorker(self.weight_reader)
+            self.weight_worker.signals.finished.connect(self.weight_worker_finished)
+            self.thread_pool.start(self.weight_worker)
 
-        if self.calibrate_status == 0:
-            self.empty_value.append(self.weight_reader.val)
-        elif self.calibrate_status == 1:
-            self.object_value.append(self.weight_reader.val)
+    def stop_weight_worker(self):
+        self.weight_timer.stop()
+        if self.weight_worker is not None:
+            self.weight_worker.set_stop(True)
 
-        self.read_times -= 1
-        self.weight_module_page.progress_bar.setValue(READ_TIME - self.read_times)
+    def weight_worker_finished(self):
+        self.weight_worker = None
+        if self.is_calibration_pending:
+            self.start_calibration_worker()
+        elif self.weight_timer.isActive():
+            self.start_weight_worker()
 
-        if self.read_times == 0:
-            self.read_times = READ_TIME
-            self.weight_sum_timer.stop()
+    def read_calibration_point(self):
+        """
+        Read the raw samples of one calibration point in the background, the empty scale starts a new calibration.
+        """
+        self.stop_weight_worker()
 
-            if self.calibrate_status == 0:
-                self.empty_value = self.process_value(self.empty_value)
-            elif self.calibrate_status == 1:
-                self.object_value = self.process_value(self.object_value)
+        if self.weight_module_page.object_weight == 0:
+            self.calibration = Calibration(trim=0.1)
 
-            if self.calibrate_status == 1:
-                reference_unit = (self.object_value - self.empty_value) / self.weight_module_page.object_weight
+        self.weight_module_page.progress_bar.setMinimum(0)
+        self.weight_module_page.progress_bar.setMaximum(READ_TIME)
+        self.weight_module_page.progress_bar.setValue(0)
 
-                self.save_config_signal.emit({
-                    'weight': {
-                        'reference_unit': reference_unit
-                    }
-                })
+        self.weight_module_page.change_component(self.weight_module_page.COMPONENT_WAIT)
 
-                self.weight_reader.hx.set_reference_unit(reference_unit)
+        # Started once the weight worker released the HX711
+        self.is_calibration_pending = True
+        if self.weight_worker is None:
+            self.start_calibration_worker()
 
-                self.object_value = []
-                self.empty_value = []
-                self.weight_module_page.object_weight = 0
+    def start_calibration_worker(self):
+        self.is_calibration_pending = False
 
-                self.weight_module_page.change_component(self.weight_module_page.COMPONENT_FINISH)
+        self.calibration_worker = CalibrationWorker(self.weight_reader.hx, READ_TIME)
+        self.calibration_worker.signals.progress.connect(
+            lambda count, total: self.weight_module_page.progress_bar.setValue(count))
+        self.calibration_worker.signals.result.connect(self.calibration_point_handler)
+        self.calibration_worker.signals.error.connect(self.calibration_error_handler)
+        self.calibration_worker.signals.finished.connect(self.calibration_worker_finished)
+        self.thread_pool.start(self.calibration_worker)
 
-                self.weight_sum_timer.stop()
-            else:
-                self.weight_module_page.change_component(self.weight_module_page.COMPONENT_INPUT)
+    def calibration_worker_finished(self):
+        self.calibration_worker = None
+        if self.weight_timer.isActive():
+            self.start_weight_worker()
 
-            self.calibrate_status = (self.calibrate_status + 1) % 2
+    def calibration_point_handler(self, samples):
+        point = self.calibration.add_point(self.weight_module_page.object_weight, samples)
+        logging.info(f'[TEST MODULE] calibration point {point.weight}: mean {point.mean:.1f}, '
+                     f'std {point.std:.1f}, ci ±{point.ci:.1f}, {point.count} samples, {point.outliers} outliers')
 
-    def read_empty_value(self):
-        self.weight_timer.stop()
-        self.weight_reader.reset()
+        self.weight_module_page.object_weight = 0
 
-        self.weight_module_page.progress_bar.setValue(1)
-        self.weight_module_page.progress_bar.setMinimum(1)
-        self.weight_module_page.progress_bar.setMaximum(READ_TIME)
+        if not self.calibration.is_ready():
+            self.weight_module_page.change_component(self.weight_module_page.COMPONENT_INPUT)
+            return
 
-        self.weight_sum_timer.start()
-        self.weight_module_page.change_component(self.weight_module_page.COMPONENT_WAIT)
+        result = self.calibration.fit()
+        logging.info(f'[TEST MODULE] calibration: {result}')
+
+        self.save_config_signal.emit({
+            'weight': {
+                'reference_unit': result['reference_unit']
+            }
+        })
+
+        self.weight_reader.hx.set_reference_unit(result['reference_unit'])
+        self.weight_reader.hx.set_offset(result['offset'])
+
+        self.weight_module_page.set_quality(result)
+        self.weight_module_page.change_component(self.weight_module_page.COMPONENT_FINISH)
+
+    def calibration_error_handler(self, message):
+        logging.warning(f'[TEST MODULE] calibration failed: {message}')
+        self.calibration = None
+        self.weight_module_page.object_weight = 0
+        self.start_weight_worker()
+        self.weight_module_page.change_component(self.weight_module_page.COMPONENT_CLEAR)
 
     def reset_weight_reader(self):
         self.weight_reader.hx.reset()
         self.weight_reader.hx.tare()
-        self.weight_timer.start()
+        self.start_weight_worker()
         self.weight_module_page.change_component(self.weight_module_page.COMPONENT_CLEAR)
 
     def exit_handler(self):
         self.depth_camera_worker.set_stop(True)
         self.led_timer.stop()
-        self.weight_timer.stop()
-        self.weight_sum_timer.stop()
+        self.stop_weight_worker()
+        if self.calibration_worker is not None:
+            self.calibration_worker.set_stop(True)
         self.led_controller.clear_GPIO()
 
 
@@ -348,11 +383,11 @@ class DepthCameraWorkerSignals(QObject):
 
 
 class DepthCameraWorker(QRunnable):
-    def __init__(self):
+    def __init__(self, backend):
         super(DepthCameraWorker, self).__init__()
 
         self.signals = DepthCameraWorkerSignals()
-        self.depth_camera = DepthCamera()
+        self.depth_camera = DepthCamera(rs=backend.realsense())
         self.stop = False
 
     @pyqtSlot()
@@ -376,8 +411,44 @@ class DepthCameraWorker(QRunnable):
         self.stop = stop
 
 
+class WeightWorkerSignals(QObject):
+    finished = pyqtSignal()
+
+
+class WeightWorker(QRunnable):
+    """
+    Reads the load cell continuously, the page shows weight_reader.snapshot().
+
+    :param weight_reader: WeightReader, not read by anyone else until finished is emitted
+    """
+
+    def __init__(self, weight_reader):
+        super(WeightWorker, self).__init__()
+
+        self.signals = WeightWorkerSignals()
+        self.weight_reader = weight_reader
+        self.stop = False
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            while not self.stop:
+                try:
+                    self.weight_reader.read()
+                except TimeoutError:
+                    logging.warning("[WEIGHT WORKER] hx711 not ready, retry")
+        except:
+            logging.error("[WEIGHT WORKER] catch an exception.", exc_info=True)
+        finally:
+            self.signals.finished.emit()
+
+    def set_stop(self, stop):
+        self.stop = stop
+
+
 class WeightModulePage(QWidget):
     calibrate_signal = pyqtSignal()
+    add_point_signal = pyqtSignal()
     finish_signal = pyqtSignal()
 
     FONT = QtGui.QFont('微軟正黑體', 36)
@@ -519,7 +590,20 @@ class WeightModulePage(QWidget):
         self.label_finish.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter)
         self.label_finish.setStyleSheet(self.LABEL_STYLE.format(**self.COLOR_LIST[2]))
 
-        self.btn_finish = Button(self.calibrate_finish_widget, '返回', (size[0] // 2 - 250, 280), (500, 200))
+        # calibration quality
+        self.quality_info = '解析度: {resolution:.2f} 公克，誤差: {max_residual:.2f} 公克，R²: {r2:.5f}'
+        self.label_quality = QLabel('', self.calibrate_finish_widget)
+        self.label_quality.setFont(QtGui.QFont('微軟正黑體', 28))
+        self.label_quality.resize(1300, 80)
+        self.label_quality.setGeometry(
+            QtCore.QRect(0, 110, self.label_quality.width(), self.label_quality.height()))
+        self.label_quality.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter)
+
+        self.btn_add_point = Button(self.calibrate_finish_widget, '新增校正點', (size[0] // 2 - 550, 280), (500, 200))
+        self.btn_add_point.setStyleSheet(self.btn_add_point.BTN_STYLE.format(**self.btn_add_point.BLUE))
+        self.btn_add_point.clicked.connect(lambda: self.add_point_signal.emit())
+
+        self.btn_finish = Button(self.calibrate_finish_widget, '返回', (size[0] // 2 + 50, 280), (500, 200))
         self.btn_finish.setStyleSheet(self.btn_finish.BTN_STYLE.format(**self.btn_finish.RED))
         self.btn_finish.clicked.connect(lambda: self.finish_signal.emit())
 
@@ -537,7 +621,12 @@ class WeightModulePage(QWidget):
         self.calibrate_weight = weight
         self.label_calibrate_weight.setText(self.calibrate_weight_info.format(weight))
 
+    def set_quality(self, result):
+        self.label_quality.setText(self.quality_info.format(**result))
+
     def calibrate(self):
+        # Start over from the empty scale
+        self.object_weight = 0
         self.calibrate_signal.emit()
 
     def confirm(self, object_weight):
@@ -65,9 +65,16 @@ class UserControl(QWidget):
         self.image_view.setPixmap(QPixmap.fromImage(QImage('resource/photo.png')))
         self.image_view.setGeometry(QtCore.QRect(0, 130, int(640*1.5), int(480*1.5)))
 
+        # live weight
+        self.weight_label = QLabel(self)
+        self.weight_label.setFont(QtGui.QFont('微軟正黑體', 36))
+        self.weight_label.setAlignment(QtCore.Qt.AlignVCenter | QtCore.Qt.AlignRight)
+        self.weight_label.setGeometry(QtCore.QRect(1880//2 + 50, 0, 1880//2 - 50, 100))
+        self.set_weight(0)
+
         # button area
         self.btn_area = QWidget(self)
-        self.btn_area.setGeometry(QtCore.QRect(1880//2 + 50, 0, 1880//2 - 50, 900))
+        self.btn_area.setGeometry(QtCore.QRect(1880//2 + 50, 100, 1880//2 - 50, 800))
 
         # set layout
         self.layout = QGridLayout(self.btn_area)
@@ -90,5 +97,8 @@ class UserControl(QWidget):
         # set layout
         self.btn_area.setLayout(self.layout)
 
+    def set_weight(self, value):
+        self.weight_label.setText(f'重量: {value:.1f} 公克')
+
     def button_click_handler(self, save_type):
         self.button_click_signal.emit(save_type)
@@ -1,35 +1,70 @@
+import json
 import requests
 import logging
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.multipart import MultipartEncoder
+
+
 class Api:
-    def __init__(self, url):
+    """
+    Client of the data collect server.
+
+    All requests go through one requests.Session, so connections are kept alive and reused
+    instead of opening a new TCP connection per call.
+
+    :param url: base url
+    :param pool_size: max number of pooled connections
+    :param connect_timeout: seconds to wait for the connection
+    :param read_timeout: seconds to wait for the response
+    :param retries: retries of failed connections and 502/503/504 responses, POST is never retried here
+    :param chunk_size: bytes read from a capture file at once while uploading
+    """
+
+    def __init__(self, url, pool_size=4, connect_timeout=5, read_timeout=30, retries=2, chunk_size=64 * 1024):
         self.base_url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.chunk_size = chunk_size
+
+        retry = Retry(total=retries, connect=retries, read=0, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
-    def upload_data(self, data):
+        # Cleared once the server answers that it has no batch endpoint
+        self.batch_supported = True
+
+    def upload_data(self, data, progress=None):
         """
-        post collected data
+        post collected data, the file is streamed from disk in chunks
         :param data:
             user_id: int
             weight: float
             meal_date: string
             type: int
             file: npz
-        :return: is_upload (int)
+        :param progress: callback(sent bytes, total bytes)
+        :return: status code (int)
         """
         url = f'{self.base_url}/api/meals'
 
         payload = data['payload']
 
         files = [
-            ('file', ('{}.npz'.format(data['file_name']), open(data['file_path'], 'rb'), 'application/octet-stream'))
+            ('file', '{}.npz'.format(data['file_name']), data['file_path'], 'application/octet-stream')
         ]
 
-        headers = {}
-
         status_code = 0
 
         try:
-            response = requests.request('POST', url, headers=headers, data=payload, files=files, timeout=30)
+            with MultipartEncoder(payload, files, chunk_size=self.chunk_size, progress=progress) as body:
+                headers = {'Content-Type': body.content_type}
+                response = self.session.request('POST', url, headers=headers, data=body, timeout=self.timeout)
+
             status_code = response.status_code
             if response.status_code == 200:
                 logging.info(f'[API] {url} success')
@@ -41,6 +76,53 @@ class Api:
 
         return status_code
 
+    def upload_batch(self, items, progress=None):
+        """
+        post several collected data in one request
+        :param items: list of data, see upload_data
+        :param progress: callback(sent bytes, total bytes)
+        :return: {file_name: status code}, or None if the server has no batch endpoint
+        """
+        url = f'{self.base_url}/api/meals/batch'
+
+        # Metadata of every item in one json field, item i is sent as file field file_{i}
+        meals = [dict(data['payload'], file=f'file_{i}') for i, data in enumerate(items)]
+        files = [
+            (f'file_{i}', '{}.npz'.format(data['file_name']), data['file_path'], 'application/octet-stream')
+            for i, data in enumerate(items)
+        ]
+
+        results = {data['file_name']: 0 for data in items}
+
+        try:
+            with MultipartEncoder({'meals': json.dumps(meals)}, files, chunk_size=self.chunk_size, progress=progress) as body:
+                headers = {'Content-Type': body.content_type}
+                response = self.session.request('POST', url, headers=headers, data=body, timeout=self.timeout)
+
+            if response.status_code in (404, 405):
+                logging.warning(f'[API] {url} not supported, fall back to single uploads')
+                self.batch_supported = False
+                return None
+
+            if response.status_code == 200:
+                # One result per item, in the order of the request. Any other count cannot be matched
+                # to the items, the whole batch counts as failed and is retried
+                batch_results = response.json()['data']['results']
+                if len(batch_results) != len(items):
+                    logging.warning(f'[API] {url} returned {len(batch_results)} results for {len(items)} items')
+                    return results
+
+                for data, result in zip(items, batch_results):
+                    results[data['file_name']] = result['status']
+                logging.info(f'[API] {url} success')
+            else:
+                logging.warning(f'[API] {url} failed')
+
+        except Exception as e:
+            logging.error(e)
+
+        return results
+
     def fetch_schools(self):
         url = f'{self.base_url}/api/schools'
 
@@ -51,7 +133,7 @@ class Api:
         status_code = 0
 
         try:
-            response = requests.request("GET", url, headers=headers, data=payload)
+            response = self.session.request("GET", url, headers=headers, data=payload, timeout=self.timeout)
             status_code = response.status_code
             if response.status_code == 200:
                 schools = response.json()['data']['schools']
@@ -87,7 +169,7 @@ class Api:
         status_code = 0
 
         try:
-            response = requests.request("GET", url, headers=headers, data=payload)
+            response = self.session.request("GET", url, headers=headers, data=payload, timeout=self.timeout)
             status_code = response.status_code
             if response.status_code == 200:
                 user_list = response.json()['data']['profiles']
@@ -98,3 +180,6 @@ class Api:
             logging.error(e)
 
         return status_code, user_list
+
+    def close(self):
+        self.session.close()
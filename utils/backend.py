@@ -0,0 +1,155 @@
+"""
+Hardware backends, selected by [hardware] backend in config.ini or --backend on the command line.
+
+A backend hands out the modules the sensor classes talk to: an RPi.GPIO compatible module for the
+LED and the HX711s, and a pyrealsense2 compatible module for the depth camera. The hardware
+libraries are only imported by the real backend, so everything else runs on any Linux box.
+The replay backend plays a recording of a real session (utils/recording.py) back.
+"""
+import json
+
+from utils.recording import Recording
+from utils.replay import ReplayRealSense, ReplayLoadCell, SPEED, conversion_period
+from utils.sim_gpio import SimulatedGPIO, SimulatedHX711, NoisyLoadCell
+from utils.sim_realsense import SimulatedRealSense
+
+
+def weight_cells(config):
+    # (dout, pd_sck) of every configured load cell
+    cells = json.loads(config.get('weight', 'cells'))
+    if not cells:
+        cells = [(config.getint('weight', 'channel_data'), config.getint('weight', 'channel_clk'))]
+    return cells
+
+
+class RealBackend:
+    """
+    RPi.GPIO and pyrealsense2 on the kiosk.
+    """
+
+    name = 'real'
+
+    def __init__(self, config):
+        self.config = config
+
+    def gpio(self):
+        import RPi.GPIO as GPIO
+        return GPIO
+
+    def realsense(self):
+        import pyrealsense2.pyrealsense2 as rs
+        return rs
+
+    def weight_transport(self, name):
+        return name
+
+
+class SimulatedBackend:
+    """
+    SimulatedGPIO with a SimulatedHX711 on every configured load cell, and a SimulatedRealSense camera.
+    Settings come from the [simulation] section, set load_cells[i].weight to put weight on cell i.
+    """
+
+    name = 'simulated'
+
+    def __init__(self, config):
+        self.config = config
+
+        cells = weight_cells(config)
+
+        reference_unit = config.getfloat('weight', 'reference_unit') / len(cells)
+
+        self.simulated_gpio = SimulatedGPIO()
+        self.load_cells = []
+        for i, (dout, pd_sck) in enumerate(cells):
+            load_cell = NoisyLoadCell(
+                offset=config.getint('simulation', 'hx711_offset'),
+                reference_unit=reference_unit,
+                noise=config.getfloat('simulation', 'hx711_noise'),
+                seed=i,
+                drift=config.getfloat('simulation', 'hx711_drift')
+            )
+            self.simulated_gpio.attach(SimulatedHX711(
+                dout, pd_sck, load_cell,
+                conversion_period=1 / config.getfloat('simulation', 'hx711_rate'),
+                settle_time=config.getfloat('simulation', 'hx711_settle_time')
+            ))
+            self.load_cells.append(load_cell)
+
+        self.simulated_realsense = SimulatedRealSense(
+            fps=config.getint('simulation', 'camera_fps'),
+            depth=config.getint('simulation', 'camera_depth'),
+            depth_noise=config.getfloat('simulation', 'camera_depth_noise'),
+            hole_ratio=config.getfloat('simulation', 'camera_hole_ratio'),
+            seed=0
+        )
+
+    def gpio(self):
+        return self.simulated_gpio
+
+    def realsense(self):
+        return self.simulated_realsense
+
+    def set_weight(self, weight):
+        # Spread evenly over the cells
+        for load_cell in self.load_cells:
+            load_cell.weight = weight
+
+    def weight_transport(self, name):
+        # Register access needs /dev/gpiomem, the simulator only speaks the RPi.GPIO API
+        return 'rpi_gpio'
+
+
+class ReplayBackend:
+    """
+    Camera frames and raw HX711 samples of the recording at [replay] path, at [replay] speed
+    (realtime or max). The recording must have as many load cells as the config.
+    """
+
+    name = 'replay'
+
+    def __init__(self, config):
+        self.config = config
+
+        recording = Recording(config.get('replay', 'path'))
+        speed = config.get('replay', 'speed')
+        if speed not in (SPEED.REALTIME, SPEED.MAX):
+            raise ValueError("Unrecognised replay speed: \"%s\"" % speed)
+
+        cells = weight_cells(config)
+        if recording.weight is None or recording.weight['raw'].shape[1] != len(cells):
+            raise ValueError("Recording has no weight samples of %d cells: \"%s\"" % (len(cells), recording.path))
+
+        self.simulated_gpio = SimulatedGPIO()
+        for i, (dout, pd_sck) in enumerate(cells):
+            self.simulated_gpio.attach(SimulatedHX711(
+                dout, pd_sck, ReplayLoadCell(recording.weight['raw'][:, i]),
+                conversion_period=conversion_period(recording, speed),
+                # Settling is chip behaviour, kept at max speed too: a read stretched past the power down
+                # time restarts the chip, with no settle time the rest of the read would clock a new sample
+                settle_time=config.getfloat('simulation', 'hx711_settle_time')
+            ))
+
+        self.replay_realsense = ReplayRealSense(recording, speed)
+
+    def gpio(self):
+        return self.simulated_gpio
+
+    def realsense(self):
+        return self.replay_realsense
+
+    def weight_transport(self, name):
+        return 'rpi_gpio'
+
+
+BACKENDS = {
+    'real': RealBackend,
+    'simulated': SimulatedBackend,
+    'replay': ReplayBackend,
+}
+
+
+def get_backend(name, config):
+    if name not in BACKENDS:
+        raise ValueError("Unrecognised backend: \"%s\"" % name)
+    return BACKENDS[name](config)
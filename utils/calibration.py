@@ -0,0 +1,122 @@
+import numpy as np
+
+from utils import sample_stats
+
+# Two sided 95% quantile of the normal distribution
+Z_95 = 1.96
+
+
+class PointStats:
+    """
+    Statistics of the raw samples of one calibration point.
+
+    :param weight: known weight on the scale
+    :param mean: trimmed mean of the raw samples
+    :param std: standard deviation of the samples left after outlier rejection
+    :param ci: half width of the 95% confidence interval of mean
+    :param count: number of samples
+    :param outliers: number of samples rejected as outliers
+    """
+
+    def __init__(self, weight, mean, std, ci, count, outliers=0):
+        self.weight = weight
+        self.mean = mean
+        self.std = std
+        self.ci = ci
+        self.count = count
+        self.outliers = outliers
+
+
+def summarize(weight, samples, trim=0.1):
+    """
+    :param weight: known weight on the scale
+    :param samples: raw HX711 values
+    :param trim: fraction trimmed from each end before averaging
+    :return: PointStats
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    kept = sample_stats.reject_outliers(samples)
+
+    # Spikes are gone, the std of the rest is the noise of the converter
+    std = float(kept.std(ddof=1)) if len(kept) > 1 else 0.0
+    ci = Z_95 * std / np.sqrt(len(kept))
+
+    return PointStats(weight, sample_stats.trimmed_mean(kept, trim), std, float(ci), len(samples),
+                      len(samples) - len(kept))
+
+
+class Calibration:
+    """
+    Multi-point calibration of the load cell, raw = offset + reference_unit * weight fitted by least squares.
+
+    The first point is usually the empty scale, every additional point with a known weight refines
+    the fit. fit() also reports the quality: residuals of the points and the resolution (noise of a
+    single sample) in the unit of the weights.
+
+    :param trim: fraction trimmed from each end of the samples of a point
+    """
+
+    def __init__(self, trim=0.1):
+        self.trim = trim
+        self.points = []
+
+    def add_point(self, weight, samples):
+        point = summarize(weight, samples, self.trim)
+        self.points.append(point)
+        return point
+
+    def is_ready(self):
+        # At least two different weights are needed for a slope
+        return len(set(point.weight for point in self.points)) >= 2
+
+    def fit(self):
+        """
+        :return: dict of reference_unit, offset, r2, residual (rms), max_residual, resolution and ci,
+            the last four in the unit of the weights
+        """
+        if not self.is_ready():
+            raise ValueError("Calibration::fit(): at least two different weights are needed")
+
+        weights = np.array([point.weight for point in self.points], dtype=np.float64)
+        means = np.array([point.mean for point in self.points])
+
+        # Weight points by their sample count, the mean of a longer read is more precise
+        sqrt_count = np.sqrt([point.count for point in self.points])
+        design = np.stack((np.ones_like(weights), weights), axis=1)
+        (offset, reference_unit), *_ = np.linalg.lstsq(design * sqrt_count[:, None], means * sqrt_count, rcond=None)
+
+        residuals = (means - (offset + reference_unit * weights)) / reference_unit
+        total = ((means - means.mean()) ** 2).sum()
+        r2 = 1 - ((residuals * reference_unit) ** 2).sum() / total if total > 0 else 0
+
+        return {
+            'reference_unit': float(reference_unit),
+            'offset': float(offset),
+            'r2': float(r2),
+            'residual': float(np.sqrt((residuals ** 2).mean())),
+            'max_residual': float(np.abs(residuals).max()),
+            'resolution': float(max(point.std for point in self.points) / abs(reference_unit)),
+            'ci': float(max(point.ci for point in self.points) / abs(reference_unit))
+        }
+
+
+def fit_cell_scales(deltas):
+    """
+    Per-cell sensitivity correction of a multi-cell scale (corner load calibration).
+
+    The same weight is put on each corner in turn, row j of deltas holds the raw change of every cell
+    (loaded - empty) with the weight on corner j. The scales make every corner read the same total,
+    in the least squares sense, and are normalised to a mean of 1 so the reference unit still applies.
+
+    :param deltas: (corners, cells) array
+    :return: scales, spread of the corner totals before and after, relative to their mean
+    """
+    deltas = np.asarray(deltas, dtype=np.float64)
+
+    scales, *_ = np.linalg.lstsq(deltas, np.ones(len(deltas)), rcond=None)
+    scales /= scales.mean()
+
+    def spread(totals):
+        return float(totals.std() / abs(totals.mean()))
+
+    return scales, spread(deltas.sum(axis=1)), spread(deltas @ scales)
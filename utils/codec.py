@@ -0,0 +1,147 @@
+"""
+Capture file codecs.
+
+Every codec writes a single .npz archive with the same keys, so uploads and file names do not
+change. Codecs other than npz_compressed store the images pre-encoded as uint8 byte arrays in an
+uncompressed archive and add a 'codec' key, read_image() uses it to decode the images again.
+"""
+import zlib
+
+import numpy as np
+
+IMAGE_KEYS = ('rgb_image', 'depth_image', 'depth_valid_count')
+
+
+class Codec:
+    name = None
+    compressed = False
+
+    def __init__(self, **kwargs):
+        # Options of other codecs (e.g. jpeg_quality) are accepted and ignored
+        pass
+
+    def encode(self, key, image):
+        return image
+
+    def decode(self, key, data, shape, dtype):
+        return data
+
+
+class NpzCompressedCodec(Codec):
+    """Raw arrays in a zlib deflated archive (np.savez_compressed)."""
+    name = 'npz_compressed'
+    compressed = True
+
+
+class NpzCodec(Codec):
+    """Raw arrays, no compression. Fastest to write, largest file."""
+    name = 'npz'
+
+
+class PngCodec(Codec):
+    """Lossless PNG for every image, 16-bit PNG for depth."""
+    name = 'png'
+
+    def __init__(self, compression=1, **kwargs):
+        self.compression = compression
+
+    def encode(self, key, image):
+        import cv2
+
+        ok, buffer = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, self.compression])
+        if not ok:
+            raise ValueError(f'encode {key} to png failed')
+        return buffer.reshape(-1)
+
+    def decode(self, key, data, shape, dtype):
+        import cv2
+
+        return cv2.imdecode(data, cv2.IMREAD_UNCHANGED).astype(dtype, copy=False).reshape(shape)
+
+
+class PngJpegCodec(PngCodec):
+    """JPEG for color, 16-bit PNG for depth. Color is lossy."""
+    name = 'png_jpeg'
+
+    def __init__(self, compression=1, jpeg_quality=90, **kwargs):
+        super(PngJpegCodec, self).__init__(compression)
+        self.jpeg_quality = jpeg_quality
+
+    def encode(self, key, image):
+        import cv2
+
+        if key != 'rgb_image':
+            return super(PngJpegCodec, self).encode(key, image)
+
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError(f'encode {key} to jpeg failed')
+        return buffer.reshape(-1)
+
+
+class DeltaCodec(Codec):
+    """
+    Row-wise delta encoding followed by fast LZ77 (zlib level 1).
+    Neighbouring depth pixels are close, so the deltas are mostly small values that compress well.
+    """
+    name = 'delta'
+
+    def __init__(self, level=1, **kwargs):
+        self.level = level
+
+    def encode(self, key, image):
+        delta = np.empty_like(image)
+        delta[:, :1] = image[:, :1]
+        # Unsigned subtraction wraps around, decoding with cumsum in the same dtype undoes it exactly
+        np.subtract(image[:, 1:], image[:, :-1], out=delta[:, 1:])
+        return np.frombuffer(zlib.compress(delta.tobytes(), self.level), dtype=np.uint8)
+
+    def decode(self, key, data, shape, dtype):
+        delta = np.frombuffer(zlib.decompress(data.tobytes()), dtype=dtype).reshape(shape)
+        return np.cumsum(delta, axis=1, dtype=dtype)
+
+
+CODECS = {
+    codec.name: codec for codec in (NpzCompressedCodec, NpzCodec, PngCodec, PngJpegCodec, DeltaCodec)
+}
+
+
+def get_codec(name='npz_compressed', **kwargs):
+    if name not in CODECS:
+        raise ValueError(f'Unrecognised codec: "{name}"')
+    return CODECS[name](**kwargs)
+
+
+def write_capture(file, codec, **arrays):
+    """
+    :param file: path or binary file object
+    :param codec: Codec instance
+    :param arrays: images (see IMAGE_KEYS) and scalar metadata
+    """
+    if codec.compressed:
+        np.savez_compressed(file, **arrays)
+        return
+
+    for key in IMAGE_KEYS:
+        if key in arrays:
+            image = arrays[key]
+            arrays[key] = codec.encode(key, image)
+            arrays[f'{key}_shape'] = np.array(image.shape)
+            arrays[f'{key}_dtype'] = np.array(image.dtype.str)
+
+    np.savez(file, codec=np.array(codec.name), **arrays)
+
+
+def read_image(data, key):
+    """
+    :param data: NpzFile opened with np.load
+    :param key: one of IMAGE_KEYS
+    :return: decoded image
+    """
+    if 'codec' not in data.files:
+        return data[key]
+
+    codec = get_codec(str(data['codec']))
+    shape = tuple(data[f'{key}_shape'])
+    dtype = np.dtype(str(data[f'{key}_dtype']))
+    return codec.decode(key, data[key], shape, dtype)
@@ -1,15 +1,31 @@
 import logging
+import time
 
 import numpy as np
-import pyrealsense2.pyrealsense2 as rs
+
+from utils.codec import get_codec, write_capture
+from utils.depth_fusion import fuse_depth
+from utils.frame_store import FrameStore
 
 
 class DepthCamera:
-    def __init__(self):
+    """
+    :param rs: pyrealsense2 compatible module, see utils/backend.py, pyrealsense2 if None
+    :param recorder: utils.recording.SensorRecorder, every frame pulled from the pipeline is offered to it
+    """
+
+    def __init__(self, rs=None, recorder=None):
+        if rs is None:
+            import pyrealsense2.pyrealsense2 as rs
+
         logging.info('[DEPTH CAMERA] setup module')
         self.depth_image = None
         self.color_image = None
         self.depth_intrinsic = None
+        self.recorder = recorder
+
+        # Latest aligned capture, shared between the capture thread and the GUI thread
+        self.frame_store = FrameStore()
 
         # Configure depth and color streams
         self.pipeline = rs.pipeline()
@@ -50,9 +66,34 @@ class DepthCamera:
 
         logging.info('[DEPTH CAMERA] depth scale is: {}'.format(self.depth_scale))
 
+    def wait_for_frames(self):
+        frames = self.pipeline.wait_for_frames()
+
+        if self.recorder is not None:
+            self.record(frames)
+
+        return frames
+
+    def record(self, frames):
+        color_frame = frames.get_color_frame()
+        depth_frame = frames.get_depth_frame()
+        if not color_frame or not depth_frame:
+            return
+
+        intrinsics = depth_frame.profile.as_video_stream_profile().intrinsics
+        self.recorder.record_frames(
+            np.asanyarray(color_frame.get_data()),
+            np.asanyarray(depth_frame.get_data()),
+            time.monotonic(),
+            color_frame.get_frame_number(),
+            color_frame.get_timestamp(),
+            camera={'depth_scale': self.depth_scale, 'fx': intrinsics.fx, 'fy': intrinsics.fy,
+                    'ppx': intrinsics.ppx, 'ppy': intrinsics.ppy}
+        )
+
     def read(self):
         # Wait for a coherent pair of frames: depth and color
-        frames = self.pipeline.wait_for_frames()
+        frames = self.wait_for_frames()
         color_frame = frames.get_color_frame()
 
         # aligned_depth_frame is a 640x480 depth image
@@ -72,14 +113,98 @@ class DepthCamera:
 
         return self.color_image, self.depth_image
 
-    def save_file(self, file_path):
-        # rgb_image = np.copy(self.color_image[:, :, ::-1])
-        # depth_image = np.copy(self.depth_image)
+    def read_preview(self):
+        """
+        Cheap per-frame read for the preview, only the color frame is pulled and nothing is aligned.
+        :return: color image (bgr8) backed by the librealsense frame buffer, or None
+        """
+        frames = self.wait_for_frames()
+        color_frame = frames.get_color_frame()
+
+        if not color_frame:
+            return None
+
+        return np.asanyarray(color_frame.get_data())
+
+    def capture_aligned(self, count=1):
+        """
+        Align depth to color for the frames that are actually saved.
+        With count > 1 a burst of aligned frames is grabbed and depth is fused by a temporal median
+        that ignores zero depth, color is taken from the middle frame of the burst.
+        The result is published to self.frame_store, read it back with snapshot().
+        :param count: number of frames in the burst
+        :return: True if a capture was stored
+        """
+        start_time = time.perf_counter()
+
+        depth_stack = None
+        color_image = None
+        frame_number = None
+        timestamp = None
+
+        for i in range(count):
+            frames = self.wait_for_frames()
+            aligned_frames = self.align.process(frames)
+            color_frame = aligned_frames.get_color_frame()
+            depth_frame = aligned_frames.get_depth_frame()
+
+            if not depth_frame or not color_frame:
+                return False
+
+            if self.depth_intrinsic is None:
+                self.depth_intrinsic = depth_frame.profile.as_video_stream_profile().intrinsics
+
+            # Copy out of the librealsense buffers, they are recycled by the pipeline
+            depth_data = np.asanyarray(depth_frame.get_data())
+            if depth_stack is None:
+                depth_stack = np.empty((count, *depth_data.shape), dtype=depth_data.dtype)
+            depth_stack[i] = depth_data
+
+            if i == count // 2:
+                color_image = np.array(color_frame.get_data())
+                frame_number = color_frame.get_frame_number()
+                timestamp = color_frame.get_timestamp()
+
+        capture_time = time.perf_counter() - start_time
+
+        if count > 1:
+            depth_image, depth_valid_count = fuse_depth(depth_stack)
+        else:
+            depth_image, depth_valid_count = depth_stack[0], (depth_stack[0] > 0).astype(np.uint8)
+
+        self.frame_store.write(color_image, depth_image, depth_valid_count, frame_number, timestamp)
+
+        logging.info('[DEPTH CAMERA] capture {} frames in {:.3f} s, fuse in {:.3f} s'.format(
+            count, capture_time, time.perf_counter() - start_time - capture_time))
+
+        return True
+
+    def snapshot(self):
+        """
+        :return: consistent RGBDFrame owned by the caller, or None if nothing was captured
+        """
+        return self.frame_store.snapshot()
+
+    def save_file(self, file_path, frame=None, codec=None):
+        """
+        :param file_path: path or binary file object
+        :param frame: RGBDFrame to write, the latest capture if None
+        :param codec: utils.codec.Codec, npz_compressed if None
+        """
+        if frame is None:
+            frame = self.snapshot()
+
+        if codec is None:
+            codec = get_codec()
 
-        np.savez_compressed(
+        write_capture(
             file_path,
-            rgb_image=self.color_image,
-            depth_image=self.depth_image,
+            codec,
+            rgb_image=frame.color_image,
+            depth_image=frame.depth_image,
+            depth_valid_count=frame.depth_valid_count,
+            frame_number=frame.frame_number,
+            timestamp=frame.timestamp,
             depth_scale=self.depth_scale,
             fx=self.depth_intrinsic.fx,
             fy=self.depth_intrinsic.fy,
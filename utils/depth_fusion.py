@@ -0,0 +1,26 @@
+import numpy as np
+
+
+def fuse_depth(depth_stack):
+    """
+    Temporal median of a burst of depth images, zero depth (no data) is ignored.
+    :param depth_stack: uint16 array (N, H, W)
+    :return: fused depth (H, W) uint16, per-pixel count of valid samples (H, W) uint8
+    """
+    depth_stack = np.asarray(depth_stack)
+    n = depth_stack.shape[0]
+
+    valid_count = np.count_nonzero(depth_stack, axis=0).astype(np.uint8)
+
+    # Zeros sort to the front, so the valid samples of a pixel are the last valid_count entries
+    ordered = np.sort(depth_stack, axis=0)
+    first = n - valid_count.astype(np.intp)
+    lower = first + (valid_count.astype(np.intp) - 1) // 2
+    upper = np.minimum(first + valid_count // 2, n - 1)
+
+    lower_value = np.take_along_axis(ordered, lower[np.newaxis], axis=0)[0]
+    upper_value = np.take_along_axis(ordered, upper[np.newaxis], axis=0)[0]
+
+    fused = ((lower_value.astype(np.uint32) + upper_value) // 2).astype(depth_stack.dtype)
+
+    return fused, valid_count
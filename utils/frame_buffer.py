@@ -0,0 +1,111 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class FrameRing:
+    """
+    Preallocated ring of frame buffers shared between a producer thread and the GUI thread.
+
+    The producer acquires a free slot, copies the frame into it and publishes the slot.
+    Only the latest published slot is kept pending: publishing again before the consumer
+    took the previous one recycles the stale slot, so the GUI never works through a
+    backlog of old frames. The consumer releases the slot once the frame is painted.
+
+    :param size: number of buffers in the ring
+    """
+
+    def __init__(self, size=3):
+        self.size = size
+        self.buffers = []
+        self.shape = None
+        self.dtype = None
+
+        self.lock = threading.Lock()
+        self.free = deque()
+        self.pending = None
+
+        # Counters
+        self.produced = 0
+        self.dropped = 0
+        self.displayed = 0
+
+    def allocate(self, shape, dtype=np.uint8):
+        with self.lock:
+            self.shape = tuple(shape)
+            self.dtype = np.dtype(dtype)
+            self.buffers = [np.empty(self.shape, dtype=self.dtype) for _ in range(self.size)]
+            self.free = deque(range(self.size))
+            self.pending = None
+
+    def acquire(self, shape, dtype=np.uint8):
+        # (Re)allocate lazily, the color resolution depends on the camera product line
+        if self.shape != tuple(shape) or self.dtype != np.dtype(dtype):
+            self.allocate(shape, dtype)
+
+        with self.lock:
+            if len(self.free) == 0:
+                return None
+            return self.free.popleft()
+
+    def write(self, image):
+        """
+        Copy image into a free slot.
+        :return: slot index, or None if every slot is still held by the consumer
+        """
+        index = self.acquire(image.shape, image.dtype)
+        if index is not None:
+            np.copyto(self.buffers[index], image)
+        return index
+
+    def publish(self, index):
+        """
+        Make slot the latest frame for the consumer.
+        :return: True if the consumer has to be notified, False if a notification is already pending
+        """
+        with self.lock:
+            self.produced += 1
+
+            stale = self.pending
+            self.pending = index
+
+            if stale is None:
+                return True
+
+            # Latest frame wins, the consumer never saw the previous one
+            self.dropped += 1
+            self.free.append(stale)
+            return False
+
+    def drop(self):
+        with self.lock:
+            self.produced += 1
+            self.dropped += 1
+
+    def take(self):
+        """
+        :return: index of the latest published slot, or None if nothing is pending
+        """
+        with self.lock:
+            index = self.pending
+            self.pending = None
+            if index is not None:
+                self.displayed += 1
+            return index
+
+    def get(self, index):
+        return self.buffers[index]
+
+    def release(self, index):
+        with self.lock:
+            if index not in self.free:
+                self.free.append(index)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'produced': self.produced,
+                'dropped': self.dropped,
+                'displayed': self.displayed
+            }
@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+
+
+class RGBDFrame:
+    def __init__(self, color_image, depth_image, depth_valid_count, frame_number, timestamp):
+        self.color_image = color_image
+        self.depth_image = depth_image
+        self.depth_valid_count = depth_valid_count
+        self.frame_number = frame_number
+        self.timestamp = timestamp
+
+
+class FrameStore:
+    """
+    Double-buffered store of the latest captured RGB-D pair.
+
+    The capture thread fills the back buffers without holding the lock and swaps them to the front
+    under the lock. snapshot() copies the front buffers under the same lock, so the color and depth
+    images it returns always belong to the same capture and are never touched again by the writer.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.front = None
+        self.back = None
+        self.frame_number = None
+        self.timestamp = None
+
+    @staticmethod
+    def allocate(color_image, depth_image, depth_valid_count):
+        return [np.empty_like(color_image), np.empty_like(depth_image), np.empty_like(depth_valid_count)]
+
+    @staticmethod
+    def fits(buffers, arrays):
+        return buffers is not None and all(b.shape == a.shape and b.dtype == a.dtype for b, a in zip(buffers, arrays))
+
+    def write(self, color_image, depth_image, depth_valid_count, frame_number, timestamp):
+        arrays = (color_image, depth_image, depth_valid_count)
+
+        if not self.fits(self.back, arrays):
+            self.back = self.allocate(*arrays)
+
+        for buffer, array in zip(self.back, arrays):
+            np.copyto(buffer, array)
+
+        with self.lock:
+            self.front, self.back = self.back, self.front
+            self.frame_number = frame_number
+            self.timestamp = timestamp
+
+    def snapshot(self):
+        """
+        :return: RGBDFrame with owned copies of the latest capture, or None if nothing was captured
+        """
+        with self.lock:
+            if self.front is None:
+                return None
+
+            color_image, depth_image, depth_valid_count = (np.copy(b) for b in self.front)
+            return RGBDFrame(color_image, depth_image, depth_valid_count, self.frame_number, self.timestamp)
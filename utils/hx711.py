@@ -1,11 +1,19 @@
-import RPi.GPIO as GPIO
 import time
 import threading
 
+import numpy as np
+
+from utils import sample_stats
+from utils.hx711_transport import RPiGPIOTransport
+
+# BIT_REVERSE[b] is byte b with its bit order reversed, used for LSB bit format.
+IDENTITY = list(range(256))
+BIT_REVERSE = [int('{:08b}'.format(b)[::-1], 2) for b in range(256)]
+
 
 class HX711:
 
-    def __init__(self, dout, pd_sck, gain=128):
+    def __init__(self, dout, pd_sck, gain=128, transport=None, timeout=1.0, history=64):
         self.PD_SCK = pd_sck
 
         self.DOUT = dout
@@ -14,9 +22,10 @@ class HX711:
         # software try to access get values from the class at the same time.
         self.readLock = threading.Lock()
 
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.PD_SCK, GPIO.OUT)
-        GPIO.setup(self.DOUT, GPIO.IN)
+        # Low level pin access, see utils/hx711_transport.py
+        if transport is None:
+            transport = RPiGPIOTransport(dout, pd_sck)
+        self.transport = transport
 
         self.GAIN = 0
 
@@ -29,10 +38,22 @@ class HX711:
         self.OFFSET_B = 1
         self.lastVal = int(0)
 
+        # Max seconds to wait for a conversion, a disconnected load cell
+        # never pulls DOUT low.
+        self.timeout = timeout
+
+        # Ring buffer of sample timestamps (time.monotonic()).
+        self.sampleTimes = np.zeros(history)
+        self.sampleCount = 0
+
         self.DEBUG_PRINTING = False
 
+        # utils.recording.SensorRecorder, gets every raw sample when set.
+        self.recorder = None
+
         self.byte_format = 'MSB'
         self.bit_format = 'MSB'
+        self.bit_table = IDENTITY
 
         self.set_gain(gain)
 
@@ -43,7 +64,7 @@ class HX711:
         return -(inputValue & 0x800000) + (inputValue & 0x7fffff)
 
     def is_ready(self):
-        return GPIO.input(self.DOUT) == 0
+        return self.transport.is_ready()
 
     def set_gain(self, gain):
         if gain == 128:
@@ -53,7 +74,7 @@ class HX711:
         elif gain == 32:
             self.GAIN = 2
 
-        GPIO.output(self.PD_SCK, False)
+        self.transport.set_clock(False)
 
         # Read out a set of raw bytes and throw it away.
         self.readRawBytes()
@@ -71,55 +92,46 @@ class HX711:
 
     def readNextBit(self):
         # Clock HX711 Digital Serial Clock (PD_SCK).  DOUT will be
-        # ready 1us after PD_SCK rising edge, so we sample after
+        # ready 1us after PD_SCK rising edge, so the transport samples after
         # lowering PD_SCL, when we know DOUT will be stable.
-        GPIO.output(self.PD_SCK, True)
-        GPIO.output(self.PD_SCK, False)
-        value = GPIO.input(self.DOUT)
-
-        # Convert Boolean to int and return it.
-        return int(value)
+        return self.transport.clock_bits(1)
 
     def readNextByte(self):
-        byteValue = 0
-
-        # Read bits and build the byte from top, or bottom, depending
-        # on whether we are in MSB or LSB bit mode.
-        for x in range(8):
-            if self.bit_format == 'MSB':
-                byteValue <<= 1
-                byteValue |= self.readNextBit()
-            else:
-                byteValue >>= 1
-                byteValue |= self.readNextBit() * 0x80
-
-        # Return the packed byte.
-        return byteValue
+        # Bits arrive first-bit-most-significant, the table precomputed by
+        # set_reading_format() turns that into the configured bit order.
+        return self.bit_table[self.transport.clock_bits(8)]
 
     def readRawBytes(self):
         # Wait for and get the Read Lock, incase another thread is already
         # driving the HX711 serial interface.
         self.readLock.acquire()
 
-        # Wait until HX711 is ready for us to read a sample.
-        while not self.is_ready():
-            pass
+        # Sleep until HX711 is ready for us to read a sample.
+        if not self.transport.wait_ready(self.timeout):
+            self.readLock.release()
+            raise TimeoutError("HX711::readRawBytes(): not ready after %s s, is the load cell connected?" % self.timeout)
 
-        # Read three bytes of data from the HX711.
-        firstByte = self.readNextByte()
-        secondByte = self.readNextByte()
-        thirdByte = self.readNextByte()
+        # Read the 24 data bits in one go, then clock the channel / gain
+        # selection bits and throw them away.
+        rawValue = self.transport.clock_bits(24)
+        self.transport.clock_bits(self.GAIN)
 
-        # HX711 Channel and gain factor are set by number of bits read
-        # after 24 data bits.
-        for i in range(self.GAIN):
-            # Clock a bit out of the HX711 and throw it away.
-            self.readNextBit()
+        sampleTime = time.monotonic()
+        self.sampleTimes[self.sampleCount % len(self.sampleTimes)] = sampleTime
+        self.sampleCount += 1
 
         # Release the Read Lock, now that we've finished driving the HX711
         # serial interface.
         self.readLock.release()
 
+        if self.recorder is not None:
+            self.recorder.record_weight([self.decode(rawValue)], sampleTime)
+
+        bitTable = self.bit_table
+        firstByte = bitTable[(rawValue >> 16) & 0xFF]
+        secondByte = bitTable[(rawValue >> 8) & 0xFF]
+        thirdByte = bitTable[rawValue & 0xFF]
+
         # Depending on how we're configured, return an ordered list of raw byte
         # values.
         if self.byte_format == 'LSB':
@@ -127,6 +139,27 @@ class HX711:
         else:
             return [firstByte, secondByte, thirdByte]
 
+    def decode(self, rawValue):
+        # 24 bits as clocked out, to a signed value in the configured reading format.
+        bitTable = self.bit_table
+        dataBytes = [bitTable[(rawValue >> 16) & 0xFF], bitTable[(rawValue >> 8) & 0xFF], bitTable[rawValue & 0xFF]]
+        if self.byte_format == 'LSB':
+            dataBytes.reverse()
+
+        return self.convertFromTwosComplement24bit((dataBytes[0] << 16) | (dataBytes[1] << 8) | dataBytes[2])
+
+    def get_sample_times(self):
+        # Timestamps of the latest samples, oldest first.
+        count = min(self.sampleCount, len(self.sampleTimes))
+        return np.roll(self.sampleTimes, -self.sampleCount)[-count:] if count else self.sampleTimes[:0]
+
+    def get_sample_rate(self):
+        # Samples per second over the timestamp ring buffer.
+        times = self.get_sample_times()
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0
+        return (len(times) - 1) / (times[-1] - times[0])
+
     def read_long(self):
         # Get a sample from the HX711 in the form of raw bytes.
         dataBytes = self.readRawBytes()
@@ -151,6 +184,13 @@ class HX711:
         # Return the sample value we've read from the HX711.
         return int(signedIntValue)
 
+    def read_samples(self, times):
+        # Read times samples into an array, for the statistics in utils/sample_stats.py.
+        samples = np.empty(times)
+        for x in range(times):
+            samples[x] = self.read_long()
+        return samples
+
     def read_average(self, times=3):
         # Make sure we've been asked to take a rational amount of samples.
         if times <= 0:
@@ -165,23 +205,9 @@ class HX711:
         if times < 5:
             return self.read_median(times)
 
-        # If we're taking a lot of samples, we'll collect them in a list, remove
-        # the outliers, then take the mean of the remaining set.
-        valueList = []
-
-        for x in range(times):
-            valueList += [self.read_long()]
-
-        valueList.sort()
-
-        # We'll be trimming 20% of outlier samples from top and bottom of collected set.
-        trimAmount = int(len(valueList) * 0.2)
-
-        # Trim the edge case values.
-        valueList = valueList[trimAmount:-trimAmount]
-
-        # Return the mean of remaining samples.
-        return sum(valueList) / len(valueList)
+        # If we're taking a lot of samples, trim 20% of outlier samples from
+        # top and bottom of collected set and take the mean of the rest.
+        return sample_stats.trimmed_mean(self.read_samples(times), 0.2)
 
     # A median-based read method, might help when getting random value spikes
     # for unknown or CPU-related reasons
@@ -193,21 +219,8 @@ class HX711:
         if times == 1:
             return self.read_long()
 
-        valueList = []
-
-        for x in range(times):
-            valueList += [self.read_long()]
-
-        valueList.sort()
-
-        # If times is odd we can just take the centre value.
-        if (times & 0x1) == 0x1:
-            return valueList[len(valueList) // 2]
-        else:
-            # If times is even we have to take the arithmetic mean of
-            # the two middle values.
-            midpoint = len(valueList) / 2
-            return sum(valueList[midpoint:midpoint + 2]) / 2.0
+        # For even times the mean of the two middle values.
+        return sample_stats.median(self.read_samples(times))
 
     # Compatibility function, uses channel A version
     def get_value(self, times=3):
@@ -247,10 +260,13 @@ class HX711:
         backupReferenceUnit = self.get_reference_unit_A()
         self.set_reference_unit_A(1)
 
-        value = self.read_average(times)
+        # Drop spikes (MAD outliers) before averaging, a single bad sample
+        # would otherwise bias the offset of every later weight.
+        samples = sample_stats.reject_outliers(self.read_samples(times))
+        value = sample_stats.trimmed_mean(samples, 0.2)
 
         if self.DEBUG_PRINTING:
-            print("Tare A value:", value)
+            print("Tare A value:", value, "outliers:", times - len(samples))
 
         self.set_offset_A(value)
 
@@ -291,8 +307,10 @@ class HX711:
 
         if bit_format == "LSB":
             self.bit_format = bit_format
+            self.bit_table = BIT_REVERSE
         elif bit_format == "MSB":
             self.bit_format = bit_format
+            self.bit_table = IDENTITY
         else:
             raise ValueError("Unrecognised bitformat: \"%s\"" % bit_format)
 
@@ -351,8 +369,8 @@ class HX711:
         # Cause a rising edge on HX711 Digital Serial Clock (PD_SCK).  We then
         # leave it held up and wait 100 us.  After 60us the HX711 should be
         # powered down.
-        GPIO.output(self.PD_SCK, False)
-        GPIO.output(self.PD_SCK, True)
+        self.transport.set_clock(False)
+        self.transport.set_clock(True)
 
         time.sleep(0.0001)
 
@@ -366,7 +384,7 @@ class HX711:
         self.readLock.acquire()
 
         # Lower the HX711 Digital Serial Clock (PD_SCK) line.
-        GPIO.output(self.PD_SCK, False)
+        self.transport.set_clock(False)
 
         # Wait 100 us for the HX711 to power back up.
         time.sleep(0.0001)
@@ -0,0 +1,115 @@
+import time
+
+import numpy as np
+
+from utils.hx711 import HX711
+from utils.hx711_transport import RPiGPIOTransport
+
+# Limits of the 24-bit output, the HX711 clips to them when the input is out of range
+RAW_MAX = 0x7FFFFF
+RAW_MIN = -0x800000
+
+
+class HX711Bank(HX711):
+    """
+    Several HX711s, one per load cell, on a shared PD_SCK line with a DOUT each.
+
+    Every read clocks all of them in lock-step through the transport's clock_bits_parallel(), so N
+    cells take the time of one conversion. The cells are combined into one raw value
+    sum(scale_i * raw_i), everything above it (offset, reference unit, tare, get_weight) works like a
+    single HX711. The scales correct the different sensitivity of the cells, see
+    utils.calibration.fit_cell_scales().
+
+    :param douts: BCM pins of the DOUTs
+    :param pd_sck: BCM pin of the shared PD_SCK
+    :param scales: relative sensitivity correction per cell, all 1 if None
+    """
+
+    def __init__(self, douts, pd_sck, scales=None, gain=128, transport=None, timeout=1.0, history=64):
+        self.DOUTS = list(douts)
+
+        if scales is None:
+            scales = np.ones(len(self.DOUTS))
+        self.scales = np.asarray(scales, dtype=np.float64)
+        if len(self.scales) != len(self.DOUTS):
+            raise ValueError("HX711Bank: %d scales for %d cells" % (len(self.scales), len(self.DOUTS)))
+
+        # Ring buffer of raw values per cell, and fault counters, for diagnostics().
+        self.cellValues = np.zeros((history, len(self.DOUTS)))
+        self.cellCount = 0
+        self.timeouts = np.zeros(len(self.DOUTS), dtype=np.int64)
+        self.saturated = np.zeros(len(self.DOUTS), dtype=np.int64)
+
+        if transport is None:
+            transport = RPiGPIOTransport(self.DOUTS, pd_sck)
+
+        super(HX711Bank, self).__init__(self.DOUTS[0], pd_sck, gain=gain, transport=transport, timeout=timeout,
+                                        history=history)
+
+    def read_cells(self):
+        # Same locking and timeout handling as HX711.readRawBytes(), for all cells at once.
+        self.readLock.acquire()
+
+        if not self.transport.wait_ready(self.timeout):
+            ready = np.array(self.transport.ready_pins())
+            self.readLock.release()
+
+            self.timeouts[~ready] += 1
+            missing = [pin for pin, is_ready in zip(self.DOUTS, ready) if not is_ready]
+            raise TimeoutError("HX711Bank::read_cells(): DOUT %s not ready after %s s" % (missing, self.timeout))
+
+        rawValues = self.transport.clock_bits_parallel(24)
+        self.transport.clock_bits(self.GAIN)
+
+        sampleTime = time.monotonic()
+        self.sampleTimes[self.sampleCount % len(self.sampleTimes)] = sampleTime
+        self.sampleCount += 1
+
+        self.readLock.release()
+
+        values = np.array([self.decode(rawValue) for rawValue in rawValues], dtype=np.float64)
+
+        if self.recorder is not None:
+            self.recorder.record_weight(values, sampleTime)
+
+        self.saturated += (values >= RAW_MAX) | (values <= RAW_MIN)
+        self.cellValues[self.cellCount % len(self.cellValues)] = values
+        self.cellCount += 1
+
+        return values
+
+    def readRawBytes(self):
+        # Only called to throw a sample away (gain change, power up), no bytes to return.
+        self.read_cells()
+
+    def read_long(self):
+        values = self.read_cells()
+        self.lastVal = float(self.scales @ values)
+        return self.lastVal
+
+    def get_cell_values(self):
+        # Raw values of the latest reads, one column per cell, oldest first.
+        count = min(self.cellCount, len(self.cellValues))
+        return np.roll(self.cellValues, -self.cellCount, axis=0)[-count:] if count else self.cellValues[:0]
+
+    def diagnostics(self):
+        """
+        :return: list of dict per cell: dout, scale, last raw value, mean and std over the history,
+            timeout and saturation counts
+        """
+        values = self.get_cell_values()
+
+        cells = []
+        for i, pin in enumerate(self.DOUTS):
+            column = values[:, i]
+            cells.append({
+                'dout': pin,
+                'scale': float(self.scales[i]),
+                'last': float(column[-1]) if len(column) else None,
+                'mean': float(column.mean()) if len(column) else None,
+                'std': float(column.std()) if len(column) > 1 else None,
+                'timeouts': int(self.timeouts[i]),
+                'saturated': int(self.saturated[i])
+            })
+
+        return cells
@@ -0,0 +1,240 @@
+"""
+Low level PD_SCK / DOUT access for the HX711.
+
+The bit loop is the hot path of every weight sample: 25-27 clock pulses that must each finish
+well within 60 us, otherwise the HX711 powers down and the sample is corrupted. Transports
+implement clock_bits() with as few Python-level calls per bit as the backend allows.
+
+Several HX711s can share one PD_SCK line, each with its own DOUT. dout is then a list of pins,
+clock_bits_parallel() clocks all of them in lock-step and returns one value per DOUT, so reading
+N load cells takes the time of one.
+"""
+import mmap
+import os
+import threading
+import time
+
+
+class RPiGPIOTransport:
+    """
+    Uses RPi.GPIO (or any module with the same API), three library calls per bit,
+    two plus one per DOUT in parallel.
+
+    :param dout: BCM pin of DOUT, or list of pins of HX711s sharing PD_SCK
+    :param pd_sck: BCM pin of PD_SCK
+    :param gpio: RPi.GPIO compatible module, RPi.GPIO if None
+    """
+
+    def __init__(self, dout, pd_sck, gpio=None):
+        if gpio is None:
+            import RPi.GPIO as gpio
+
+        self.gpio = gpio
+        self.DOUTS = list(dout) if isinstance(dout, (list, tuple)) else [dout]
+        self.DOUT = self.DOUTS[0]
+        self.PD_SCK = pd_sck
+
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(self.PD_SCK, self.gpio.OUT)
+        for pin in self.DOUTS:
+            self.gpio.setup(pin, self.gpio.IN)
+
+        # Set by the edge detection thread of the GPIO library on every falling DOUT edge. Detection
+        # stays on, a wait_for_edge() started after the edge fell would miss it.
+        self.falling = {pin: threading.Event() for pin in self.DOUTS}
+        for pin in self.DOUTS:
+            self.gpio.add_event_detect(pin, self.gpio.FALLING, callback=self.on_falling)
+
+    def ready_pins(self):
+        return [self.gpio.input(pin) == 0 for pin in self.DOUTS]
+
+    def is_ready(self):
+        return all(self.ready_pins())
+
+    def on_falling(self, channel):
+        self.falling[channel].set()
+
+    def wait_ready(self, timeout):
+        """
+        Sleep until every DOUT falls (conversion ready) instead of spinning on is_ready().
+        :param timeout: seconds
+        :return: True if all HX711s are ready
+        """
+        deadline = time.monotonic() + timeout
+
+        for pin in self.DOUTS:
+            event = self.falling[pin]
+            while True:
+                # Clear before reading the level, an edge falling in between still sets the event.
+                # Data bits of the last read set it too, hence the loop.
+                event.clear()
+                if self.gpio.input(pin) == 0:
+                    break
+
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    return False
+                event.wait(remain)
+
+        return self.is_ready()
+
+    def close(self):
+        for pin in self.DOUTS:
+            self.gpio.remove_event_detect(pin)
+
+    def set_clock(self, value):
+        self.gpio.output(self.PD_SCK, value)
+
+    def clock_bits(self, count):
+        """
+        Clock count bits out of the HX711.
+        :return: the bits as an int, first bit clocked is the most significant
+        """
+        # Bind everything used in the loop to locals
+        output = self.gpio.output
+        read = self.gpio.input
+        pd_sck = self.PD_SCK
+        dout = self.DOUT
+
+        value = 0
+        for _ in range(count):
+            output(pd_sck, True)
+            output(pd_sck, False)
+            value = (value << 1) | read(dout)
+
+        return value
+
+    def clock_bits_parallel(self, count):
+        """
+        Clock count bits out of every HX711 on the shared PD_SCK.
+        :return: list of values, one per DOUT
+        """
+        output = self.gpio.output
+        read = self.gpio.input
+        pd_sck = self.PD_SCK
+        douts = self.DOUTS
+
+        values = [0] * len(douts)
+        for _ in range(count):
+            output(pd_sck, True)
+            output(pd_sck, False)
+            for i, pin in enumerate(douts):
+                values[i] = (values[i] << 1) | read(pin)
+
+        return values
+
+
+class GpioMemTransport:
+    """
+    Direct BCM283x GPIO register access through /dev/gpiomem.
+    One register write per clock edge and one register read per bit, no library call per bit.
+    In parallel the one register read holds the bits of every DOUT.
+
+    :param dout: BCM pin of DOUT, or list of pins of HX711s sharing PD_SCK
+    :param pd_sck: BCM pin of PD_SCK
+    :param device: gpio register device
+    """
+
+    # 32-bit register indices
+    GPFSEL0 = 0x00 // 4
+    GPSET0 = 0x1C // 4
+    GPCLR0 = 0x28 // 4
+    GPLEV0 = 0x34 // 4
+
+    BLOCK_SIZE = 4 * 1024
+
+    def __init__(self, dout, pd_sck, device='/dev/gpiomem'):
+        self.DOUTS = list(dout) if isinstance(dout, (list, tuple)) else [dout]
+        self.DOUT = self.DOUTS[0]
+        self.PD_SCK = pd_sck
+
+        fd = os.open(device, os.O_RDWR | os.O_SYNC)
+        try:
+            self.mem = mmap.mmap(fd, self.BLOCK_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+
+        self.registers = memoryview(self.mem).cast('I')
+
+        self.set_function(self.PD_SCK, 0b001)  # output
+        for pin in self.DOUTS:
+            self.set_function(pin, 0b000)  # input
+
+        self.clock_mask = 1 << self.PD_SCK
+        self.dout_shift = self.DOUT
+        self.dout_mask = sum(1 << pin for pin in self.DOUTS)
+
+    def set_function(self, pin, function):
+        index = self.GPFSEL0 + pin // 10
+        shift = (pin % 10) * 3
+        self.registers[index] = (self.registers[index] & ~(0b111 << shift)) | (function << shift)
+
+    def ready_pins(self):
+        level = self.registers[self.GPLEV0]
+        return [(level >> pin) & 1 == 0 for pin in self.DOUTS]
+
+    def is_ready(self):
+        return self.registers[self.GPLEV0] & self.dout_mask == 0
+
+    def wait_ready(self, timeout, interval=0.0005):
+        # Register access has no edge events, poll with short sleeps so the GIL is released
+        deadline = time.monotonic() + timeout
+        while not self.is_ready():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+        return True
+
+    def set_clock(self, value):
+        self.registers[self.GPSET0 if value else self.GPCLR0] = self.clock_mask
+
+    def clock_bits(self, count):
+        registers = self.registers
+        mask = self.clock_mask
+        shift = self.dout_shift
+        gpset, gpclr, gplev = self.GPSET0, self.GPCLR0, self.GPLEV0
+
+        value = 0
+        for _ in range(count):
+            registers[gpset] = mask
+            registers[gpclr] = mask
+            value = (value << 1) | ((registers[gplev] >> shift) & 1)
+
+        return value
+
+    def clock_bits_parallel(self, count):
+        registers = self.registers
+        mask = self.clock_mask
+        gpset, gpclr, gplev = self.GPSET0, self.GPCLR0, self.GPLEV0
+
+        # Keep the raw levels, split them per DOUT after the time critical loop
+        levels = [0] * count
+        for i in range(count):
+            registers[gpset] = mask
+            registers[gpclr] = mask
+            levels[i] = registers[gplev]
+
+        values = []
+        for pin in self.DOUTS:
+            value = 0
+            for level in levels:
+                value = (value << 1) | ((level >> pin) & 1)
+            values.append(value)
+
+        return values
+
+    def close(self):
+        self.registers.release()
+        self.mem.close()
+
+
+TRANSPORTS = {
+    'rpi_gpio': RPiGPIOTransport,
+    'gpiomem': GpioMemTransport,
+}
+
+
+def get_transport(name, dout, pd_sck, **kwargs):
+    if name not in TRANSPORTS:
+        raise ValueError("Unrecognised transport: \"%s\"" % name)
+    return TRANSPORTS[name](dout, pd_sck, **kwargs)
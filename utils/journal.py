@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class FSYNC_POLICY:
+    ALWAYS = 'always'
+    INTERVAL = 'interval'
+    NEVER = 'never'
+
+
+class UPLOAD_STATE:
+    # Values of a record's is_upload field
+    PENDING = 0
+    UPLOADED = 1
+    # The capture file was never written (failed save, crash), there is nothing to upload
+    MISSING = -1
+
+
+class CaptureJournal:
+    """
+    Append-only JSON-lines journal of the captures of one day.
+
+    Every append or update writes a single line {"key": file_name, "data": {...}}, later lines for
+    the same key update the earlier ones. The folded records are kept in memory, so writing a
+    capture costs the same no matter how many captures the day already has. A crash can at most
+    lose the line that was being written, a truncated last line is skipped on load.
+
+    :param path: journal file (.jsonl)
+    :param fsync: FSYNC_POLICY, when to force lines to disk
+    :param fsync_interval: seconds between fsync with FSYNC_POLICY.INTERVAL
+    :param legacy_json_path: data.json written by older versions, imported if the journal is new
+    """
+
+    def __init__(self, path, fsync=FSYNC_POLICY.ALWAYS, fsync_interval=1.0, legacy_json_path=None):
+        if fsync not in (FSYNC_POLICY.ALWAYS, FSYNC_POLICY.INTERVAL, FSYNC_POLICY.NEVER):
+            raise ValueError("Unrecognised fsync policy: \"%s\"" % fsync)
+
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.last_fsync_time = 0
+
+        self.lock = threading.Lock()
+        self.records = {}
+
+        is_new = not os.path.isfile(self.path)
+        if not is_new:
+            self.load()
+
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+        # Terminate a line cut off by a crash, otherwise the next line would be glued to it
+        if self.file.tell() > 0:
+            with open(self.path, 'rb') as journal_file:
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b'\n':
+                    self.file.write('\n')
+
+        if is_new and legacy_json_path is not None and os.path.isfile(legacy_json_path):
+            with open(legacy_json_path, encoding='utf-8') as json_file:
+                for key, data in json.load(json_file).items():
+                    self.append(key, data)
+            logging.info(f'[JOURNAL] import {legacy_json_path}')
+
+    def load(self):
+        with open(self.path, encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.warning(f'[JOURNAL] skip broken line in {self.path}')
+                    continue
+
+                self.records.setdefault(entry['key'], {}).update(entry['data'])
+
+    def write_line(self, key, data):
+        self.file.write(json.dumps({'key': key, 'data': data}, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+        now = time.monotonic()
+        if self.fsync == FSYNC_POLICY.ALWAYS or (
+                self.fsync == FSYNC_POLICY.INTERVAL and now - self.last_fsync_time >= self.fsync_interval):
+            os.fsync(self.file.fileno())
+            self.last_fsync_time = now
+
+    def append(self, key, data):
+        with self.lock:
+            self.records.setdefault(key, {}).update(data)
+            self.write_line(key, data)
+
+    def update(self, key, **fields):
+        self.append(key, fields)
+
+    def get(self, key):
+        with self.lock:
+            return dict(self.records[key]) if key in self.records else None
+
+    def items(self):
+        with self.lock:
+            return [(key, dict(data)) for key, data in self.records.items()]
+
+    def __len__(self):
+        return len(self.records)
+
+    def export(self, json_path):
+        """
+        Write the folded records in the data.json format, {file_name: {...}}.
+        """
+        with self.lock:
+            self.atomic_write(json_path, lambda f: json.dump(self.records, f, indent=4, ensure_ascii=False))
+
+        logging.info(f'[JOURNAL] export {json_path}')
+
+    def compact(self):
+        """
+        Rewrite the journal with one line per record.
+        """
+        with self.lock:
+            self.file.close()
+            self.atomic_write(self.path, lambda f: f.writelines(
+                json.dumps({'key': key, 'data': data}, ensure_ascii=False) + '\n' for key, data in self.records.items()))
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+        logging.info(f'[JOURNAL] compact {self.path}')
+
+    @staticmethod
+    def atomic_write(path, write):
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as temp_file:
+            write(temp_file)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
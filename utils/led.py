@@ -1,27 +1,34 @@
-import RPi.GPIO as GPIO
 import logging
 
 
 class LedController:
-    def __init__(self, channel_r=13, channel_b=19, channel_g=26):
+    """
+    :param gpio: RPi.GPIO compatible module, see utils/backend.py, RPi.GPIO if None
+    """
+
+    def __init__(self, channel_r=13, channel_b=19, channel_g=26, gpio=None):
+        if gpio is None:
+            import RPi.GPIO as gpio
+
+        self.gpio = gpio
         self.channel_r = channel_r  # board 33 -> bcm 13
         self.channel_b = channel_b  # board 35 -> bcm 19
         self.channel_g = channel_g  # board 37 -> bcm 26
 
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.channel_r, GPIO.OUT)
-        GPIO.setup(self.channel_b, GPIO.OUT)
-        GPIO.setup(self.channel_g, GPIO.OUT)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(self.channel_r, self.gpio.OUT)
+        self.gpio.setup(self.channel_b, self.gpio.OUT)
+        self.gpio.setup(self.channel_g, self.gpio.OUT)
 
         logging.info('[LED] setup module')
 
     def set_value(self, value_r, value_g, value_b):
-        GPIO.output(self.channel_r, value_r)
-        GPIO.output(self.channel_b, value_b)
-        GPIO.output(self.channel_g, value_g)
+        self.gpio.output(self.channel_r, value_r)
+        self.gpio.output(self.channel_b, value_b)
+        self.gpio.output(self.channel_g, value_g)
 
     def clear_GPIO(self):
-        GPIO.cleanup()
+        self.gpio.cleanup()
 
 class LED_STATUS:
     SETUP = 'state_setup'
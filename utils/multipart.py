@@ -0,0 +1,125 @@
+import os
+import uuid
+
+
+class MultipartEncoder:
+    """
+    Streaming multipart/form-data body.
+
+    requests reads the body through read() in small blocks, so a capture file is sent in
+    chunk_size pieces and never loaded into memory as a whole. The length is known up front,
+    the request goes out with a Content-Length header instead of chunked transfer encoding.
+    File handles are opened when their part is reached and closed as soon as it is sent, or by
+    close() / the with statement if the request is aborted.
+
+    Not resumable: POST /api/meals has no way to acknowledge the bytes received, so a file cut
+    off by a network drop is sent again from the start by the retries of UploadWorker.
+
+    :param fields: dict of form fields
+    :param files: list of (field name, file name, file path, content type)
+    :param chunk_size: max bytes read from a file at once
+    :param progress: callback(sent bytes, total bytes)
+    """
+
+    def __init__(self, fields, files, chunk_size=64 * 1024, progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+        # Parts are either bytes or the path of a file to stream
+        self.parts = []
+
+        for name, value in fields.items():
+            self.parts.append(self.part_header(name) + b'\r\n' + str(value).encode('utf-8') + b'\r\n')
+
+        for name, file_name, file_path, content_type in files:
+            self.parts.append(self.part_header(name, file_name, content_type) + b'\r\n')
+            self.parts.append(file_path)
+            self.parts.append(b'\r\n')
+
+        self.parts.append(f'--{self.boundary}--\r\n'.encode('utf-8'))
+
+        self.length = sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self.parts)
+        self.sent = 0
+
+        self.part_index = 0
+        self.part_offset = 0
+        self.file = None
+
+    def part_header(self, name, file_name=None, content_type=None):
+        disposition = f'form-data; name="{name}"'
+        if file_name is not None:
+            disposition += f'; filename="{file_name}"'
+
+        header = f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\n'
+        if content_type is not None:
+            header += f'Content-Type: {content_type}\r\n'
+
+        return header.encode('utf-8')
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+
+        chunks = []
+        remain = size
+
+        while remain > 0 and self.part_index < len(self.parts):
+            part = self.parts[self.part_index]
+
+            if isinstance(part, bytes):
+                chunk = part[self.part_offset:self.part_offset + remain]
+                self.part_offset += len(chunk)
+                done = self.part_offset >= len(part)
+            else:
+                if self.file is None:
+                    self.file = open(part, 'rb')
+                chunk = self.file.read(min(remain, self.chunk_size))
+                done = len(chunk) == 0 or len(chunk) < min(remain, self.chunk_size)
+
+            if done:
+                self.next_part()
+
+            chunks.append(chunk)
+            remain -= len(chunk)
+
+        data = b''.join(chunks)
+        self.sent += len(data)
+
+        if self.progress is not None and len(data) > 0:
+            self.progress(self.sent, self.length)
+
+        return data
+
+    def next_part(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        self.part_index += 1
+        self.part_offset = 0
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,176 @@
+"""
+Recording of the sensor streams of a session, for replay (see utils/replay.py).
+
+A recording is a directory of flat binary files, each an array of fixed size records appended as
+they arrive, plus meta.json with their shapes and dtypes:
+
+    color.bin     (n, h, w, 3) uint8, bgr8 color frames
+    depth.bin     (n, h, w) uint16, raw depth frames
+    frames.bin    (n,) timestamp (time.monotonic()), frame number and device timestamp of each frame
+    weight.bin    (m,) timestamp and raw value per cell of each HX711 conversion
+
+The number of records follows from the file size, so a recording cut short by a crash is still
+readable. Recording opens every file with np.memmap, nothing is loaded until it is touched and
+any frame or sample can be reached directly by index or by time.
+"""
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+META_FILE = 'meta.json'
+
+FRAME_DTYPE = np.dtype([('timestamp', '<f8'), ('frame_number', '<i8'), ('device_timestamp', '<f8')])
+
+
+def weight_dtype(cells):
+    return np.dtype([('timestamp', '<f8'), ('raw', '<f8', (cells,))])
+
+
+class SensorRecorder:
+    """
+    Appends camera frames and HX711 samples to a recording directory.
+
+    Camera and weight are recorded from their own threads, each stream has its own file and lock.
+    Frames are thinned to camera_fps, uncompressed RGB-D at 30 fps is more than an SD card can write.
+
+    :param path: recording directory, created if missing
+    :param camera_fps: max frames per second recorded, 0 for every frame
+    """
+
+    def __init__(self, path, camera_fps=2):
+        self.path = path
+        self.frame_interval = 1 / camera_fps if camera_fps > 0 else 0
+        os.makedirs(path, exist_ok=True)
+
+        self.meta = {'version': 1}
+        self.meta_lock = threading.Lock()
+
+        self.frame_lock = threading.Lock()
+        self.frame_files = None
+        self.last_frame_time = None
+        self.frame_count = 0
+
+        self.weight_lock = threading.Lock()
+        self.weight_file = None
+        self.weight_dtype = None
+        self.weight_count = 0
+
+        self.closed = False
+
+        logging.info(f'[RECORDER] record to {path}')
+
+    def write_meta(self, key, value):
+        with self.meta_lock:
+            self.meta[key] = value
+            tmp_path = os.path.join(self.path, META_FILE + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(self.meta, f, indent=2)
+            os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+    def record_frames(self, color_image, depth_image, timestamp, frame_number, device_timestamp, camera=None):
+        """
+        :param camera: dict of depth_scale and intrinsics (fx, fy, ppx, ppy), stored with the first frame
+        """
+        with self.frame_lock:
+            if self.closed:
+                return
+            if self.last_frame_time is not None and timestamp - self.last_frame_time < self.frame_interval:
+                return
+            self.last_frame_time = timestamp
+
+            if self.frame_files is None:
+                self.write_meta('frames', dict(camera or {}, color_shape=list(color_image.shape),
+                                               depth_shape=list(depth_image.shape)))
+                self.frame_files = [open(os.path.join(self.path, name), 'ab')
+                                    for name in ('color.bin', 'depth.bin', 'frames.bin')]
+
+            color_file, depth_file, frames_file = self.frame_files
+            color_file.write(np.ascontiguousarray(color_image, dtype=np.uint8).data)
+            depth_file.write(np.ascontiguousarray(depth_image, dtype=np.uint16).data)
+            frames_file.write(np.array((timestamp, frame_number, device_timestamp), dtype=FRAME_DTYPE).tobytes())
+            # Flushed per record, whatever reached the disk before a crash stays readable
+            for f in self.frame_files:
+                f.flush()
+            self.frame_count += 1
+
+    def record_weight(self, values, timestamp):
+        """
+        :param values: raw value of each cell
+        """
+        with self.weight_lock:
+            if self.closed:
+                return
+
+            if self.weight_file is None:
+                self.weight_dtype = weight_dtype(len(values))
+                self.write_meta('weight', {'cells': len(values)})
+                self.weight_file = open(os.path.join(self.path, 'weight.bin'), 'ab')
+
+            self.weight_file.write(np.array((timestamp, values), dtype=self.weight_dtype).tobytes())
+            self.weight_file.flush()
+            self.weight_count += 1
+
+    def close(self):
+        with self.frame_lock, self.weight_lock:
+            self.closed = True
+            for f in (self.frame_files or []) + ([self.weight_file] if self.weight_file else []):
+                f.close()
+
+        logging.info(f'[RECORDER] {self.frame_count} frames, {self.weight_count} weight samples')
+
+
+class Recording:
+    """
+    Read-only, memory mapped view of a recording directory.
+    Attributes are None for a stream that was not recorded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+
+        self.color = self.depth = self.frames = self.weight = None
+
+        if 'frames' in self.meta:
+            frames = self.meta['frames']
+            self.frames = self.open('frames.bin', FRAME_DTYPE)
+            count = len(self.frames)
+            # Only frames whose three records were all written
+            self.color = self.open('color.bin', np.uint8, frames['color_shape'])
+            self.depth = self.open('depth.bin', np.uint16, frames['depth_shape'])
+            count = min(count, len(self.color), len(self.depth))
+            self.frames, self.color, self.depth = self.frames[:count], self.color[:count], self.depth[:count]
+
+        if 'weight' in self.meta:
+            self.weight = self.open('weight.bin', weight_dtype(self.meta['weight']['cells']))
+
+    def open(self, name, dtype, shape=()):
+        dtype = np.dtype(dtype)
+        file_path = os.path.join(self.path, name)
+        record_size = dtype.itemsize * int(np.prod(shape))
+        count = os.path.getsize(file_path) // record_size if os.path.exists(file_path) else 0
+
+        if count == 0:
+            return np.zeros((0, *shape), dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', shape=(count, *shape))
+
+    @property
+    def camera(self):
+        return self.meta.get('frames', {})
+
+    def frame_at(self, timestamp):
+        """
+        :return: index of the latest frame recorded at or before timestamp
+        """
+        return max(0, int(np.searchsorted(self.frames['timestamp'], timestamp, side='right')) - 1)
+
+    def weight_at(self, timestamp):
+        """
+        :return: index of the latest weight sample recorded at or before timestamp
+        """
+        return max(0, int(np.searchsorted(self.weight['timestamp'], timestamp, side='right')) - 1)
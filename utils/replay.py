@@ -0,0 +1,111 @@
+"""
+Replay of a recording (see utils/recording.py) through the simulated hardware.
+
+Frames go through a pyrealsense2 compatible module like utils/sim_realsense.py, HX711 samples are
+clocked out of SimulatedHX711s bit by bit, so the kiosk runs exactly the code paths it runs on the
+real sensors. At real-time speed frames and samples arrive at their recorded pace, at max speed as
+fast as they are read. Both streams loop at the end of the recording.
+"""
+import time
+
+import numpy as np
+
+from utils.sim_realsense import SimulatedRealSense, Pipeline, PipelineProfile, FrameSet, Frame, StreamProfile, \
+    Intrinsics
+
+
+class SPEED:
+    REALTIME = 'realtime'
+    MAX = 'max'
+
+
+class ReplayPipeline(Pipeline):
+    def start(self, config):
+        recording = self.camera.recording
+        height, width = recording.color.shape[1:3]
+
+        intrinsics = Intrinsics(width, height)
+        for key in ('fx', 'fy', 'ppx', 'ppy'):
+            if key in recording.camera:
+                setattr(intrinsics, key, recording.camera[key])
+        self.profile = StreamProfile(intrinsics)
+
+        self.index = 0
+        self.start_time = time.monotonic()
+        self.loop_offset = 0
+
+        return PipelineProfile(config.device)
+
+    def wait_for_frames(self, timeout_ms=5000):
+        recording = self.camera.recording
+        times = recording.frames['timestamp']
+
+        if self.index == len(times):
+            # Loop, the next pass starts one frame interval after the last frame
+            self.index = 0
+            self.loop_offset += times[-1] - times[0] + (times[-1] - times[-2] if len(times) > 1 else 0)
+
+        if self.camera.speed == SPEED.REALTIME:
+            delay = self.start_time + self.loop_offset + times[self.index] - times[0] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        index = self.index
+        self.index += 1
+        self.frame_number += 1
+
+        # Views of the memory mapped recording, read only like librealsense frame buffers
+        device_timestamp = float(recording.frames['device_timestamp'][index])
+        return FrameSet(
+            Frame(recording.color[index], self.frame_number, device_timestamp, self.profile),
+            Frame(recording.depth[index], self.frame_number, device_timestamp, self.profile)
+        )
+
+
+class ReplayRealSense(SimulatedRealSense):
+    """
+    Module-like object passed to DepthCamera in place of pyrealsense2, frames come from a recording.
+
+    :param recording: utils.recording.Recording
+    :param speed: SPEED
+    """
+
+    def __init__(self, recording, speed=SPEED.REALTIME):
+        super(ReplayRealSense, self).__init__()
+
+        if recording.frames is None or len(recording.frames) == 0:
+            raise ValueError("Recording has no camera frames: \"%s\"" % recording.path)
+
+        self.recording = recording
+        self.speed = speed
+        self.device.depth_sensor.depth_scale = recording.camera.get('depth_scale', 0.001)
+
+    def pipeline(self):
+        return ReplayPipeline(self)
+
+
+class ReplayLoadCell:
+    """
+    Raw value source for a SimulatedHX711 returning the recorded values of one cell in order.
+
+    :param values: raw values
+    """
+
+    def __init__(self, values):
+        self.values = np.asarray(values)
+        self.index = 0
+
+    def __call__(self):
+        value = self.values[self.index % len(self.values)]
+        self.index += 1
+        return value
+
+
+def conversion_period(recording, speed):
+    """
+    :return: seconds between replayed HX711 conversions, the median recorded interval at real-time speed
+    """
+    times = recording.weight['timestamp']
+    if speed == SPEED.MAX or len(times) < 2:
+        return 0
+    return float(np.median(np.diff(times)))
@@ -0,0 +1,58 @@
+"""
+Robust statistics over arrays of raw load cell samples.
+
+Selection with np.partition instead of a full sort: the median and the trim boundaries are found
+in O(n), only the elements actually needed end up in their sorted positions.
+"""
+import numpy as np
+
+# Scales the median absolute deviation to the standard deviation of normal data
+MAD_SCALE = 0.6745
+
+
+def median(samples):
+    samples = np.asarray(samples)
+    n = len(samples)
+    if n == 0:
+        raise ValueError("median(): no samples")
+
+    half = n // 2
+    if n % 2 == 1:
+        return float(np.partition(samples, half)[half])
+
+    # Even count, mean of the two middle values
+    part = np.partition(samples, (half - 1, half))
+    return (float(part[half - 1]) + float(part[half])) / 2
+
+
+def trimmed_mean(samples, trim=0.2):
+    """
+    :param trim: fraction dropped from each end
+    """
+    samples = np.asarray(samples)
+    n = len(samples)
+    if n == 0:
+        raise ValueError("trimmed_mean(): no samples")
+
+    trim_amount = int(n * trim)
+    if trim_amount == 0 or n - 2 * trim_amount <= 0:
+        return float(samples.mean())
+
+    # Everything between the two boundaries is the trimmed set, in no particular order
+    part = np.partition(samples, (trim_amount, n - trim_amount - 1))
+    return float(part[trim_amount:n - trim_amount].mean())
+
+
+def reject_outliers(samples, threshold=3.5):
+    """
+    Drop samples whose modified z-score, based on the median absolute deviation, is above threshold.
+    :return: the kept samples, all samples if their MAD is 0
+    """
+    samples = np.asarray(samples)
+    center = median(samples)
+    deviation = np.abs(samples - center)
+    mad = median(deviation)
+    if mad == 0:
+        return samples
+
+    return samples[MAD_SCALE * deviation / mad <= threshold]
@@ -0,0 +1,320 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SimulatedHX711:
+    """
+    Pin level model of an HX711 attached to a SimulatedGPIO.
+
+    Each rising edge of PD_SCK shifts the next data bit (MSB first) out on DOUT. After the 24 data
+    bits DOUT goes high until the next conversion is done, the number of extra pulses (1-3) selects
+    channel / gain of the next conversion like the real chip.
+
+    Holding PD_SCK high for power_down_time powers the chip down. The falling edge powers it back
+    up: it resets to channel A / gain 128 and DOUT stays high for settle_time before the first
+    conversion, like the 400 ms output settling time of the real chip at 10 SPS.
+
+    on_falling is called when DOUT falls because a conversion is ready (falling edge detection of
+    SimulatedGPIO), not for the data bits of a read.
+
+    :param dout: BCM pin of DOUT
+    :param pd_sck: BCM pin of PD_SCK
+    :param source: callable returning the next signed 24-bit raw value
+    :param conversion_period: seconds between the end of a read and the next conversion being ready,
+        0.1 is the 10 SPS rate of the real chip, 0 makes conversions instant
+    :param power_down_time: seconds PD_SCK must stay high to power down
+    :param settle_time: seconds from power up to the first conversion
+    """
+
+    def __init__(self, dout, pd_sck, source=None, conversion_period=0.1, power_down_time=60e-6, settle_time=0.4):
+        self.DOUT = dout
+        self.PD_SCK = pd_sck
+        self.source = source if source is not None else NoisyLoadCell()
+        self.conversion_period = conversion_period
+        self.power_down_time = power_down_time
+        self.settle_time = settle_time
+
+        self.lock = threading.Lock()
+
+        self.clock = False
+        self.pulses = 0
+        self.data = 0
+        self.dout = 1
+        self.gain_pulses = 1
+        self.ready_at = time.monotonic()
+        self.high_since = None
+
+        self.on_falling = None
+        # Fires on_falling at watch_at when nobody reads DOUT in the meantime, see watch()
+        self.changed = threading.Condition(self.lock)
+        self.watch_at = None
+        self.watcher = None
+
+        # Statistics
+        self.samples = 0
+        self.power_ups = 0
+
+    def convert(self):
+        # Two's complement, 24 bits
+        self.data = int(self.source()) & 0xFFFFFF
+        self.pulses = 0
+        self.dout = 0
+
+    def is_powered_down(self, now):
+        return self.clock and now - self.high_since >= self.power_down_time
+
+    def update(self, now):
+        """
+        :return: True if DOUT fell, a conversion became ready
+        """
+        if self.is_powered_down(now):
+            return False
+        if self.pulses == 0 and self.dout == 1 and now >= self.ready_at:
+            self.convert()
+            return True
+        return False
+
+    def fire(self, fell):
+        # Outside the lock, like the edge detection thread of RPi.GPIO
+        if fell and self.on_falling is not None:
+            self.on_falling()
+
+    def schedule(self, now):
+        # Called with the lock held and DOUT high
+        if self.on_falling is None or self.pulses > 0 or self.is_powered_down(now):
+            return
+        if self.watch_at is not None and self.watch_at <= self.ready_at:
+            return
+
+        self.watch_at = self.ready_at
+        if self.watcher is None:
+            self.watcher = threading.Thread(target=self.watch, daemon=True)
+            self.watcher.start()
+        self.changed.notify()
+
+    def watch(self):
+        with self.changed:
+            while self.on_falling is not None:
+                if self.watch_at is None:
+                    self.changed.wait()
+                    continue
+
+                now = time.monotonic()
+                if now < self.watch_at:
+                    self.changed.wait(self.watch_at - now)
+                    continue
+
+                self.watch_at = None
+                fell = self.update(now)
+                if self.dout == 1:
+                    self.schedule(now)
+
+                on_falling = self.on_falling
+                if fell and on_falling is not None:
+                    self.changed.release()
+                    try:
+                        on_falling()
+                    finally:
+                        self.changed.acquire()
+
+            self.watcher = None
+
+    def set_on_falling(self, callback):
+        with self.changed:
+            self.on_falling = callback
+            self.watch_at = None
+            # Ends the watcher when detection is removed
+            self.changed.notify()
+
+    def output(self, value):
+        with self.lock:
+            now = time.monotonic()
+            # False while powered down, the power up below returns without a falling edge
+            fell = self.update(now)
+
+            value = bool(value)
+            rising = value and not self.clock
+
+            if not value and self.is_powered_down(now):
+                # Power up, back to channel A / gain 128 and settle before the first conversion
+                self.clock = False
+                self.pulses = 0
+                self.dout = 1
+                self.gain_pulses = 1
+                self.power_ups += 1
+                self.ready_at = now + self.settle_time
+                return
+
+            self.clock = value
+            if rising:
+                self.high_since = now
+
+            if rising and (self.dout == 0 or self.pulses > 0):
+                self.pulses += 1
+
+                if self.pulses <= 24:
+                    self.dout = (self.data >> (24 - self.pulses)) & 1
+                else:
+                    self.dout = 1
+                    self.gain_pulses = self.pulses - 24
+
+            if not value and self.pulses >= 25:
+                # Read finished, start the next conversion
+                self.pulses = 0
+                self.samples += 1
+                self.ready_at = now + self.conversion_period
+
+        self.fire(fell)
+
+    def input(self):
+        with self.lock:
+            now = time.monotonic()
+            fell = self.update(now)
+            dout = self.dout
+            if dout == 1:
+                # Someone waits for DOUT to fall, make sure it is signalled
+                self.schedule(now)
+        self.fire(fell)
+        return dout
+
+    def wait_ready(self, timeout):
+        """
+        Block like a falling edge wait on DOUT.
+        :return: True if a conversion became ready within timeout
+        """
+        with self.lock:
+            if self.pulses > 0:
+                return False
+            # Powered down, DOUT will not fall
+            delay = float('inf') if self.is_powered_down(time.monotonic()) else self.ready_at - time.monotonic()
+
+        if delay > timeout:
+            time.sleep(timeout)
+            return False
+
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+
+class NoisyLoadCell:
+    """
+    Raw value source: offset + weight * reference unit + gaussian noise.
+    The offset drifts by drift raw units per second, like a load cell warming up.
+    """
+
+    def __init__(self, offset=8000, reference_unit=-500, weight=0, noise=20, seed=None, drift=0):
+        self.offset = offset
+        self.drift = drift
+        self.start = time.monotonic()
+        self.reference_unit = reference_unit
+        self.weight = weight
+        self.noise = noise
+        self.random = np.random.default_rng(seed)
+
+    def __call__(self):
+        offset = self.offset + self.drift * (time.monotonic() - self.start)
+        return round(offset + self.weight * self.reference_unit + self.random.normal(0, self.noise))
+
+
+class SimulatedGPIO:
+    """
+    Drop-in stand-in for the RPi.GPIO module, devices are attached to pins.
+    Several devices may share a PD_SCK pin, every clock edge reaches all of them.
+    """
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+        # DOUT pin: device, PD_SCK pin: list of devices
+        self.devices = {}
+        self.clocked = {}
+        # Pins with edge detection: edge seen since the last event_detected()
+        self.detected = {}
+
+    def attach(self, device):
+        self.clocked.setdefault(device.PD_SCK, []).append(device)
+        self.devices[device.DOUT] = device
+        return device
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, **kwargs):
+        # Inputs nothing is attached to read high, like the pulled-up DOUT of a missing HX711
+        self.pins[channel] = 1 if direction == self.IN else 0
+
+    def output(self, channel, value):
+        self.pins[channel] = int(bool(value))
+
+        for device in self.clocked.get(channel, ()):
+            device.output(value)
+
+    def input(self, channel):
+        device = self.devices.get(channel)
+        if device is not None:
+            return device.input()
+        return self.pins.get(channel, 0)
+
+    def wait_for_edge(self, channel, edge, timeout=None):
+        device = self.devices.get(channel)
+        seconds = timeout / 1000 if timeout is not None else float('inf')
+
+        if device is not None and edge == self.FALLING:
+            return channel if device.wait_ready(seconds) else None
+
+        # Nothing drives this pin, no edge will come
+        if timeout is not None:
+            time.sleep(seconds)
+        return None
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        """
+        Edge detection, only falling edges of an attached HX711 (conversion ready) are detected.
+        callback(channel) is called on the thread that noticed the edge.
+        """
+        if channel in self.detected:
+            raise RuntimeError('Conflicting edge detection already enabled for this GPIO channel')
+        self.detected[channel] = False
+
+        def on_falling():
+            self.detected[channel] = True
+            if callback is not None:
+                callback(channel)
+
+        device = self.devices.get(channel)
+        if device is not None and edge in (self.FALLING, self.BOTH):
+            device.set_on_falling(on_falling)
+
+    def remove_event_detect(self, channel):
+        self.detected.pop(channel, None)
+        device = self.devices.get(channel)
+        if device is not None:
+            device.set_on_falling(None)
+
+    def event_detected(self, channel):
+        # True once per detected edge, like RPi.GPIO
+        detected = self.detected.get(channel, False)
+        if detected:
+            self.detected[channel] = False
+        return detected
+
+    def cleanup(self, *args):
+        for channel in list(self.detected):
+            self.remove_event_detect(channel)
+        self.pins = {}
@@ -0,0 +1,239 @@
+"""
+Simulated RealSense camera, a stand-in for the pyrealsense2 module.
+
+Only the part of the librealsense API used by utils/depth_camera.py is provided. Frames show a
+tray on a table seen from above: bgr8 color and z16 depth in millimetres with sensor noise and
+invalid (zero) pixels. A few noisy variations are rendered up front and cycled, so producing a
+frame costs nothing and benchmarks measure the kiosk, not the simulator.
+"""
+import time
+
+import numpy as np
+
+
+class Intrinsics:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # Roughly the color camera of a D435 at 640x480
+        self.fx = self.fy = 0.96 * width
+        self.ppx = width / 2
+        self.ppy = height / 2
+
+
+class StreamProfile:
+    def __init__(self, intrinsics):
+        self.intrinsics = intrinsics
+
+    def as_video_stream_profile(self):
+        return self
+
+
+class Frame:
+    def __init__(self, data, frame_number, timestamp, profile):
+        self.data = data
+        self.frame_number = frame_number
+        self.timestamp = timestamp
+        self.profile = profile
+
+    def __bool__(self):
+        return self.data is not None
+
+    def get_data(self):
+        return self.data
+
+    def get_frame_number(self):
+        return self.frame_number
+
+    def get_timestamp(self):
+        return self.timestamp
+
+
+class FrameSet:
+    def __init__(self, color_frame, depth_frame):
+        self.color_frame = color_frame
+        self.depth_frame = depth_frame
+
+    def get_color_frame(self):
+        return self.color_frame
+
+    def get_depth_frame(self):
+        return self.depth_frame
+
+
+class Sensor:
+    def __init__(self, name, depth_scale=None):
+        self.name = name
+        self.depth_scale = depth_scale
+
+    def get_info(self, info):
+        return self.name
+
+    def get_depth_scale(self):
+        return self.depth_scale
+
+
+class Device:
+    def __init__(self, depth_scale):
+        self.depth_sensor = Sensor('Stereo Module', depth_scale)
+        self.sensors = [self.depth_sensor, Sensor('RGB Camera')]
+
+    def get_info(self, info):
+        return 'D400'
+
+    def first_depth_sensor(self):
+        return self.depth_sensor
+
+
+class PipelineProfile:
+    def __init__(self, device):
+        self.device = device
+
+    def get_device(self):
+        return self.device
+
+
+class Config:
+    def __init__(self, device):
+        self.device = device
+        self.streams = {}
+
+    def enable_stream(self, stream, width, height, format, fps):
+        self.streams[stream] = (width, height, fps)
+
+    def resolve(self, pipeline_wrapper):
+        return PipelineProfile(self.device)
+
+
+class Align:
+    # Simulated depth is rendered in the color frame already
+    def __init__(self, align_to):
+        self.align_to = align_to
+
+    def process(self, frames):
+        return frames
+
+
+class Pipeline:
+    def __init__(self, camera):
+        self.camera = camera
+        self.frame_number = 0
+        self.next_time = None
+        self.interval = 0
+        self.color_frames = None
+        self.depth_frames = None
+        self.profile = None
+
+    def start(self, config):
+        width, height, fps = config.streams.get(SimulatedRealSense.stream.color, (640, 480, 30))
+        fps = self.camera.fps if self.camera.fps is not None else fps
+
+        self.interval = 1 / fps if fps > 0 else 0
+        self.color_frames, self.depth_frames = self.camera.render(width, height)
+        self.profile = StreamProfile(Intrinsics(width, height))
+        self.next_time = time.monotonic()
+
+        return PipelineProfile(config.device)
+
+    def wait_for_frames(self, timeout_ms=5000):
+        # Frames arrive at the configured rate, a late reader gets the next one right away
+        delay = self.next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = max(self.next_time + self.interval, time.monotonic())
+
+        self.frame_number += 1
+        index = self.frame_number % len(self.color_frames)
+        timestamp = time.time() * 1000
+
+        return FrameSet(
+            Frame(self.color_frames[index], self.frame_number, timestamp, self.profile),
+            Frame(self.depth_frames[index], self.frame_number, timestamp, self.profile)
+        )
+
+    def stop(self):
+        pass
+
+
+class SimulatedRealSense:
+    """
+    Module-like object passed to DepthCamera in place of pyrealsense2.
+
+    :param fps: frames per second, None for the rate requested by enable_stream()
+    :param depth: distance camera to table, mm
+    :param depth_noise: std of the depth noise, mm
+    :param hole_ratio: fraction of invalid (zero) depth pixels
+    :param variations: number of pre-rendered noisy frames cycled through
+    :param seed: random seed
+    """
+
+    class stream:
+        depth = 'depth'
+        color = 'color'
+
+    class format:
+        z16 = 'z16'
+        bgr8 = 'bgr8'
+
+    class camera_info:
+        name = 'name'
+        product_line = 'product_line'
+
+    def __init__(self, fps=None, depth=600, depth_noise=2.0, hole_ratio=0.02, variations=8, seed=None):
+        self.fps = fps
+        self.depth = depth
+        self.depth_noise = depth_noise
+        self.hole_ratio = hole_ratio
+        self.variations = variations
+        self.random = np.random.default_rng(seed)
+
+        # depth units of 1 mm
+        self.device = Device(0.001)
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def config(self):
+        return Config(self.device)
+
+    def pipeline_wrapper(self, pipeline):
+        return pipeline
+
+    def align(self, align_to):
+        return Align(align_to)
+
+    def render(self, width, height):
+        """
+        :return: lists of color (h, w, 3) uint8 and depth (h, w) uint16 frames
+        """
+        y, x = np.mgrid[0:height, 0:width]
+
+        # Table with a light gradient, a tray in the middle and a few dishes on it
+        color = np.empty((height, width, 3), dtype=np.float32)
+        color[:] = (150, 160, 170)
+        color += (x / width * 30)[:, :, None]
+        depth = np.full((height, width), float(self.depth), dtype=np.float32)
+
+        tray = (abs(x - width / 2) < width * 0.35) & (abs(y - height / 2) < height * 0.3)
+        color[tray] = (200, 200, 195)
+        depth[tray] -= 20
+
+        for cx, cy, r, bgr in ((0.35, 0.4, 0.08, (40, 120, 200)), (0.6, 0.4, 0.1, (60, 170, 80)),
+                               (0.48, 0.62, 0.09, (30, 60, 150))):
+            dist = np.hypot(x - cx * width, y - cy * height) / (r * width)
+            dish = dist < 1
+            color[dish] = bgr
+            # Food heaped in the middle of the dish
+            depth[dish] -= 20 + 30 * (1 - dist[dish] ** 2)
+
+        color_frames = []
+        depth_frames = []
+        for _ in range(self.variations):
+            noisy_color = color + self.random.normal(0, 3, color.shape)
+            color_frames.append(np.clip(noisy_color, 0, 255).astype(np.uint8))
+
+            noisy_depth = depth + self.random.normal(0, self.depth_noise, depth.shape)
+            noisy_depth[self.random.random(depth.shape) < self.hole_ratio] = 0
+            depth_frames.append(noisy_depth.astype(np.uint16))
+
+        return color_frames, depth_frames
@@ -0,0 +1,93 @@
+import time
+
+import numpy as np
+
+
+class StabilityDetector:
+    """
+    Decides when the weight on the scale has settled.
+
+    The latest window samples of a WeightSampler are stable when their standard deviation and the
+    least squares slope over time are both below the thresholds. After arm() the detector reports
+    the first stable window once, together with the time it took to get there. The window must end
+    with a sample taken after arm() and span at most max_span seconds, so samples left over from
+    before a power down never count as settled.
+
+    :param window: samples checked
+    :param max_std: max standard deviation of the window, same unit as the samples
+    :param max_slope: max drift of the window, units per second
+    :param max_span: max seconds between the first and last sample of the window
+    :param history: number of time-to-stable results kept for stats()
+    """
+
+    def __init__(self, window=10, max_std=2.0, max_slope=5.0, max_span=2.0, history=256):
+        self.window = window
+        self.max_std = max_std
+        self.max_slope = max_slope
+        self.max_span = max_span
+
+        self.armed_at = None
+
+        # Statistics
+        self.times_to_stable = np.zeros(history)
+        self.settled_count = 0
+        self.timeout_count = 0
+
+    def arm(self):
+        self.armed_at = time.monotonic()
+
+    def cancel(self):
+        """
+        Give up waiting, counted as a timeout.
+        """
+        if self.armed_at is not None:
+            self.armed_at = None
+            self.timeout_count += 1
+
+    def is_stable(self, values, times):
+        if len(values) < self.window or times[-1] - times[0] > self.max_span:
+            return False
+
+        if values.std() > self.max_std:
+            return False
+
+        t = times - times.mean()
+        variance = (t * t).sum()
+        slope = (t * (values - values.mean())).sum() / variance if variance > 0 else 0
+
+        return abs(slope) <= self.max_slope
+
+    def update(self, sampler):
+        """
+        :param sampler: WeightSampler
+        :return: settled value if armed and the window just became stable, None otherwise
+        """
+        # arm() / cancel() come from the GUI thread
+        armed_at = self.armed_at
+        if armed_at is None:
+            return None
+
+        values = sampler.latest(self.window)
+        times = sampler.latest_times(self.window)
+        if len(times) == 0 or times[-1] < armed_at or not self.is_stable(values, times):
+            return None
+
+        self.times_to_stable[self.settled_count % len(self.times_to_stable)] = time.monotonic() - armed_at
+        self.settled_count += 1
+        self.armed_at = None
+
+        return float(values.mean())
+
+    def stats(self):
+        times = self.times_to_stable[:min(self.settled_count, len(self.times_to_stable))]
+        if len(times) == 0:
+            return {'settled': 0, 'timeouts': self.timeout_count}
+
+        return {
+            'settled': self.settled_count,
+            'timeouts': self.timeout_count,
+            'mean': float(times.mean()),
+            'median': float(np.median(times)),
+            'p90': float(np.percentile(times, 90)),
+            'max': float(times.max())
+        }
@@ -1,37 +1,204 @@
 import logging
-import RPi.GPIO as GPIO
+import time
 
 from utils.hx711 import HX711
+from utils.hx711_bank import HX711Bank
+from utils.hx711_transport import get_transport
+from utils.weight_sampler import WeightSampler
+
+
+class POWER_POLICY:
+    # Never power down, one conversion per read
+    ALWAYS_ON = 'always_on'
+    # Power down after idle_timeout seconds without wake(), power up on the next wake()
+    IDLE = 'idle'
+    # Power cycle after every read, the original behaviour
+    PER_READ = 'per_read'
+
+
+class WeightSample:
+    """
+    One published weight, never modified after it is created.
+
+    :param value: filtered weight
+    :param count: conversions in the filter window
+    :param variance: variance of the conversions in the filter window
+    :param timestamp: time.monotonic() of the latest conversion
+    """
+
+    def __init__(self, value=0, count=0, variance=0, timestamp=0):
+        self.value = value
+        self.count = count
+        self.variance = variance
+        self.timestamp = timestamp
 
 
 class WeightReader:
-    val = 0
+    """
+    The reading thread publishes a new WeightSample after every read by swapping one reference,
+    other threads get a consistent sample from snapshot() without taking a lock.
+
+    :param power_policy: POWER_POLICY, every power up costs the settle time of the HX711 (400 ms at 10 SPS)
+    :param idle_timeout: seconds without wake() before powering down, IDLE policy only
+    :param zero_tracker: ZeroTracker re-taring the empty scale, None to tare only at setup
+    :param cells: list of (dout, pd_sck) of a multi load cell scale, all on the same PD_SCK, replaces dout / pd_sck
+    :param cell_scales: per-cell sensitivity correction, see HX711Bank
+    :param gpio: RPi.GPIO compatible module for the rpi_gpio transport, see utils/backend.py, RPi.GPIO if None
+    :param recorder: utils.recording.SensorRecorder, gets every raw conversion
+    """
+
+    def __init__(self, dout=5, pd_sck=6, reference_unit=1, transport='rpi_gpio', filter='median', window=10,
+                 power_policy=POWER_POLICY.ALWAYS_ON, idle_timeout=60, zero_tracker=None,
+                 cells=None, cell_scales=None, gpio=None, recorder=None):
+        if power_policy not in (POWER_POLICY.ALWAYS_ON, POWER_POLICY.IDLE, POWER_POLICY.PER_READ):
+            raise ValueError("Unrecognised power policy: \"%s\"" % power_policy)
+
+        self.gpio = gpio
+        transport_kwargs = {} if gpio is None else {'gpio': gpio}
 
-    def __init__(self, dout=5, pd_sck=6, reference_unit=1):
-        self.hx = HX711(dout, pd_sck)
+        if cells:
+            douts = [cell[0] for cell in cells]
+            clocks = set(cell[1] for cell in cells)
+            if len(clocks) != 1:
+                raise ValueError("Load cells must share one PD_SCK, got: %s" % sorted(clocks))
+            pd_sck = clocks.pop()
+
+            # All cells clocked in lock-step, combined into one raw value
+            self.hx = HX711Bank(douts, pd_sck, scales=cell_scales, transport=get_transport(transport, douts, pd_sck, **transport_kwargs))
+        else:
+            self.hx = HX711(dout, pd_sck, transport=get_transport(transport, dout, pd_sck, **transport_kwargs))
         self.hx.set_reading_format('MSB', 'MSB')
+        self.hx.recorder = recorder
         self.reference_unit = reference_unit
 
+        # Every conversion goes through the sampler, the published sample holds its filtered output
+        self.sampler = WeightSampler(filter=filter, window=window)
+        self.sample = WeightSample()
+        self.zero_tracker = zero_tracker
+
+        self.power_policy = power_policy
+        self.idle_timeout = idle_timeout
+        # Per read cycling keeps the original 5 conversions per power cycle
+        self.samples_per_read = 5 if power_policy == POWER_POLICY.PER_READ else 1
+
+        self.is_powered = True
+        self.last_wake = time.monotonic()
+        self.power_up_time = None
+
+        # Statistics
+        self.settle_time = None
+        self.power_cycles = 0
+
     def setup(self):
-        self.val = 0
+        self.sample = WeightSample()
+        self.sampler.reset()
         self.hx.set_reference_unit(self.reference_unit)
         self.hx.reset()
         self.hx.tare(50)
+        if self.zero_tracker is not None:
+            self.zero_tracker.reset()
 
         logging.info('[WEIGHT] setup module')
 
     def cleanAndExit(self):
-        GPIO.cleanup()
+        gpio = self.gpio
+        if gpio is None:
+            import RPi.GPIO as gpio
+        gpio.cleanup()
 
-    def read(self, debug=False):
-        if debug:
-            self.val = self.hx.get_weight(5)
-        else:
-            self.val = max(0, self.hx.get_weight(5))
+    def wake(self):
+        """
+        Mark the reader as in use, keeps the HX711 powered (IDLE policy). Safe to call from any thread,
+        the power state itself is only changed by the reading thread.
+        """
+        self.last_wake = time.monotonic()
+
+    def power_down(self):
         self.hx.power_down()
+        self.is_powered = False
+        logging.info('[WEIGHT] power down')
+
+    def power_up(self):
         self.hx.power_up()
+        self.is_powered = True
+        self.power_cycles += 1
+        self.power_up_time = time.monotonic()
+
+    @property
+    def val(self):
+        return self.sample.value
+
+    def snapshot(self):
+        """
+        :return: the latest WeightSample
+        """
+        return self.sample
+
+    def publish(self, debug=False):
+        window = self.sampler.latest(self.sampler.window)
+        value = self.sampler.value if debug else max(0, self.sampler.value)
+
+        self.sample = WeightSample(value, len(window), float(window.var()), float(self.sampler.latest_times(1)[0]))
+
+    def read(self, debug=False, times=None):
+        """
+        Read conversions into the sampler and publish a new sample.
+        :param times: conversions to read, samples_per_read if None
+        :return: False if the HX711 is powered down by the IDLE policy and nothing was read
+        """
+        if self.power_policy == POWER_POLICY.IDLE:
+            idle = time.monotonic() - self.last_wake > self.idle_timeout
+            if idle and self.is_powered:
+                self.power_down()
+            elif not idle and not self.is_powered:
+                self.power_up()
+
+            if not self.is_powered:
+                return False
+
+        for _ in range(self.samples_per_read if times is None else times):
+            self.sampler.push(self.hx.get_weight(1), time.monotonic())
+
+            if self.power_up_time is not None:
+                # First conversion after a power up, DOUT stays high until the HX711 has settled
+                self.settle_time = time.monotonic() - self.power_up_time
+                self.power_up_time = None
+                logging.debug(f'[WEIGHT] settle time: {self.settle_time * 1000:.0f} ms')
+
+        if self.zero_tracker is not None:
+            self.track_zero()
+
+        self.publish(debug)
+
+        if self.power_policy == POWER_POLICY.PER_READ:
+            self.hx.power_down()
+            self.power_up()
+
+        return True
+
+    def track_zero(self):
+        correction = self.zero_tracker.update(self.sampler)
+        if correction == 0:
+            return
+
+        # Weight drift to raw offset, the offset is subtracted before dividing by the reference unit
+        self.hx.set_offset_A(self.hx.get_offset_A() + correction * self.hx.get_reference_unit_A())
+        logging.info(f'[WEIGHT] offset: {self.hx.get_offset_A():.1f}')
+
+    def stats(self):
+        stats = {
+            'power_policy': self.power_policy,
+            'samples_per_second': self.hx.get_sample_rate(),
+            'settle_time': self.settle_time,
+            'power_cycles': self.power_cycles
+        }
+        if isinstance(self.hx, HX711Bank):
+            stats['cells'] = self.hx.diagnostics()
+        return stats
 
     def reset(self):
+        self.sampler.reset()
         self.hx.reset()
+        self.power_up_time = time.monotonic()
         self.hx.set_offset(0)
         self.hx.set_reference_unit(1)
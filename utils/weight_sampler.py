@@ -0,0 +1,107 @@
+import numpy as np
+
+from utils import sample_stats
+
+
+class FILTER:
+    MEDIAN = 'median'
+    TRIMMED_MEAN = 'trimmed_mean'
+    EMA = 'ema'
+    KALMAN = 'kalman'
+
+
+class WeightSampler:
+    """
+    Keeps every conversion of the load cell in a fixed-size ring buffer and filters them as they arrive.
+
+    Median and trimmed mean are selected over the latest window samples with utils.sample_stats, EMA and Kalman are updated
+    in O(1) per sample. value always holds the filtered weight of the latest sample, so readers get
+    a fresh value without waiting for a new batch of samples.
+
+    :param size: ring buffer size
+    :param filter: FILTER type
+    :param window: samples used by median / trimmed mean
+    :param trim: fraction trimmed from each end by trimmed mean
+    :param alpha: smoothing factor of EMA
+    :param process_noise: Kalman process noise variance (weight change per sample)
+    :param measurement_noise: Kalman measurement noise variance
+    """
+
+    def __init__(self, size=256, filter=FILTER.MEDIAN, window=10, trim=0.2, alpha=0.3,
+                 process_noise=0.5, measurement_noise=25):
+        if filter not in (FILTER.MEDIAN, FILTER.TRIMMED_MEAN, FILTER.EMA, FILTER.KALMAN):
+            raise ValueError("Unrecognised filter: \"%s\"" % filter)
+
+        self.size = size
+        self.filter = filter
+        self.window = min(window, size)
+        self.trim = trim
+        self.alpha = alpha
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+
+        self.values = np.zeros(size)
+        self.times = np.zeros(size)
+        self.filtered = np.zeros(size)
+        self.count = 0
+
+        self.value = 0
+        self.estimate = None
+        self.error = 0
+
+    def reset(self):
+        self.count = 0
+        self.value = 0
+        self.estimate = None
+        self.error = 0
+
+    def push(self, value, timestamp):
+        index = self.count % self.size
+        self.values[index] = value
+        self.times[index] = timestamp
+        self.count += 1
+
+        if self.filter == FILTER.MEDIAN:
+            self.value = sample_stats.median(self.latest(self.window))
+        elif self.filter == FILTER.TRIMMED_MEAN:
+            self.value = sample_stats.trimmed_mean(self.latest(self.window), trim=self.trim)
+        elif self.filter == FILTER.EMA:
+            self.value = value if self.count == 1 else self.alpha * value + (1 - self.alpha) * self.value
+        elif self.filter == FILTER.KALMAN:
+            self.value = self.kalman(value)
+
+        self.filtered[index] = self.value
+
+        return self.value
+
+    def kalman(self, value):
+        if self.estimate is None:
+            self.estimate = value
+            self.error = self.measurement_noise
+            return value
+
+        # Predict (constant weight), then correct with the new measurement
+        self.error += self.process_noise
+        gain = self.error / (self.error + self.measurement_noise)
+        self.estimate += gain * (value - self.estimate)
+        self.error *= 1 - gain
+
+        return self.estimate
+
+    def latest(self, n=None, array=None):
+        """
+        :return: view or copy of the latest n raw values, oldest first
+        """
+        array = self.values if array is None else array
+        n = min(self.count, self.size) if n is None else min(n, self.count, self.size)
+
+        end = self.count % self.size
+        if n <= end:
+            return array[end - n:end]
+        return np.concatenate((array[self.size - (n - end):], array[:end]))
+
+    def latest_times(self, n=None):
+        return self.latest(n, self.times)
+
+    def latest_filtered(self, n=None):
+        return self.latest(n, self.filtered)
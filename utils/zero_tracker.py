@@ -0,0 +1,88 @@
+import logging
+import time
+
+import numpy as np
+
+from utils.stability import StabilityDetector
+
+
+class ZeroTracker:
+    """
+    Automatic zero tracking, follows the slow drift of the load cell offset while the scale is empty.
+
+    When the latest window samples stay within band of zero and stable for hold_time seconds, their
+    mean is taken as the drift and removed from the offset, limited to max_rate units per second
+    since the previous correction. Every correction is kept in a history ring buffer and logged.
+
+    :param band: max absolute weight treated as an empty scale
+    :param hold_time: seconds the scale must stay empty and stable before a correction
+    :param max_rate: max correction in units per second
+    :param window: samples checked for stability
+    :param max_std: max standard deviation of the window
+    :param max_slope: max drift of the window, units per second
+    :param history: number of corrections kept
+    """
+
+    def __init__(self, band=5.0, hold_time=10.0, max_rate=0.05, window=10, max_std=2.0, max_slope=5.0,
+                 history=256):
+        self.band = band
+        self.hold_time = hold_time
+        self.max_rate = max_rate
+        self.stability = StabilityDetector(window=window, max_std=max_std, max_slope=max_slope)
+
+        self.empty_since = None
+        self.last_correction = time.monotonic()
+
+        # (timestamp, correction, total correction)
+        self.history = np.zeros((history, 3))
+        self.count = 0
+        self.total = 0
+
+    def reset(self):
+        self.empty_since = None
+        self.last_correction = time.monotonic()
+        self.count = 0
+        self.total = 0
+
+    def update(self, sampler, now=None):
+        """
+        :param sampler: WeightSampler with weights relative to the current offset
+        :param now: time of the latest sample, time.monotonic() if None
+        :return: correction to subtract from the following weights, 0 if none is due
+        """
+        now = time.monotonic() if now is None else now
+
+        values = sampler.latest(self.stability.window)
+        times = sampler.latest_times(self.stability.window)
+
+        if not self.stability.is_stable(values, times) or np.abs(values).max() > self.band:
+            self.empty_since = None
+            return 0
+
+        if self.empty_since is None:
+            self.empty_since = now
+            return 0
+
+        if now - self.empty_since < self.hold_time:
+            return 0
+
+        limit = self.max_rate * (now - self.last_correction)
+        correction = float(np.clip(values.mean(), -limit, limit))
+
+        self.empty_since = now
+        self.last_correction = now
+        self.total += correction
+
+        self.history[self.count % len(self.history)] = (now, correction, self.total)
+        self.count += 1
+
+        logging.info(f'[ZERO TRACKER] correction: {correction:+.3f}, total: {self.total:+.3f}')
+
+        return correction
+
+    def get_history(self):
+        """
+        :return: (n, 3) array of timestamp, correction and total correction, oldest first
+        """
+        count = min(self.count, len(self.history))
+        return np.roll(self.history, -self.count, axis=0)[-count:] if count else self.history[:0]
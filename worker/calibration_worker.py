@@ -0,0 +1,52 @@
+import logging
+
+import numpy as np
+from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    finished = pyqtSignal()
+    # samples read, total
+    progress = pyqtSignal(int, int)
+    # np.ndarray of raw samples
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+
+class CalibrationWorker(QRunnable):
+    """
+    Reads raw HX711 samples for one calibration point at the full conversion rate, off the GUI thread.
+
+    :param hx: HX711
+    :param count: number of samples
+    """
+
+    def __init__(self, hx, count):
+        super(CalibrationWorker, self).__init__()
+
+        self.hx = hx
+        self.count = count
+        self.signals = WorkerSignals()
+
+        self.stop = False
+
+    @pyqtSlot()
+    def run(self):
+        samples = np.empty(self.count)
+
+        try:
+            for i in range(self.count):
+                if self.stop:
+                    return
+                samples[i] = self.hx.read_long()
+                self.signals.progress.emit(i + 1, self.count)
+
+            self.signals.result.emit(samples)
+        except Exception as e:
+            logging.error("[CALIBRATION WORKER] catch an exception.", exc_info=True)
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+    def set_stop(self, stop):
+        self.stop = stop
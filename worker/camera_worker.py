@@ -1,24 +1,49 @@
 import logging
-import numpy as np
+import time
+
+import cv2
 
 from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal
 from utils.depth_camera import DepthCamera
+from utils.frame_buffer import FrameRing
 
 
 class WorkerSignals(QObject):
     finished = pyqtSignal()
-    data = pyqtSignal(np.ndarray)
+    frame_ready = pyqtSignal()
+    captured = pyqtSignal(bool)
 
 class DepthCameraWorker(QRunnable):
+    """
+    :param preview_fps: max frames per second handed to the GUI, 0 for every frame
+    :param preview_size: (width, height) of preview frames, None for the camera resolution
+    :param ring_size: number of preallocated preview buffers
+    :param burst_frames: number of aligned frames fused into one capture
+    :param backend: hardware backend providing the camera, see utils/backend.py
+    :param recorder: utils.recording.SensorRecorder of the camera frames
+    """
+
     def __init__(self, **kwargs):
         super(DepthCameraWorker, self).__init__()
 
         self.kwargs = kwargs
         self.signals = WorkerSignals()
 
+        preview_fps = self.kwargs.get('preview_fps', 0)
+        self.preview_interval = 1 / preview_fps if preview_fps > 0 else 0
+        self.preview_size = self.kwargs.get('preview_size', None)
+        self.burst_frames = self.kwargs.get('burst_frames', 1)
+
+        # Preview frames are handed to the GUI thread through this ring, latest frame wins
+        self.frame_ring = FrameRing(size=self.kwargs.get('ring_size', 3))
+
         try:
-            self.depth_camera = DepthCamera()
+            self.depth_camera = DepthCamera(
+                rs=self.kwargs['backend'].realsense() if 'backend' in self.kwargs else None,
+                recorder=self.kwargs.get('recorder')
+            )
             self.stop = False
+            self.capture_requested = False
         except:
             logging.error("[DEPTH CAMERA WORKER] camera not found")
             self.depth_camera = None
@@ -26,16 +51,59 @@ class DepthCameraWorker(QRunnable):
 
     @pyqtSlot()
     def run(self):
+        # Deadline of the next preview frame, advanced by the interval and not reset to the time a
+        # frame arrived: frames come at the camera rate and would otherwise only meet every other deadline
+        next_preview_time = 0
+        last_frame_time = None
+
         try:
             while not self.stop:
-                image, depth = self.depth_camera.read()
-                if image is not None:
-                    rgb_image = np.copy(image[:, :, ::-1])
-                    self.signals.data.emit(rgb_image)
+                if self.capture_requested:
+                    self.capture_requested = False
+                    self.signals.captured.emit(self.depth_camera.capture_aligned(self.burst_frames))
+                    continue
+
+                image = self.depth_camera.read_preview()
+                if image is None:
+                    continue
+
+                now = time.monotonic()
+                # Half a camera frame early is on time, the next frame would be half a frame late
+                tolerance = min(now - last_frame_time, self.preview_interval) / 2 if last_frame_time is not None else 0
+                last_frame_time = now
+                if now < next_preview_time - tolerance:
+                    self.frame_ring.drop()
+                    continue
+
+                if self.preview_size is None or (image.shape[1], image.shape[0]) == tuple(self.preview_size):
+                    index = self.frame_ring.write(image)
+                else:
+                    # Downscale straight into the slot, no intermediate array
+                    width, height = self.preview_size
+                    index = self.frame_ring.acquire((height, width, image.shape[2]), image.dtype)
+                    if index is not None:
+                        cv2.resize(image, (width, height), dst=self.frame_ring.get(index), interpolation=cv2.INTER_AREA)
+
+                # The GUI still holds every slot, drop this frame
+                if index is None:
+                    self.frame_ring.drop()
+                    continue
+
+                next_preview_time += self.preview_interval
+                if next_preview_time < now:
+                    # Behind after a capture, start over from this frame
+                    next_preview_time = now + self.preview_interval
+                if self.frame_ring.publish(index):
+                    self.signals.frame_ready.emit()
         except:
             logging.error("[DEPTH CAMERA WORKER] catch an exception.", exc_info=True)
         finally:
+            logging.info(f'[DEPTH CAMERA WORKER] preview frames {self.frame_ring.stats()}')
             self.signals.finished.emit()
 
+    def request_capture(self):
+        # Aligned capture runs on the camera thread, the pipeline is only driven from there
+        self.capture_requested = True
+
     def set_stop(self, stop):
         self.stop = stop
@@ -0,0 +1,100 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    finished = pyqtSignal()
+    saved = pyqtSignal(dict)
+    failed = pyqtSignal(dict)
+
+
+class SaveWorker(QRunnable):
+    """
+    Writes captures to disk on its own thread so the GUI thread never waits for compression.
+
+    Files are written to a temporary path and renamed into place, a half-written capture is never
+    picked up by the uploader. The queue is bounded, submit() never blocks the GUI thread and refuses
+    the capture when the writer falls behind.
+
+    :param depth_camera: DepthCamera used to serialize the frames
+    :param queue_size: max number of captures waiting to be written
+    :param codec: utils.codec.Codec used for the capture files
+    """
+
+    def __init__(self, depth_camera, queue_size=4, codec=None):
+        super(SaveWorker, self).__init__()
+
+        self.signals = WorkerSignals()
+
+        self.depth_camera = depth_camera
+        self.codec = codec
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        self.stop = False
+        self.done = threading.Event()
+
+    def submit(self, frame, data):
+        """
+        :param frame: RGBDFrame snapshot to write
+        :param data: upload data, data['file_path'] is the destination
+        :return: False if the queue is full and the capture was not queued
+        """
+        try:
+            self.queue.put_nowait((frame, data))
+        except queue.Full:
+            logging.warning(f"[SAVE WORKER] queue full, refuse {data['file_name']}")
+            return False
+
+        return True
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            while not self.stop or not self.queue.empty():
+                try:
+                    frame, data = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+
+                self.write(frame, data)
+        except:
+            logging.error("[SAVE WORKER] catch an exception.", exc_info=True)
+        finally:
+            self.done.set()
+            self.signals.finished.emit()
+
+    def write(self, frame, data):
+        file_path = data['file_path']
+        temp_path = f'{file_path}.tmp'
+        start_time = time.perf_counter()
+
+        try:
+            with open(temp_path, 'wb') as file:
+                self.depth_camera.save_file(file, frame, self.codec)
+                file.flush()
+                os.fsync(file.fileno())
+
+            os.replace(temp_path, file_path)
+        except:
+            logging.error(f"[SAVE WORKER] save {data['file_name']} failed", exc_info=True)
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+            self.signals.failed.emit(data)
+        else:
+            logging.info('[SAVE WORKER] save {} in {:.3f} s'.format(data['file_name'], time.perf_counter() - start_time))
+            self.signals.saved.emit(data)
+
+    def wait(self, timeout=None):
+        """
+        Block until run() returned after set_stop(True), every queued capture is written.
+        :return: False on timeout
+        """
+        return self.done.wait(timeout)
+
+    def set_stop(self, stop):
+        self.stop = stop
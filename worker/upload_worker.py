@@ -1,31 +1,246 @@
+import datetime
+import glob
+import heapq
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal
 
-from utils.api import Api
+from utils.journal import CaptureJournal, UPLOAD_STATE
 
 
 class WorkerSignals(QObject):
     finished = pyqtSignal()
-    result = pyqtSignal(int)
+    result = pyqtSignal(str, int)
+    progress = pyqtSignal(str, int, int)
+
 
 class UploadWorker(QRunnable):
-    def __init__(self, base_url, data):
+    """
+    Durable upload queue backed by the capture journals.
+
+    Captures are uploaded by a small pool of threads. When several captures are due at once (e.g.
+    after a network outage) they are packed into batch requests, if the server supports them.
+    A failed upload is retried with exponential backoff, and the record's is_upload flag in the
+    journal is only set once the server accepted it. On start every journal under save_dir is
+    scanned, so captures left pending by an outage or a restart are picked up again. A record whose
+    capture file does not exist is marked UPLOAD_STATE.MISSING and never queued again.
+
+    :param api: utils.api.Api used for the uploads
+    :param journal: CaptureJournal of today, shared with the GUI thread
+    :param save_dir: root folder of the daily capture folders
+    :param max_concurrent: max number of uploads in flight
+    :param backoff_base: seconds before the first retry
+    :param backoff_max: max seconds between retries
+    :param batch_size: max number of captures sent in one batch request
+    :param batch_bytes: max total file size of one batch request
+    """
+
+    def __init__(self, api, journal, save_dir, max_concurrent=2, backoff_base=5, backoff_max=600,
+                 batch_size=10, batch_bytes=20 * 1024 * 1024):
         super(UploadWorker, self).__init__()
 
         self.signals = WorkerSignals()
 
-        self.api = Api(base_url)
+        self.api = api
+        self.journal = journal
+        self.save_dir = save_dir
+        self.max_concurrent = max_concurrent
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+
+        # Heap of (due time, sequence, journal, file name), guarded by condition
+        self.condition = threading.Condition()
+        self.queue = []
+        self.sequence = 0
+        self.attempts = {}
+        self.in_flight = 0
+
+        # Journals of earlier days, opened by this worker
+        self.journals = []
+
+        self.stop = False
+        # Set once run() returned, every upload in flight has finished
+        self.done = threading.Event()
+
+    def enqueue(self, journal, file_name, delay=0):
+        with self.condition:
+            self.sequence += 1
+            heapq.heappush(self.queue, (time.monotonic() + delay, self.sequence, journal, file_name))
+            self.condition.notify()
+
+    def load_pending(self):
+        journals = {self.journal.path: self.journal}
+
+        for path in sorted(glob.glob(os.path.join(self.save_dir, '*', 'data.jsonl'))):
+            if os.path.abspath(path) != os.path.abspath(self.journal.path):
+                journals[path] = CaptureJournal(path)
+                self.journals.append(journals[path])
+
+        for journal in journals.values():
+            for file_name, record in journal.items():
+                if record.get('is_upload', UPLOAD_STATE.PENDING) == UPLOAD_STATE.PENDING:
+                    self.enqueue(journal, file_name)
 
-        self.data = data
+        logging.info(f'[UPLOAD WORKER] {len(self.queue)} pending uploads')
+
+    @staticmethod
+    def build_data(journal, file_name, record):
+        # Records written before the journal have no meal_date / file_path, derive them from the file name
+        meal_date = record.get('meal_date')
+        if meal_date is None:
+            meal_date = datetime.datetime.strptime(file_name[:8], '%Y%m%d').strftime('%Y-%m-%d')
+
+        file_path = record.get('file_path')
+        if file_path is None:
+            file_path = os.path.join(os.path.dirname(journal.path), f'{file_name}.npz')
+
+        return {
+            'payload': {
+                'user_id': record['user_id'],
+                'weight': record['weight'],
+                'meal_date': meal_date,
+                'type': record['save_type']
+            },
+            'file_path': file_path,
+            'file_name': file_name
+        }
 
     @pyqtSlot()
     def run(self):
         try:
-            status_code = self.api.upload_data(self.data)
-            self.signals.result.emit(1 if status_code == 200 else 0)
+            self.load_pending()
+
+            with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+                while not self.stop:
+                    with self.condition:
+                        items = self.next_due()
+                        if items is None:
+                            continue
+
+                        self.in_flight += 1
+
+                    executor.submit(self.upload, items)
         except:
             logging.error("[UPLOAD WORKER] catch an exception.", exc_info=True)
         finally:
-            logging.info(f"[UPLOAD WORKER] finish upload {self.data['file_name']}")
+            # Keep data.json of earlier days in step with the upload flags
+            for journal in self.journals:
+                journal.export(os.path.join(os.path.dirname(journal.path), 'data.json'))
+                journal.close()
+
+            self.done.set()
             self.signals.finished.emit()  # Done
+
+    def next_due(self):
+        """
+        Called with self.condition held, waits at most 1 s so that stop is noticed.
+        :return: list of due (journal, file name), at most batch_size items and batch_bytes of files
+        """
+        if self.in_flight >= self.max_concurrent or len(self.queue) == 0:
+            self.condition.wait(1)
+            return None
+
+        now = time.monotonic()
+        if self.queue[0][0] > now:
+            self.condition.wait(min(1, self.queue[0][0] - now))
+            return None
+
+        batch_size = self.batch_size if self.api.batch_supported else 1
+        items = []
+        batch_bytes = 0
+
+        while len(self.queue) > 0 and self.queue[0][0] <= now and len(items) < batch_size:
+            _, _, journal, file_name = self.queue[0]
+
+            file_size = self.file_size(journal, file_name)
+            if len(items) > 0 and batch_bytes + file_size > self.batch_bytes:
+                break
+
+            heapq.heappop(self.queue)
+            items.append((journal, file_name))
+            batch_bytes += file_size
+
+        return items
+
+    def file_size(self, journal, file_name):
+        try:
+            return os.path.getsize(self.build_data(journal, file_name, journal.get(file_name))['file_path'])
+        except (OSError, KeyError, TypeError, ValueError):
+            return 0
+
+    def upload(self, items):
+        results = {}
+        batch = []
+        missing = []
+
+        try:
+            for journal, file_name in items:
+                data = self.build_data(journal, file_name, journal.get(file_name))
+
+                if os.path.isfile(data['file_path']):
+                    batch.append((journal, data))
+                else:
+                    # Capture was never written (crash or failed save), there is nothing to retry
+                    missing.append((journal, file_name))
+
+            if len(batch) > 1:
+                status_codes = self.api.upload_batch(
+                    [data for _, data in batch],
+                    progress=lambda sent, total: self.signals.progress.emit(f'batch of {len(batch)}', sent, total))
+                if status_codes is not None:
+                    results = {file_name: 1 if status_code == 200 else 0 for file_name, status_code in status_codes.items()}
+
+            # Single capture, or the server has no batch endpoint
+            for _, data in batch:
+                file_name = data['file_name']
+                if file_name not in results:
+                    status_code = self.api.upload_data(
+                        data, progress=lambda sent, total: self.signals.progress.emit(file_name, sent, total))
+                    results[file_name] = 1 if status_code == 200 else 0
+        except:
+            logging.error("[UPLOAD WORKER] catch an exception.", exc_info=True)
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify()
+
+        for journal, data in batch:
+            self.finish(journal, data['file_name'], results.get(data['file_name'], 0))
+
+        for journal, file_name in missing:
+            journal.update(file_name, is_upload=UPLOAD_STATE.MISSING)
+            self.attempts.pop(file_name, None)
+            logging.warning(f'[UPLOAD WORKER] {file_name} has no capture file, skip')
+            self.signals.result.emit(file_name, UPLOAD_STATE.MISSING)
+
+    def finish(self, journal, file_name, is_upload):
+        if is_upload:
+            journal.update(file_name, is_upload=1)
+            self.attempts.pop(file_name, None)
+            logging.info(f'[UPLOAD WORKER] finish upload {file_name}')
+        else:
+            attempts = self.attempts.get(file_name, 0) + 1
+            self.attempts[file_name] = attempts
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+            self.enqueue(journal, file_name, delay)
+            logging.warning(f'[UPLOAD WORKER] upload {file_name} failed {attempts} times, retry in {delay} s')
+
+        self.signals.result.emit(file_name, is_upload)
+
+    def wait(self, timeout=None):
+        """
+        Block until run() returned after set_stop(True), uploads in flight are finished and recorded.
+        :return: False on timeout
+        """
+        return self.done.wait(timeout)
+
+    def set_stop(self, stop):
+        with self.condition:
+            self.stop = stop
+            self.condition.notify()
@@ -3,12 +3,16 @@ import time
 
 from PyQt5.QtCore import QRunnable, pyqtSlot, QObject, pyqtSignal
 
+from utils.stability import StabilityDetector
 from utils.weight_reader import WeightReader
+from utils.zero_tracker import ZeroTracker
 
 
 class WorkerSignals(QObject):
     finished = pyqtSignal()
-    data = pyqtSignal(float)
+    # WeightSample
+    data = pyqtSignal(object)
+    settled = pyqtSignal(float)
 
 
 class WeightReaderWorker(QRunnable):
@@ -18,10 +22,37 @@ class WeightReaderWorker(QRunnable):
         self.kwargs = kwargs
         self.signals = WorkerSignals()
 
+        zero_tracker = None
+        if self.kwargs.get('zero_tracking', False):
+            zero_tracker = ZeroTracker(
+                band=self.kwargs.get('zero_band', 5.0),
+                hold_time=self.kwargs.get('zero_hold_time', 10.0),
+                max_rate=self.kwargs.get('zero_max_rate', 0.05),
+                window=self.kwargs.get('stable_window', 10),
+                max_std=self.kwargs.get('stable_std', 2.0),
+                max_slope=self.kwargs.get('stable_slope', 5.0)
+            )
+
         self.weight_reader = WeightReader(
             dout=self.kwargs['channel_data'],
             pd_sck=self.kwargs['channel_clk'],
-            reference_unit=(self.kwargs['reference_unit'])
+            reference_unit=(self.kwargs['reference_unit']),
+            transport=self.kwargs.get('transport', 'rpi_gpio'),
+            filter=self.kwargs.get('filter', 'median'),
+            window=self.kwargs.get('window', 10),
+            power_policy=self.kwargs.get('power_policy', 'always_on'),
+            idle_timeout=self.kwargs.get('idle_timeout', 60),
+            zero_tracker=zero_tracker,
+            cells=self.kwargs.get('cells'),
+            cell_scales=self.kwargs.get('cell_scales'),
+            gpio=self.kwargs.get('gpio'),
+            recorder=self.kwargs.get('recorder')
+        )
+
+        self.stability = StabilityDetector(
+            window=self.kwargs.get('stable_window', 10),
+            max_std=self.kwargs.get('stable_std', 2.0),
+            max_slope=self.kwargs.get('stable_slope', 5.0)
         )
 
         self.weight_reader.setup()
@@ -32,12 +63,42 @@ class WeightReaderWorker(QRunnable):
     def run(self):
         try:
             while not self.stop:
-                self.weight_reader.read()
-                time.sleep(0.1)
+                try:
+                    if not self.weight_reader.read():
+                        # Powered down while idle, check for wake() again shortly
+                        time.sleep(0.1)
+                        continue
+
+                    self.signals.data.emit(self.weight_reader.snapshot())
+
+                    value = self.stability.update(self.weight_reader.sampler)
+                    if value is not None:
+                        self.signals.settled.emit(max(0, value))
+                except TimeoutError:
+                    logging.warning("[WEIGHT WORKER] hx711 not ready, retry", exc_info=True)
         except:
             logging.error("[WEIGHT WORKER] catch an exception.", exc_info=True)
         finally:
+            stats = self.weight_reader.stats()
+            logging.info(f"[WEIGHT WORKER] policy: {stats['power_policy']}, "
+                         f"{stats['samples_per_second']:.1f} samples/s, "
+                         f"settle time: {stats['settle_time']}, power cycles: {stats['power_cycles']}")
+            logging.info(f"[WEIGHT WORKER] time to stable: {self.stability.stats()}")
+            for cell in stats.get('cells', []):
+                logging.info(f"[WEIGHT WORKER] cell: {cell}")
+            if self.weight_reader.zero_tracker is not None:
+                logging.info(f"[WEIGHT WORKER] zero corrections: {self.weight_reader.zero_tracker.get_history().tolist()}")
             self.signals.finished.emit()  # Done
 
+    def request_settle(self):
+        """
+        Emit settled once the weight is stable.
+        """
+        self.weight_reader.wake()
+        self.stability.arm()
+
+    def cancel_settle(self):
+        self.stability.cancel()
+
     def set_stop(self, stop):
         self.stop = stop